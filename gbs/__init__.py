@@ -0,0 +1,46 @@
+"""Núcleo de cálculo do GBS - Planejamento e Controle de Produção.
+
+O aplicativo Streamlit (``gbs_app.py``) cuida apenas da interface; a lógica de
+aproveitamento de chapas, de estoque e de relatórios fica neste pacote, que
+não depende do Streamlit. A linha de comando (``python -m gbs``) roda o
+planejamento em lote sem a interface web.
+
+``import gbs`` é instantâneo: NumPy, pandas e SQLite só são carregados quando
+um dos nomes abaixo é usado pela primeira vez (ex.: ``gbs.planejar_lote``).
+"""
+import importlib
+
+# Nome público -> submódulo que o define (importado sob demanda)
+_EXPORTACOES = {
+    'calcular_aproveitamento_lote': 'gbs.aproveitamento',
+    'avaliar_estoque': 'gbs.aproveitamento',
+    'calcular_aproveitamento': 'gbs.cache_aproveitamento',
+    'comparar_cenarios': 'gbs.cenarios',
+    'otimizar_pedidos_estoque': 'gbs.corte_global',
+    'Chapa': 'gbs.estoque',
+    'EstoqueMemoria': 'gbs.estoque',
+    'Medida': 'gbs.estoque',
+    'ler_estoque_csv': 'gbs.estoque',
+    'ler_pedidos_lote': 'gbs.lote',
+    'planejar_lote': 'gbs.lote',
+    'planejar_pedido': 'gbs.lote',
+    'melhor_chapa': 'gbs.otimizador',
+    'ranquear_chapas': 'gbs.otimizador',
+    'BancoEstoque': 'gbs.persistencia',
+    'EstoqueInsuficiente': 'gbs.persistencia',
+}
+
+__all__ = sorted(_EXPORTACOES)
+
+
+def __getattr__(nome):
+    modulo = _EXPORTACOES.get(nome)
+    if modulo is None:
+        raise AttributeError(f"module 'gbs' has no attribute '{nome}'")
+    valor = getattr(importlib.import_module(modulo), nome)
+    globals()[nome] = valor  # As próximas consultas não passam mais por aqui
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTACOES))
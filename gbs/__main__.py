@@ -0,0 +1,6 @@
+"""Permite ``python -m gbs`` (veja ``gbs.cli``)."""
+import sys
+
+from gbs.cli import main
+
+sys.exit(main())
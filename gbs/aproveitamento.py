@@ -0,0 +1,244 @@
+"""Motor de aproveitamento (nesting) vetorizado com NumPy.
+
+Avalia em uma única chamada N pares (chapa base, chapa de corte): as duas
+orientações da peça e os padrões guilhotinados de dois estágios, em que o
+primeiro estágio corta faixas (ao longo do comprimento ou da largura da chapa)
+e cada faixa recebe peças na orientação normal ou girada. Para cada candidato
+devolve caixas por chapa, aproveitamento e os retalhos gerados.
+
+Todas as dimensões são em milímetros. Convenções de orientação:
+
+* A chapa base tem ``largura`` (L) x ``comprimento`` (C).
+* Peça "normal": largura da peça ao longo de L, comprimento ao longo de C.
+* Peça "girada": rotacionada 90 graus.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+# Incrementar a cada mudança que altere resultados: invalida o cache (gbs.cache_aproveitamento)
+VERSAO_ALGORITMO = 1
+
+TOLERANCIA_RETALHO_MM = 0.1  # Sobras menores que isso são erro de float, não retalho
+
+# Direção do 1º estágio de corte
+DIRECAO_COMPRIMENTO = 0  # Faixas empilhadas ao longo do comprimento (sequência de corte original)
+DIRECAO_LARGURA = 1  # Faixas empilhadas ao longo da largura
+
+# Limite de elementos (linhas x padrões) processados por bloco, para limitar memória
+_ELEMENTOS_POR_BLOCO = 1 << 21
+
+
+class ResultadoAproveitamento(NamedTuple):
+    """Melhor padrão de corte de cada candidato (arrays com N linhas).
+
+    ``retalhos_*`` têm forma (N, 3): retalho lateral das faixas normais,
+    retalho lateral das faixas giradas e retalho da ponta (1 por chapa).
+    Quantidade 0 indica que aquele retalho não existe.
+    """
+    caixas_por_chapa: np.ndarray
+    aproveitamento: np.ndarray  # Fração da área da chapa base ocupada por peças (0 a 1)
+    direcao: np.ndarray
+    faixas_normais: np.ndarray
+    faixas_giradas: np.ndarray
+    retalhos_largura_mm: np.ndarray
+    retalhos_comprimento_mm: np.ndarray
+    retalhos_qtd: np.ndarray
+
+
+def _avaliar_direcao(A, B, t_n, w_n, t_r, w_r, permitir_rotacao, permitir_misto):
+    """Avalia os padrões de uma direção de 1º estágio para um bloco de linhas.
+
+    ``A`` é a dimensão da chapa em que as faixas são empilhadas e ``B`` o
+    tamanho de cada faixa. Uma faixa normal consome ``t_n`` de A e recebe
+    ``floor(B / w_n)`` peças; uma faixa girada consome ``t_r`` e recebe
+    ``floor(B / w_r)``. Devolve arrays (n, P) com P padrões por linha.
+    """
+    pecas_faixa_n = np.floor(B / w_n)
+    pecas_faixa_r = np.floor(B / w_r) if permitir_rotacao else np.zeros_like(B)
+
+    max_faixas_n = np.where(pecas_faixa_n > 0, np.floor(A / t_n), 0)
+
+    if permitir_misto:
+        # k = max_faixas_n, max_faixas_n - 1, ..., 0 faixas normais; o restante é preenchido com faixas giradas
+        total_padroes = int(max_faixas_n.max(initial=0)) + 1
+        k = max_faixas_n[:, None] - np.arange(total_padroes)[None, :]
+        valido = k >= 0
+        k = np.maximum(k, 0)
+    else:
+        # Apenas os padrões homogêneos: tudo normal ou tudo girado
+        k = np.stack([max_faixas_n, np.zeros_like(max_faixas_n)], axis=1)
+        valido = np.ones_like(k, dtype=bool)
+
+    sobra_A = A[:, None] - k * t_n[:, None]
+    m = np.where(pecas_faixa_r[:, None] > 0, np.floor(sobra_A / t_r[:, None]), 0)
+    if not permitir_misto:
+        m[:, 0] = 0  # O padrão "tudo normal" não recebe faixas giradas
+
+    pecas = k * pecas_faixa_n[:, None] + m * pecas_faixa_r[:, None]
+    pecas = np.where(valido, pecas, -1)
+    sobra_ponta = sobra_A - m * t_r[:, None]
+
+    return pecas, k, m, sobra_ponta, pecas_faixa_n, pecas_faixa_r
+
+
+def calcular_aproveitamento_lote(largura_corte_mm, comprimento_corte_mm,
+                                 largura_chapa_base_mm, comprimento_chapa_base_mm,
+                                 permitir_rotacao=True, permitir_misto=True):
+    """Calcula o melhor padrão de corte para cada par (chapa de corte, chapa base).
+
+    Aceita escalares ou arrays (com broadcasting): por exemplo, uma única
+    chapa de corte contra todas as chapas do estoque. Com
+    ``permitir_rotacao=False`` e ``permitir_misto=False`` a quantidade de
+    caixas é a mesma da sequência de corte original (peça normal).
+
+    Entre padrões com o mesmo número de caixas, prefere o que concentra mais
+    área no retalho da ponta, que é o retalho mais fácil de reaproveitar; em
+    empate, prevalecem as faixas ao longo do comprimento.
+    """
+    l, c, L, C = np.broadcast_arrays(
+        np.asarray(largura_corte_mm, dtype=np.float64),
+        np.asarray(comprimento_corte_mm, dtype=np.float64),
+        np.asarray(largura_chapa_base_mm, dtype=np.float64),
+        np.asarray(comprimento_chapa_base_mm, dtype=np.float64),
+    )
+    l, c, L, C = (np.ravel(x) for x in (l, c, L, C))
+    n = l.size
+
+    caixas = np.zeros(n, dtype=np.int64)
+    direcao = np.zeros(n, dtype=np.int8)
+    faixas_n = np.zeros(n, dtype=np.int64)
+    faixas_r = np.zeros(n, dtype=np.int64)
+    ret_larg = np.zeros((n, 3))
+    ret_comp = np.zeros((n, 3))
+    ret_qtd = np.zeros((n, 3), dtype=np.int64)
+
+    # Padrões por linha crescem com chapa/peça; processa em blocos para limitar memória
+    max_padroes = 2 + (int(max(np.max(C / c, initial=0), np.max(L / l, initial=0))) if n else 0)
+    tamanho_bloco = max(1, _ELEMENTOS_POR_BLOCO // (2 * max_padroes))
+
+    for ini in range(0, n, tamanho_bloco):
+        s = slice(ini, ini + tamanho_bloco)
+        bl, bc, bL, bC = l[s], c[s], L[s], C[s]
+
+        # Direção comprimento: faixas de c (normal) ou l (girada) ao longo de C, cada uma com largura L
+        dir_c = _avaliar_direcao(bC, bL, bc, bl, bl, bc, permitir_rotacao, permitir_misto)
+        # Direção largura: faixas de l (normal) ou c (girada) ao longo de L, cada uma com comprimento C
+        dir_l = _avaliar_direcao(bL, bC, bl, bc, bc, bl, permitir_rotacao, permitir_misto)
+
+        pecas = np.concatenate([dir_c[0], dir_l[0]], axis=1)
+        k = np.concatenate([dir_c[1], dir_l[1]], axis=1)
+        m = np.concatenate([dir_c[2], dir_l[2]], axis=1)
+        sobra_ponta = np.concatenate([dir_c[3], dir_l[3]], axis=1)
+        eh_dir_l = np.concatenate([np.zeros_like(dir_c[0], dtype=bool), np.ones_like(dir_l[0], dtype=bool)], axis=1)
+
+        # Área do retalho da ponta: B x sobra_ponta (B = L na direção comprimento, C na direção largura)
+        area_ponta = np.where(eh_dir_l, bC[:, None], bL[:, None]) * sobra_ponta
+        melhor = pecas == pecas.max(axis=1, keepdims=True)
+        escolha = np.argmax(np.where(melhor, area_ponta, -1.0), axis=1)
+
+        linhas = np.arange(escolha.size)
+        e_pecas = pecas[linhas, escolha]
+        e_k = k[linhas, escolha]
+        e_m = m[linhas, escolha]
+        e_ponta = sobra_ponta[linhas, escolha]
+        e_dir_l = eh_dir_l[linhas, escolha]
+
+        pecas_faixa_n = np.where(e_dir_l, dir_l[4], dir_c[4])
+        pecas_faixa_r = np.where(e_dir_l, dir_l[5], dir_c[5])
+        B = np.where(e_dir_l, bC, bL)
+        w_n = np.where(e_dir_l, bc, bl)
+        w_r = np.where(e_dir_l, bl, bc)
+        t_n = np.where(e_dir_l, bl, bc)
+        t_r = np.where(e_dir_l, bc, bl)
+
+        # Retalhos em coordenadas (atravessando a faixa, ao longo de A)
+        atravessa = np.stack([B - pecas_faixa_n * w_n, B - pecas_faixa_r * w_r, B], axis=1)
+        ao_longo = np.stack([t_n, t_r, e_ponta], axis=1)
+        qtd = np.stack([e_k, e_m, np.ones_like(e_k)], axis=1).astype(np.int64)
+        qtd = np.where((atravessa > TOLERANCIA_RETALHO_MM) & (ao_longo > TOLERANCIA_RETALHO_MM), qtd, 0)
+
+        # Converte para LARGURA x COMPRIMENTO da chapa base
+        ret_larg[s] = np.where(e_dir_l[:, None], ao_longo, atravessa)
+        ret_comp[s] = np.where(e_dir_l[:, None], atravessa, ao_longo)
+        ret_qtd[s] = qtd
+
+        caixas[s] = np.maximum(e_pecas, 0)
+        direcao[s] = np.where(e_dir_l, DIRECAO_LARGURA, DIRECAO_COMPRIMENTO)
+        faixas_n[s] = e_k
+        faixas_r[s] = e_m
+
+    # Sem nenhuma peça não há padrão de corte nem retalho
+    sem_pecas = caixas == 0
+    faixas_n[sem_pecas] = 0
+    faixas_r[sem_pecas] = 0
+    ret_qtd[sem_pecas] = 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aproveitamento = np.where(L * C > 0, caixas * l * c / (L * C), 0.0)
+
+    return ResultadoAproveitamento(caixas, aproveitamento, direcao, faixas_n, faixas_r,
+                                   ret_larg, ret_comp, ret_qtd)
+
+
+def retalhos_para_lista(resultado, i):
+    """Retalhos por chapa base do candidato ``i`` como ``[(largura_mm, comprimento_mm, qtd)]`` (mm inteiros).
+
+    Retalhos de mesma dimensão são somados.
+    """
+    retalhos = {}
+    for larg, comp, qtd in zip(resultado.retalhos_largura_mm[i], resultado.retalhos_comprimento_mm[i],
+                               resultado.retalhos_qtd[i]):
+        if qtd > 0:
+            dim = (round(float(larg)), round(float(comp)))
+            retalhos[dim] = retalhos.get(dim, 0) + int(qtd)
+    return [(larg, comp, qtd) for (larg, comp), qtd in retalhos.items()]
+
+
+def retalhos_para_mapa(resultado, i):
+    """Retalhos por chapa base do candidato ``i`` no formato ``{"LxC": qtd}`` (mm)."""
+    return {f"{larg}x{comp}": qtd for larg, comp, qtd in retalhos_para_lista(resultado, i)}
+
+
+def descrever_padrao(resultado, i):
+    """Descrição legível do padrão de corte escolhido para o candidato ``i``."""
+    if resultado.caixas_por_chapa[i] == 0:
+        return "Não cabe"
+    eixo = "do comprimento" if resultado.direcao[i] == DIRECAO_COMPRIMENTO else "da largura"
+    partes = []
+    if resultado.faixas_normais[i]:
+        partes.append(f"{resultado.faixas_normais[i]} faixa(s) normal(is)")
+    if resultado.faixas_giradas[i]:
+        partes.append(f"{resultado.faixas_giradas[i]} faixa(s) girada(s)")
+    return f"Faixas ao longo {eixo}: " + " + ".join(partes)
+
+
+def calcular_aproveitamento_e_retalhos(largura_corte_mm, comprimento_corte_mm,
+                                       largura_chapa_base_mm, comprimento_chapa_base_mm, **opcoes):
+    """Versão escalar: devolve ``(caixas_por_chapa, {"LxC": qtd_por_chapa})``."""
+    resultado = calcular_aproveitamento_lote(largura_corte_mm, comprimento_corte_mm,
+                                             largura_chapa_base_mm, comprimento_chapa_base_mm, **opcoes)
+    return int(resultado.caixas_por_chapa[0]), retalhos_para_mapa(resultado, 0)
+
+
+def avaliar_estoque(df_estoque, largura_corte_m, comprimento_corte_m, motor=None, **opcoes):
+    """Pontua todas as chapas de ``df_estoque`` contra uma chapa de corte (em metros).
+
+    Devolve uma cópia do estoque com as colunas ``Caixas_por_Chapa``,
+    ``Aproveitamento_%``, ``Direcao_Corte``, ``Faixas_Normais`` e ``Faixas_Giradas``.
+    ``motor`` substitui ``calcular_aproveitamento_lote`` (ex.: a versão com cache
+    de ``gbs.cache_aproveitamento``).
+    """
+    resultado = (motor or calcular_aproveitamento_lote)(
+        largura_corte_m * 1000, comprimento_corte_m * 1000,
+        df_estoque['Largura_m'].to_numpy(dtype=np.float64) * 1000,
+        df_estoque['Comprimento_m'].to_numpy(dtype=np.float64) * 1000,
+        **opcoes,
+    )
+    df = df_estoque.copy()
+    df['Caixas_por_Chapa'] = resultado.caixas_por_chapa
+    df['Aproveitamento_%'] = resultado.aproveitamento * 100
+    df['Direcao_Corte'] = np.where(resultado.direcao == DIRECAO_LARGURA, 'Largura', 'Comprimento')
+    df['Faixas_Normais'] = resultado.faixas_normais
+    df['Faixas_Giradas'] = resultado.faixas_giradas
+    return df
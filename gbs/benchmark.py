@@ -0,0 +1,310 @@
+"""Benchmark dos caminhos críticos, fora do Streamlit.
+
+Mede, sobre estoques sintéticos de vários tamanhos e lotes de pedidos:
+
+* ``aninhamento_estoque``: motor de aproveitamento (sem cache), uma peça contra todo o estoque;
+* ``aninhamento_escalar``: ``calcular_aproveitamento_e_retalhos``, um par por chamada;
+* ``planejamento_lote``: ``planejar_lote`` (escolha da chapa, débito e crédito de retalhos em memória);
+* ``confirmacao_pedido``: ``BancoEstoque.confirmar_pedido`` (débito e inserção de retalhos no SQLite);
+* ``carga_csv``: ``ler_estoque_em_blocos`` + ``BancoEstoque.importar_estoque`` (a importação do aplicativo).
+
+Para cada caso informa vazão, latência (p50/p95/p99) e pico de memória
+(``tracemalloc``, numa passada separada para não distorcer as latências).
+Antes de tudo confere o aproveitamento em casos de referência com ótimo
+conhecido (o limite de área é atingido), para que uma otimização do motor
+não reduza o aproveitamento das chapas sem ninguém perceber, e confere o
+planejamento em casos que já falharam (ex.: o mesmo retalho escolhido duas
+vezes no pedido), que devem continuar planejando sem saldo negativo e
+confirmando no banco, e a otimização global de corte (nunca mais folhas que
+o plano por pedido, dentro do limite de tempo).
+
+Uso::
+
+    python -m gbs.benchmark
+    python -m gbs.benchmark --tamanhos 1000 10000 100000 1000000 --pedidos 500 --json resultado.json
+
+Termina com código 1 se algum caso de referência ou conferência do planejamento falhar.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from gbs.aproveitamento import calcular_aproveitamento_e_retalhos, calcular_aproveitamento_lote
+from gbs.cache_aproveitamento import calcular_aproveitamento
+from gbs.corte_global import otimizar_corte_global, otimizar_pedidos_estoque
+from gbs.estoque import COLUNAS_ESTOQUE, EstoqueMemoria, ler_estoque_em_blocos, nome_retalho
+from gbs.lote import COLUNA_MODELO_OPCIONAL, planejar_lote, planejar_pedido
+from gbs.persistencia import BancoEstoque, EstoqueInsuficiente
+
+TAMANHOS_PADRAO = [1_000, 10_000, 100_000]  # 1_000_000 via --tamanhos (leva alguns minutos)
+
+# Casos com ótimo conhecido: o número de caixas é igual ao limite de área floor(L*C / (l*c)).
+# (largura_corte_mm, comprimento_corte_mm, largura_chapa_mm, comprimento_chapa_mm, caixas_otimas)
+CASOS_REFERENCIA = [
+    (300, 450, 1200, 1800, 16),  # Encaixe exato, só peças normais
+    (450, 300, 1200, 1800, 16),  # Encaixe exato, só peças giradas
+    (200, 300, 1000, 700, 11),  # Precisa de faixas normais e giradas na mesma chapa
+    (200, 350, 900, 2200, 28),
+    (500, 750, 1400, 1000, 3),
+    (150, 500, 1800, 2100, 50),
+    (250, 450, 1500, 2500, 33),
+    (200, 300, 1100, 2100, 38),
+    (450, 550, 1800, 1500, 10),
+    (400, 550, 1000, 2400, 10),
+    (400, 650, 1700, 900, 5),
+    (1300, 500, 1200, 1200, 0),  # Não cabe em nenhuma orientação
+]
+
+_TIPOS_PAPEL = ['Onda B', 'Onda C', 'Onda BC', 'Kraft']
+_GRAMATURAS = [300.0, 370.0, 440.0, 520.0]
+
+
+# --- Dados sintéticos ---
+
+def gerar_estoque_sintetico(linhas, semente=0):
+    """DataFrame com ``COLUNAS_ESTOQUE``: poucas dezenas de formatos de chapa e ~10% de retalhos."""
+    rng = np.random.default_rng(semente)
+    formatos = np.array([(largura, comprimento) for largura in range(1000, 2100, 100)
+                         for comprimento in (1800, 2000, 2200, 2400, 2600)])
+    escolha = formatos[rng.integers(len(formatos), size=linhas)]
+    retalho = rng.random(linhas) < 0.1
+    larguras_mm = np.where(retalho, rng.integers(100, 1000, linhas), escolha[:, 0])
+    comprimentos_mm = np.where(retalho, rng.integers(100, 2000, linhas), escolha[:, 1])
+    modelos = [nome_retalho(larguras_mm[i], comprimentos_mm[i]) if retalho[i] else f"CH-{i}" for i in range(linhas)]
+    df = pd.DataFrame({
+        'Modelo_Chapa': modelos,
+        'Largura_m': larguras_mm / 1000,
+        'Comprimento_m': comprimentos_mm / 1000,
+        'Tipo_Papel': rng.choice(_TIPOS_PAPEL, linhas),
+        'Gramatura': rng.choice(_GRAMATURAS, linhas),
+        'Quantidade_Folhas': np.where(retalho, rng.integers(1, 20, linhas), rng.integers(100, 5000, linhas)),
+        'Preco_Kg': np.where(retalho, 0.01, rng.uniform(3, 8, linhas).round(2)),
+    })
+    df['Peso_Total_kg'] = df['Largura_m'] * df['Comprimento_m'] * df['Gramatura'] / 1000 * df['Quantidade_Folhas']
+    df['Valor_Total_R$'] = df['Peso_Total_kg'] * df['Preco_Kg']
+    return df[COLUNAS_ESTOQUE]
+
+
+def gerar_pedidos_sinteticos(quantidade, semente=0):
+    """Pedidos no formato de ``gbs.lote.COLUNAS_LOTE`` (sem modelo fixado), com algumas centenas de medidas de caixa."""
+    rng = np.random.default_rng(semente)
+    medidas_mm = rng.integers(10, 60, size=(300, 2)) * 10  # 100 a 590 mm
+    medida = medidas_mm[rng.integers(len(medidas_mm), size=quantidade)]
+    return pd.DataFrame({
+        'OS': [f"B{i}" for i in range(quantidade)],
+        'Cliente': 'Benchmark', 'Descricao_Pedido': 'Caixa sintética', 'Valor_Pedido_Total_R$': 1000.0,
+        'Largura_Corte_m': medida[:, 0] / 1000, 'Comprimento_Corte_m': medida[:, 1] / 1000,
+        'Quantidade_Caixas': rng.integers(50, 5000, quantidade),
+        'Tipo_Papel': rng.choice(_TIPOS_PAPEL, quantidade), 'Gramatura': rng.choice(_GRAMATURAS, quantidade),
+        COLUNA_MODELO_OPCIONAL: '',
+    })
+
+
+# --- Medição ---
+
+def _medir(caso, linhas_estoque, funcao, repeticoes, itens_por_repeticao=1, repeticoes_memoria=1):
+    """Resume latências e vazão de ``funcao(i)``, i em ``range(repeticoes)``, e o pico de memória.
+
+    O pico é medido em ``repeticoes_memoria`` chamadas extras (índices seguintes),
+    com ``tracemalloc`` ligado só nelas.
+    """
+    latencias = np.empty(repeticoes)
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(i)
+        latencias[i] = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    for i in range(repeticoes, repeticoes + repeticoes_memoria):
+        funcao(i)
+    pico_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99]) * 1000
+    return {
+        'caso': caso, 'linhas_estoque': linhas_estoque, 'repeticoes': repeticoes,
+        'vazao_itens_s': repeticoes * itens_por_repeticao / latencias.sum(),
+        'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+        'pico_memoria_mb': pico_bytes / 2**20,
+    }
+
+
+def verificar_referencias():
+    """Confere ``CASOS_REFERENCIA`` no motor e no caminho com cache. Devolve uma linha por caso."""
+    resultados = []
+    for largura, comprimento, largura_chapa, comprimento_chapa, esperado in CASOS_REFERENCIA:
+        motor = calcular_aproveitamento_lote(largura, comprimento, largura_chapa, comprimento_chapa)
+        cache = calcular_aproveitamento(largura, comprimento, largura_chapa, comprimento_chapa)
+        obtido = int(motor.caixas_por_chapa[0])
+        resultados.append({
+            'caso': f"{largura}x{comprimento} em {largura_chapa}x{comprimento_chapa}",
+            'caixas_otimas': esperado, 'caixas_obtidas': obtido,
+            'aproveitamento_%': float(motor.aproveitamento[0]) * 100,
+            'ok': obtido == esperado and int(cache.caixas_por_chapa[0]) == esperado,
+        })
+    return resultados
+
+
+def _conferir_lote(caso, df_estoque, df_pedidos, atendidos_esperados=None):
+    """Planeja ``df_pedidos`` contra ``df_estoque`` e confirma o lote num banco temporário."""
+    estoque = EstoqueMemoria.de_dataframe(df_estoque)
+    trabalho = estoque.copia()
+    movimentos = []
+    for pedido in df_pedidos.to_dict('records'):
+        plano, movimento = planejar_pedido(trabalho, pedido)
+        posicoes = [consumo['pos'] for consumo in plano.get('Consumos', [])]
+        if len(posicoes) != len(set(posicoes)):
+            return {'caso': caso, 'ok': False, 'detalhe': f"OS {pedido['OS']} usa a mesma chapa duas vezes"}
+        if movimento is not None:
+            movimentos.append(movimento)
+    menor_saldo = int(trabalho.coluna('Quantidade_Folhas').min()) if len(trabalho) else 0
+    if menor_saldo < 0:
+        return {'caso': caso, 'ok': False, 'detalhe': f"saldo negativo no plano ({menor_saldo} folhas)"}
+    if atendidos_esperados is not None and len(movimentos) != atendidos_esperados:
+        return {'caso': caso, 'ok': False,
+                'detalhe': f"{len(movimentos)} pedido(s) atendido(s), esperado {atendidos_esperados}"}
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = BancoEstoque(os.path.join(pasta, 'conferencia.db'))
+        banco.importar_estoque(df_estoque)
+        try:
+            banco.confirmar_lote(movimentos)
+        except EstoqueInsuficiente as e:
+            return {'caso': caso, 'ok': False, 'detalhe': f"confirmação recusada: {e}"}
+    return {'caso': caso, 'ok': True, 'detalhe': f"{len(movimentos)} pedido(s) atendido(s) e confirmado(s)"}
+
+
+def verificar_planejamento(semente=0):
+    """Casos de planejamento que já falharam. Devolve uma linha por caso (``caso``, ``ok``, ``detalhe``)."""
+    pedido = {'OS': 'R1', 'Cliente': 'Conferência', 'Descricao_Pedido': 'Caixa', 'Valor_Pedido_Total_R$': 100.0,
+              'Largura_Corte_m': 0.4, 'Comprimento_Corte_m': 0.4, 'Quantidade_Caixas': 4,
+              'Tipo_Papel': 'Onda C', 'Gramatura': 370.0, COLUNA_MODELO_OPCIONAL: ''}
+    # Retalho com folhas para só parte do pedido: o restante não pode voltar a sair do mesmo retalho
+    df_estoque = pd.DataFrame({
+        'Modelo_Chapa': [nome_retalho(500, 500), 'CH-1'], 'Largura_m': [0.5, 1.6], 'Comprimento_m': [0.5, 2.4],
+        'Tipo_Papel': 'Onda C', 'Gramatura': 370.0, 'Quantidade_Folhas': [3, 100], 'Preco_Kg': [0.01, 5.0],
+    })
+    return [
+        _conferir_lote('retalho_parcial_e_chapa', df_estoque, pd.DataFrame([pedido]), atendidos_esperados=1),
+        _conferir_lote('lote_sintetico', gerar_estoque_sintetico(5_000, semente), gerar_pedidos_sinteticos(50, semente)),
+    ]
+
+
+def verificar_corte_global(semente=0, grupos=30, tempo_limite_s=0.1):
+    """Otimização global: nunca mais folhas que o plano por pedido, e ``tempo_limite_s`` respeitado.
+
+    Devolve linhas no formato de ``verificar_planejamento``.
+    """
+    rng = np.random.default_rng(semente)
+    piores, mais_lento = [], 0.0
+    for grupo in range(grupos):
+        df_pedidos = gerar_pedidos_sinteticos(int(rng.integers(5, 40)), semente + grupo)
+        resultado = otimizar_corte_global(df_pedidos['Largura_Corte_m'] * 1000, df_pedidos['Comprimento_Corte_m'] * 1000,
+                                          df_pedidos['Quantidade_Caixas'], 1600, 2400, tempo_limite_s)
+        mais_lento = max(mais_lento, resultado.tempo_s)
+        if resultado.folhas_global > resultado.folhas_por_pedido:
+            piores.append(f"{resultado.folhas_global} > {resultado.folhas_por_pedido}")
+    # Vários grupos e dezenas de formatos de chapa dividindo o mesmo limite
+    estoque = EstoqueMemoria.de_dataframe(gerar_estoque_sintetico(5_000, semente))
+    inicio = time.perf_counter()
+    otimizar_pedidos_estoque(estoque, gerar_pedidos_sinteticos(100, semente), 10 * tempo_limite_s)
+    duracao_lote = time.perf_counter() - inicio
+    folga_s = 0.1  # Plano por pedido dos formatos e montagem do resultado, fora do laço com prazo
+    return [
+        {'caso': 'corte_global_nao_piora', 'ok': not piores,
+         'detalhe': f"{grupos} grupos em 1600x2400" + (f"; mais folhas que o plano por pedido: {', '.join(piores)}"
+                                                        if piores else "")},
+        {'caso': 'corte_global_prazo',
+         'ok': mais_lento <= tempo_limite_s + folga_s and duracao_lote <= 10 * tempo_limite_s + folga_s,
+         'detalhe': f"grupo mais lento {mais_lento:.2f} s (limite {tempo_limite_s:g} s); "
+                    f"lote {duracao_lote:.2f} s (limite {10 * tempo_limite_s:g} s)"},
+    ]
+
+
+def executar(tamanhos=TAMANHOS_PADRAO, pedidos=200, semente=0):
+    """Roda todos os casos. Devolve ``(referencias, resultados)`` como listas de dicionários."""
+    referencias = verificar_referencias()
+    resultados = []
+    df_pedidos = gerar_pedidos_sinteticos(pedidos, semente)
+    pecas_mm = df_pedidos[['Largura_Corte_m', 'Comprimento_Corte_m']].to_numpy() * 1000
+
+    # Independe do tamanho do estoque: um par (peça, chapa) por chamada
+    resultados.append(_medir('aninhamento_escalar', 0, lambda i: calcular_aproveitamento_e_retalhos(
+        pecas_mm[i % len(pecas_mm), 0], pecas_mm[i % len(pecas_mm), 1], 1600, 2400), 1000, repeticoes_memoria=100))
+
+    for linhas in tamanhos:
+        df_estoque = gerar_estoque_sintetico(linhas, semente)
+
+        csv = io.StringIO()
+        df_estoque.to_csv(csv, index=False, sep=';', decimal=',')
+        csv = csv.getvalue()
+        with tempfile.TemporaryDirectory() as pasta:
+            # Mesmo caminho do aplicativo e da CLI: blocos tipados gravados direto no banco (substitui o estoque)
+            banco = BancoEstoque(os.path.join(pasta, 'carga.db'))
+            resultados.append(_medir('carga_csv', linhas, lambda i: banco.importar_estoque(
+                ler_estoque_em_blocos(io.StringIO(csv))), 3, linhas))
+
+        estoque = EstoqueMemoria.de_dataframe(df_estoque)
+        larguras_mm = estoque.coluna('Largura_mm')
+        comprimentos_mm = estoque.coluna('Comprimento_mm')
+        resultados.append(_medir('aninhamento_estoque', linhas, lambda i: calcular_aproveitamento_lote(
+            pecas_mm[i % len(pecas_mm), 0], pecas_mm[i % len(pecas_mm), 1], larguras_mm, comprimentos_mm), 10, linhas))
+
+        resultados.append(_medir('planejamento_lote', linhas, lambda i: planejar_lote(estoque, df_pedidos),
+                                 3, pedidos))
+
+        with tempfile.TemporaryDirectory() as pasta:
+            banco = BancoEstoque(os.path.join(pasta, 'benchmark.db'))
+            banco.importar_estoque(df_estoque)
+            # Cada movimento só pode ser confirmado uma vez: os últimos ficam para a medição de memória
+            _, movimentos = planejar_lote(estoque, df_pedidos)
+            repeticoes_memoria = min(10, len(movimentos) // 2)
+            if len(movimentos) > repeticoes_memoria:
+                resultados.append(_medir('confirmacao_pedido', linhas,
+                                         lambda i: banco.confirmar_pedido(*movimentos[i]),
+                                         len(movimentos) - repeticoes_memoria, repeticoes_memoria=repeticoes_memoria))
+    return referencias, resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m gbs.benchmark', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO,
+                        help='Linhas dos estoques sintéticos (padrão: %(default)s)')
+    parser.add_argument('--pedidos', type=int, default=200, help='Pedidos por lote (padrão: %(default)s)')
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--json', help='Grava referências e resultados neste arquivo JSON')
+    args = parser.parse_args(argv)
+
+    conferencias = verificar_planejamento(args.semente) + verificar_corte_global(args.semente)
+    referencias, resultados = executar(args.tamanhos, args.pedidos, args.semente)
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.2f}'.format):
+        print("Casos de referência (ótimo conhecido):")
+        print(pd.DataFrame(referencias).to_string(index=False))
+        print()
+        print("Conferências do planejamento:")
+        print(pd.DataFrame(conferencias).to_string(index=False))
+        print()
+        print(pd.DataFrame(resultados).to_string(index=False))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump({'referencias': referencias, 'conferencias': conferencias, 'resultados': resultados},
+                      arquivo, indent=2, ensure_ascii=False)
+
+    falhas = [ref['caso'] for ref in referencias if not ref['ok']]
+    if falhas:
+        print(f"Aproveitamento abaixo do ótimo em: {', '.join(falhas)}", file=sys.stderr)
+    falhas_planejamento = [conferencia['caso'] for conferencia in conferencias if not conferencia['ok']]
+    if falhas_planejamento:
+        print(f"Planejamento incorreto em: {', '.join(falhas_planejamento)}", file=sys.stderr)
+    return 1 if falhas or falhas_planejamento else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
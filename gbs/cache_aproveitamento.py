@@ -0,0 +1,145 @@
+"""Cache dos resultados do motor de aproveitamento, compartilhado pelo processo.
+
+O catálogo tem algumas centenas de medidas de caixa e poucas dezenas de
+formatos de chapa, e cada rerun do Streamlit recalcula os mesmos pares. Aqui
+cada par (chapa de corte, chapa base, opções) é calculado uma vez e guardado
+num LRU limitado; uma chamada com N pares calcula, numa única chamada
+vetorizada, só os pares distintos que ainda não estão no cache.
+
+Por ser um objeto do módulo, o cache é único por processo e portanto
+compartilhado por todas as sessões do servidor. O cache guarda a
+``aproveitamento.VERSAO_ALGORITMO`` com que foi preenchido: ao mudar a versão
+do motor ele é esvaziado e nenhum resultado antigo é reaproveitado.
+
+Chave e valor são ``bytes`` compactos (as medidas e opções; os campos de uma
+linha do resultado como float64), cerca de 300 bytes por par somando a
+entrada do ``OrderedDict``. Tuplas de floats e arrays NumPy de uma linha
+custavam mais de 1 KB por par.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from gbs import aproveitamento, metricas
+
+CAPACIDADE_PADRAO = 50_000  # Pares guardados; ~300 bytes cada (tracemalloc), ~15 MB cheio
+
+_CASAS_DECIMAIS_MM = 6  # Arredonda ruído de float (ex.: 1.2 * 1000) antes de montar a chave
+
+
+class CacheAproveitamento:
+    """LRU de ``ResultadoAproveitamento`` por par, seguro para várias threads (sessões)."""
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()  # chave (bytes) -> campos de uma linha do resultado, float64 em bytes
+        self._formato = None  # (dtype, colunas) de cada campo de ResultadoAproveitamento, do primeiro cálculo
+        self._trava = threading.Lock()
+        self._versao = aproveitamento.VERSAO_ALGORITMO
+        self.acertos = 0
+        self.falhas = 0
+        self.descartes = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def limpar(self):
+        """Esvazia o cache e zera os contadores."""
+        with self._trava:
+            self._itens.clear()
+            self.acertos = self.falhas = self.descartes = 0
+
+    def estatisticas(self):
+        """Contadores para acompanhamento: acertos, falhas, descartes (LRU), itens e taxa de acerto."""
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'acertos': self.acertos, 'falhas': self.falhas, 'descartes': self.descartes,
+                'itens': len(self._itens), 'capacidade': self.capacidade,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+                'versao_algoritmo': self._versao,
+            }
+
+    def calcular(self, largura_corte_mm, comprimento_corte_mm, largura_chapa_base_mm, comprimento_chapa_base_mm,
+                 permitir_rotacao=True, permitir_misto=True):
+        """Mesma interface e resultado de ``calcular_aproveitamento_lote``, consultando o cache."""
+        pares = np.stack([np.ravel(x) for x in np.broadcast_arrays(
+            np.asarray(largura_corte_mm, dtype=np.float64),
+            np.asarray(comprimento_corte_mm, dtype=np.float64),
+            np.asarray(largura_chapa_base_mm, dtype=np.float64),
+            np.asarray(comprimento_chapa_base_mm, dtype=np.float64),
+        )], axis=1).round(_CASAS_DECIMAIS_MM)
+        if not len(pares):
+            return aproveitamento.calcular_aproveitamento_lote(*pares.T, permitir_rotacao=permitir_rotacao,
+                                                               permitir_misto=permitir_misto)
+        # Pares distintos: np.unique sobre cada linha vista como um bloco de bytes é bem mais rápido que axis=0
+        _, primeiros, inverso = np.unique(np.ascontiguousarray(pares).view(np.dtype((np.void, pares.shape[1] * 8))),
+                                          return_index=True, return_inverse=True)
+        distintos, inverso = pares[primeiros], inverso.reshape(-1)
+
+        versao = aproveitamento.VERSAO_ALGORITMO
+        opcoes = bytes((bool(permitir_rotacao), bool(permitir_misto)))
+        chaves = [par.tobytes() + opcoes for par in distintos]
+        linhas = [None] * len(chaves)
+        faltando = []
+        with self._trava:
+            if versao != self._versao:
+                # Motor de aproveitamento mudou: resultados antigos não valem mais
+                self._itens.clear()
+                self._versao = versao
+            for i, chave in enumerate(chaves):
+                linha = self._itens.get(chave)
+                if linha is None:
+                    faltando.append(i)
+                else:
+                    self._itens.move_to_end(chave)
+                    linhas[i] = linha
+            self.acertos += len(chaves) - len(faltando)
+            self.falhas += len(faltando)
+        # Os contadores acima são do processo; o perfil ativo recebe só as consultas desta execução
+        metricas.contar(cache_acertos=len(chaves) - len(faltando), cache_falhas=len(faltando))
+
+        if faltando:
+            # Fora da trava: outras sessões seguem consultando enquanto o motor calcula
+            calculado = aproveitamento.calcular_aproveitamento_lote(
+                *distintos[faltando].T, permitir_rotacao=permitir_rotacao, permitir_misto=permitir_misto)
+            # Todos os campos são numéricos e os inteiros são pequenos: cabem exatos em float64
+            colunas = [campo.reshape(len(campo), -1) for campo in calculado]
+            matriz = np.concatenate(colunas, axis=1).astype(np.float64)
+            with self._trava:
+                self._formato = [(campo.dtype, coluna.shape[1]) for campo, coluna in zip(calculado, colunas)]
+                for j, i in enumerate(faltando):
+                    linhas[i] = matriz[j].tobytes()
+                    self._itens[chaves[i]] = linhas[i]
+                    self._itens.move_to_end(chaves[i])
+                while len(self._itens) > self.capacidade:
+                    self._itens.popitem(last=False)
+                    self.descartes += 1
+
+        return self._montar(linhas, inverso)
+
+    def _montar(self, linhas, inverso):
+        """``ResultadoAproveitamento`` a partir das linhas guardadas, expandidas de volta para os N pares."""
+        matriz = np.frombuffer(b''.join(linhas), dtype=np.float64).reshape(len(linhas), -1)[inverso]
+        campos, inicio = [], 0
+        for dtype, largura in self._formato:
+            bloco = matriz[:, inicio:inicio + largura].astype(dtype)
+            campos.append(bloco if largura > 1 else bloco.reshape(-1))
+            inicio += largura
+        return aproveitamento.ResultadoAproveitamento(*campos)
+
+
+_cache = CacheAproveitamento()
+
+
+def obter_cache():
+    """Cache único do processo (compartilhado por todas as sessões do Streamlit)."""
+    return _cache
+
+
+def calcular_aproveitamento(largura_corte_mm, comprimento_corte_mm, largura_chapa_base_mm, comprimento_chapa_base_mm,
+                            permitir_rotacao=True, permitir_misto=True):
+    """``calcular_aproveitamento_lote`` através do cache do processo."""
+    return _cache.calcular(largura_corte_mm, comprimento_corte_mm, largura_chapa_base_mm, comprimento_chapa_base_mm,
+                           permitir_rotacao, permitir_misto)
@@ -0,0 +1,193 @@
+"""Simulação de cenários de compra: o histórico de pedidos refeito com outros formatos de chapa.
+
+Cada cenário é um catálogo de chapas candidatas (``Modelo_Chapa``,
+``Largura_m``, ``Comprimento_m``, ``Preco_Kg`` e, opcionalmente,
+``Tipo_Papel``/``Gramatura`` para restringir a linha a um papel; em branco vale
+para todos). O histórico (``df_pedidos``/``BancoEstoque.exportar_pedidos``) é
+replanejado em ordem com ``planejar_pedido``, como se o catálogo estivesse em
+estoque sem limite de folhas: os retalhos gerados entram no estoque simulado e
+são reaproveitados pelos pedidos seguintes, como no planejamento real.
+
+Pedidos de (Tipo_Papel, Gramatura) diferentes nunca disputam chapas nem
+retalhos, então cada par (cenário, papel) é uma tarefa independente. As tarefas
+são distribuídas num ``ProcessPoolExecutor``; o histórico vai uma vez para cada
+processo (no ``initializer``) e cada processo tem o seu próprio cache de
+aproveitamento.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from gbs.estoque import PREFIXO_RETALHO, EstoqueMemoria
+from gbs.lote import COLUNA_MODELO_OPCIONAL, planejar_pedido
+
+COLUNAS_CATALOGO = ['Modelo_Chapa', 'Largura_m', 'Comprimento_m', 'Preco_Kg']
+COLUNAS_CATALOGO_OPCIONAIS = ['Tipo_Papel', 'Gramatura']  # Em branco: a chapa vale para qualquer papel
+
+COLUNAS_RESUMO = [
+    'Cenario', 'Pedidos', 'Pedidos_Atendidos', 'Caixas', 'Chapas_Consumidas', 'Retalhos_Consumidos',
+    'Peso_Chapas_kg', 'Peso_Pecas_kg', 'Peso_Retalhos_Sobra_kg', 'Perda_kg', 'Aproveitamento_%',
+    'Custo_Chapas_R$', 'Custo_por_Caixa_R$'
+]
+COLUNAS_CHAPAS = ['Cenario', 'Tipo_Papel', 'Gramatura', 'Modelo_Chapa', 'Chapas_Consumidas', 'Peso_kg', 'Custo_R$']
+
+_COLUNAS_CONTAGEM = ['Pedidos', 'Pedidos_Atendidos', 'Caixas', 'Chapas_Consumidas', 'Retalhos_Consumidos']
+
+_FOLHAS_ILIMITADAS = 10 ** 12  # Estoque simulado: o catálogo nunca fica sem folhas
+
+_pedidos_por_grupo = {}  # Preenchido em cada processo por _iniciar_processo
+
+
+class ResultadoCenarios(NamedTuple):
+    """Comparativo dos cenários: uma linha por cenário e o consumo por chapa."""
+    resumo: pd.DataFrame
+    chapas: pd.DataFrame
+
+
+def pedidos_do_historico(df_historico):
+    """Converte o log de pedidos (``Dimensao_Corte_LxC_m`` etc.) nas colunas de ``planejar_pedido``.
+
+    O modelo de chapa usado na época é descartado: no cenário a chapa é
+    escolhida entre as do catálogo.
+    """
+    dimensoes = df_historico['Dimensao_Corte_LxC_m'].astype(str).str.extract(r'^\s*([^xX]+)[xX](.+?)\s*$')
+    return pd.DataFrame({
+        'OS': df_historico['OS'].fillna('').astype(str),
+        'Cliente': df_historico.get('Cliente', ''),
+        'Descricao_Pedido': df_historico.get('Descricao_Pedido', ''),
+        'Valor_Pedido_Total_R$': df_historico.get('Valor_Pedido_Total_R$', 0.0),
+        'Largura_Corte_m': pd.to_numeric(dimensoes[0], errors='coerce'),
+        'Comprimento_Corte_m': pd.to_numeric(dimensoes[1], errors='coerce'),
+        'Quantidade_Caixas': pd.to_numeric(df_historico['Quantidade_Caixas'], errors='coerce'),
+        'Tipo_Papel': df_historico['Tipo_Papel_Pedido'].fillna('').astype(str).str.strip(),
+        'Gramatura': pd.to_numeric(df_historico['Gramatura_Pedido'], errors='coerce'),
+        COLUNA_MODELO_OPCIONAL: '',
+    })
+
+
+def _validar_catalogo(nome, catalogo):
+    faltando = [coluna for coluna in COLUNAS_CATALOGO if coluna not in catalogo.columns]
+    if faltando:
+        raise ValueError(f"Cenário '{nome}': colunas obrigatórias ausentes no catálogo: {', '.join(faltando)}")
+    catalogo = catalogo.copy()
+    for coluna in COLUNAS_CATALOGO_OPCIONAIS:
+        if coluna not in catalogo.columns:
+            catalogo[coluna] = np.nan
+    catalogo['Tipo_Papel'] = catalogo['Tipo_Papel'].fillna('').astype(str).str.strip()
+    for coluna in ['Largura_m', 'Comprimento_m', 'Preco_Kg', 'Gramatura']:
+        catalogo[coluna] = pd.to_numeric(catalogo[coluna], errors='coerce')
+    return catalogo[COLUNAS_CATALOGO + COLUNAS_CATALOGO_OPCIONAIS]
+
+
+def _chapas_do_grupo(catalogo, tipo_papel, gramatura):
+    """Linhas do catálogo que valem para o papel; a linha específica prevalece sobre a genérica."""
+    vale = (((catalogo['Tipo_Papel'] == '') | (catalogo['Tipo_Papel'] == tipo_papel))
+            & (catalogo['Gramatura'].isna() | (catalogo['Gramatura'] == gramatura)))
+    chapas = catalogo[vale].assign(_especifica=lambda df: (df['Tipo_Papel'] != '') | df['Gramatura'].notna())
+    return chapas.sort_values('_especifica', kind='stable').drop_duplicates('Modelo_Chapa', keep='last')
+
+
+def _iniciar_processo(pedidos_por_grupo):
+    global _pedidos_por_grupo
+    _pedidos_por_grupo = pedidos_por_grupo
+
+
+def _simular_grupo(nome, tipo_papel, gramatura, chapas, usar_retalhos):
+    """Refaz os pedidos de um papel contra o catálogo. Roda num processo do pool."""
+    estoque = EstoqueMemoria()
+    for modelo, largura_m, comprimento_m, preco_kg in chapas:
+        estoque.upsert(modelo, largura_m, comprimento_m, tipo_papel, gramatura, _FOLHAS_ILIMITADAS, preco_kg)
+
+    kg_por_m2 = gramatura / 1000
+    resumo = dict.fromkeys(_COLUNAS_CONTAGEM, 0)
+    resumo.update(dict.fromkeys(['Peso_Chapas_kg', 'Peso_Pecas_kg', 'Custo_Chapas_R$'], 0.0))
+    por_modelo = {}  # modelo -> [folhas, peso_kg, custo_R$]
+    for pedido in _pedidos_por_grupo[(tipo_papel, gramatura)]:
+        resumo['Pedidos'] += 1
+        plano, movimento = planejar_pedido(estoque, pedido, usar_retalhos)
+        if movimento is None:
+            continue
+        resumo['Pedidos_Atendidos'] += 1
+        resumo['Caixas'] += plano['Quantidade_Caixas']
+        resumo['Peso_Pecas_kg'] += plano['Peso_Total_Pedido_kg']
+        for consumo in plano['Consumos']:
+            if consumo['Modelo_Chapa'].startswith(PREFIXO_RETALHO):
+                resumo['Retalhos_Consumidos'] += consumo['Folhas']
+                continue
+            peso_kg = consumo['Folhas'] * consumo['Largura_m'] * consumo['Comprimento_m'] * kg_por_m2
+            custo = peso_kg * estoque.coluna('Preco_Kg')[consumo['pos']]
+            acumulado = por_modelo.setdefault(consumo['Modelo_Chapa'], [0, 0.0, 0.0])
+            acumulado[0] += consumo['Folhas']
+            acumulado[1] += peso_kg
+            acumulado[2] += custo
+            resumo['Chapas_Consumidas'] += consumo['Folhas']
+            resumo['Peso_Chapas_kg'] += peso_kg
+            resumo['Custo_Chapas_R$'] += custo
+
+    # Retalhos que sobraram no fim não são perda: ainda podem ser usados
+    df = estoque.para_dataframe(ordenar=False)
+    sobra = df[df['Modelo_Chapa'].str.startswith(PREFIXO_RETALHO)]
+    resumo['Peso_Retalhos_Sobra_kg'] = float(sobra['Peso_Total_kg'].sum())
+    chapas_consumidas = [(nome, tipo_papel, gramatura, modelo, *valores) for modelo, valores in por_modelo.items()]
+    return nome, resumo, chapas_consumidas
+
+
+def comparar_cenarios(df_historico, cenarios, usar_retalhos=True, processos=None):
+    """Refaz ``df_historico`` contra cada catálogo de ``cenarios`` (nome -> DataFrame) em paralelo.
+
+    ``processos`` limita o pool (padrão: número de CPUs); com ``processos=1``
+    tudo roda no processo atual, sem pool. Levanta ``ValueError`` se faltar
+    coluna em algum catálogo.
+    """
+    catalogos = {nome: _validar_catalogo(nome, catalogo) for nome, catalogo in cenarios.items()}
+    pedidos = pedidos_do_historico(df_historico)
+    # Pedidos sem papel válido não entram em nenhum grupo; contam como não atendidos
+    validos = (pedidos['Tipo_Papel'] != '') & pedidos['Gramatura'].notna()
+    pedidos_por_grupo = {grupo: df.to_dict('records')
+                         for grupo, df in pedidos[validos].groupby(['Tipo_Papel', 'Gramatura'], sort=False)}
+
+    tarefas = []
+    for nome, catalogo in catalogos.items():
+        for tipo_papel, gramatura in pedidos_por_grupo:
+            chapas = _chapas_do_grupo(catalogo, tipo_papel, gramatura)
+            tarefas.append((nome, tipo_papel, gramatura,
+                            list(chapas[['Modelo_Chapa', 'Largura_m', 'Comprimento_m', 'Preco_Kg']]
+                                 .itertuples(index=False, name=None)),
+                            usar_retalhos))
+
+    processos = processos or os.cpu_count() or 1
+    if processos == 1 or len(tarefas) <= 1:
+        _iniciar_processo(pedidos_por_grupo)
+        resultados = [_simular_grupo(*tarefa) for tarefa in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(tarefas)), initializer=_iniciar_processo,
+                                 initargs=(pedidos_por_grupo,)) as pool:
+            # Tarefas maiores primeiro, para nenhum processo ficar com a última tarefa longa sozinho
+            ordem = sorted(range(len(tarefas)), key=lambda i: -len(pedidos_por_grupo[tarefas[i][1:3]]))
+            resultados = [None] * len(tarefas)
+            for i, resultado in zip(ordem, pool.map(_simular_grupo, *zip(*(tarefas[i] for i in ordem)),
+                                                    chunksize=max(1, math.ceil(len(tarefas) / (4 * processos))))):
+                # De volta à ordem das tarefas: as somas abaixo saem iguais para qualquer número de processos
+                resultados[i] = resultado
+
+    linhas = {nome: {'Cenario': nome, 'Pedidos': len(pedidos)} for nome in catalogos}
+    chapas = []
+    for nome, resumo, chapas_grupo in resultados:
+        resumo.pop('Pedidos')
+        for coluna, valor in resumo.items():
+            linhas[nome][coluna] = linhas[nome].get(coluna, 0) + valor
+        chapas.extend(chapas_grupo)
+
+    df_resumo = pd.DataFrame(list(linhas.values()), columns=COLUNAS_RESUMO).fillna(0)
+    df_resumo = df_resumo.astype({coluna: np.int64 for coluna in _COLUNAS_CONTAGEM})
+    df_resumo['Perda_kg'] = df_resumo['Peso_Chapas_kg'] - df_resumo['Peso_Pecas_kg'] - df_resumo['Peso_Retalhos_Sobra_kg']
+    df_resumo['Aproveitamento_%'] = (df_resumo['Peso_Pecas_kg'] / df_resumo['Peso_Chapas_kg'].replace(0, np.nan)
+                                     * 100).fillna(0.0)
+    df_resumo['Custo_por_Caixa_R$'] = (df_resumo['Custo_Chapas_R$'] / df_resumo['Caixas'].replace(0, np.nan)).fillna(0.0)
+    df_chapas = pd.DataFrame(chapas, columns=COLUNAS_CHAPAS).sort_values(['Cenario', 'Tipo_Papel', 'Gramatura',
+                                                                          'Modelo_Chapa'], ignore_index=True)
+    return ResultadoCenarios(df_resumo, df_chapas)
@@ -0,0 +1,261 @@
+"""Linha de comando do GBS, para rodar o planejamento sem a interface web.
+
+Exemplos::
+
+    python -m gbs planejar pedidos.xlsx --saida plano.csv
+    python -m gbs planejar pedidos.csv --confirmar --otimizacao-global 60
+    python -m gbs importar-estoque estoque.csv
+    python -m gbs exportar-estoque --saida estoque.parquet
+    python -m gbs exportar-pedidos --saida pedidos.csv
+    python -m gbs exportar-movimentos --desde 1200 --saida movimentos.csv
+    python -m gbs --banco copia.db aplicar-movimentos movimentos.csv
+    python -m gbs cenarios atual.csv proposta.csv --processos 8 --saida cenarios.csv
+    python -m gbs benchmark --tamanhos 1000 10000
+    python -m gbs --metricas metricas.jsonl planejar pedidos.csv
+
+O banco é o mesmo do aplicativo (``--banco`` ou variável ``GBS_BANCO``). Com
+``--metricas`` (ou ``GBS_METRICAS``) o tempo de cada etapa do comando é
+anexado ao arquivo como uma linha JSON (veja ``gbs.metricas``). Os
+módulos de cálculo (NumPy, pandas) só são importados pelo comando que os usa,
+então ``--help`` e erros de argumento respondem na hora.
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+BANCO_PADRAO = 'gbs_estoque.db'
+
+
+def _escrever(conteudo, saida):
+    """Grava bytes em ``saida`` ou na saída padrão (``-``)."""
+    if saida == '-':
+        sys.stdout.buffer.write(conteudo)
+        sys.stdout.flush()
+    else:
+        with open(saida, 'wb') as arquivo:
+            arquivo.write(conteudo)
+
+
+@contextlib.contextmanager
+def _abrir_saida(saida):
+    """Arquivo binário para gravar aos poucos: ``saida`` ou a saída padrão (``-``)."""
+    if saida == '-':
+        yield sys.stdout.buffer
+        sys.stdout.flush()
+    else:
+        with open(saida, 'wb') as arquivo:
+            yield arquivo
+
+
+def _formato(args):
+    from gbs.relatorios import formato_do_arquivo
+
+    return args.formato or formato_do_arquivo(args.saida)
+
+
+def _planejar(args):
+    from gbs.lote import STATUS_OK, ler_pedidos_lote, planejar_lote
+    from gbs.metricas import etapa
+    from gbs.persistencia import BancoEstoque, EstoqueInsuficiente
+    from gbs.relatorios import para_csv
+
+    banco = BancoEstoque(args.banco)
+    with etapa('banco.carregar_estoque'):
+        estoque, _ = banco.carregar_estoque()
+    with etapa('ler_pedidos_lote'), open(args.pedidos, 'rb') as arquivo:
+        df_pedidos = ler_pedidos_lote(arquivo, args.pedidos)
+    with etapa('planejar_lote', pedidos=len(df_pedidos), linhas=len(estoque)):
+        df_plano, movimentos = planejar_lote(estoque, df_pedidos)
+    atendidos = int((df_plano['Status'] == STATUS_OK).sum())
+    print(f"{atendidos} de {len(df_plano)} pedido(s) atendido(s); "
+          f"{int(df_plano['Chapas_Consumidas'].sum())} folha(s) consumida(s).", file=sys.stderr)
+    if args.saida:
+        _escrever(para_csv(df_plano), args.saida)
+
+    if args.otimizacao_global:
+        from gbs.corte_global import otimizar_pedidos_estoque
+        with etapa('otimizar_pedidos_estoque', pedidos=len(df_pedidos)):
+            df_otimizacao = otimizar_pedidos_estoque(estoque, df_pedidos, args.otimizacao_global)
+        print(df_otimizacao.to_string(index=False) if not df_otimizacao.empty
+              else "Otimização global: nenhuma chapa inteira com folhas para os pedidos.", file=sys.stderr)
+
+    if args.confirmar:
+        try:
+            with etapa('banco.confirmar_lote', pedidos=len(movimentos)):
+                retalhos_criados = banco.confirmar_lote(movimentos)
+        except EstoqueInsuficiente as e:
+            print(f"Erro: {e} Nenhum pedido foi lançado.", file=sys.stderr)
+            return 1
+        print(f"{len(movimentos)} pedido(s) lançado(s); {len(retalhos_criados)} retalho(s) novo(s) no estoque.",
+              file=sys.stderr)
+    return 0
+
+
+def _importar_estoque(args):
+    from gbs.estoque import ler_estoque_em_blocos
+    from gbs.metricas import cronometrar_blocos, etapa
+    from gbs.persistencia import BancoEstoque
+
+    try:
+        with etapa('importar_estoque'):
+            BancoEstoque(args.banco).importar_estoque(
+                cronometrar_blocos('ler_arquivo_estoque', ler_estoque_em_blocos(args.arquivo, args.arquivo)))
+    except ValueError as e:
+        print(f"Erro: {e} O estoque do banco não foi alterado.", file=sys.stderr)
+        return 1
+    print(f"Estoque de '{args.arquivo}' importado para '{args.banco}'.", file=sys.stderr)
+    return 0
+
+
+def _exportar_estoque(args):
+    from gbs.persistencia import BancoEstoque
+    from gbs.relatorios import exportar
+
+    with _abrir_saida(args.saida) as destino:
+        exportar(BancoEstoque(args.banco).estoque_em_blocos(), _formato(args), destino)
+    return 0
+
+
+def _exportar_pedidos(args):
+    from gbs.persistencia import BancoEstoque
+    from gbs.relatorios import exportar, pedidos_blocos
+
+    with _abrir_saida(args.saida) as destino:
+        exportar(pedidos_blocos(BancoEstoque(args.banco)), _formato(args), destino)
+    return 0
+
+
+def _exportar_movimentos(args):
+    from gbs.persistencia import BancoEstoque
+    from gbs.relatorios import para_csv
+
+    _escrever(para_csv(BancoEstoque(args.banco).movimentos(args.desde)), args.saida)
+    return 0
+
+
+def _aplicar_movimentos(args):
+    from gbs.persistencia import BancoEstoque
+    from gbs.relatorios import ler_tabela
+
+    banco = BancoEstoque(args.banco)
+    try:
+        aplicados = banco.aplicar_movimentos(ler_tabela(args.arquivo))
+    except ValueError as e:
+        print(f"Erro: {e} Nada foi aplicado.", file=sys.stderr)
+        return 1
+    print(f"{aplicados} movimento(s) aplicado(s); último movimento: {banco.ultimo_movimento()}.", file=sys.stderr)
+    return 0
+
+
+def _recuperar_estoque(args):
+    from gbs.persistencia import BancoEstoque
+
+    itens = BancoEstoque(args.banco).recuperar_estoque()
+    print(f"Estoque refeito a partir do livro de movimentos: {itens} item(ns).", file=sys.stderr)
+    return 0
+
+
+def _cenarios(args):
+    from gbs.cenarios import comparar_cenarios
+    from gbs.persistencia import BancoEstoque
+    from gbs.relatorios import ler_tabela, para_csv
+
+    if args.historico:
+        df_historico = ler_tabela(args.historico)
+    else:
+        df_historico = BancoEstoque(args.banco).exportar_pedidos()
+    cenarios = {os.path.splitext(os.path.basename(caminho))[0]: ler_tabela(caminho) for caminho in args.catalogos}
+    resultado = comparar_cenarios(df_historico, cenarios, usar_retalhos=not args.sem_retalhos,
+                                  processos=args.processos)
+    print(resultado.resumo.to_string(index=False), file=sys.stderr)
+    if args.saida:
+        _escrever(para_csv(resultado.resumo), args.saida)
+    if args.saida_chapas:
+        _escrever(para_csv(resultado.chapas), args.saida_chapas)
+    return 0
+
+
+def _benchmark(args):
+    from gbs.benchmark import main as benchmark_main
+
+    return benchmark_main(args.argumentos)
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog='python -m gbs', description="GBS - Planejamento e Controle de Produção")
+    parser.add_argument('--banco', default=os.environ.get('GBS_BANCO', BANCO_PADRAO),
+                        help='Arquivo SQLite do estoque (padrão: $GBS_BANCO ou %(default)s)')
+    parser.add_argument('--metricas', default=os.environ.get('GBS_METRICAS'), metavar='ARQUIVO',
+                        help='Anexa o tempo de cada etapa do comando a este arquivo JSON Lines (padrão: $GBS_METRICAS)')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    planejar = comandos.add_parser('planejar', help='Planeja um lote de pedidos (CSV ou XLSX) contra o estoque do banco')
+    planejar.add_argument('pedidos', help="Arquivo de pedidos (.csv com ';' e vírgula decimal, ou .xlsx)")
+    planejar.add_argument('--saida', help="Grava o plano em CSV neste arquivo ('-' para a saída padrão)")
+    planejar.add_argument('--confirmar', action='store_true',
+                          help='Lança os pedidos atendidos no banco (uma única transação)')
+    planejar.add_argument('--otimizacao-global', type=float, metavar='SEGUNDOS',
+                          help='Também compara com a otimização global, com este limite de tempo')
+    planejar.set_defaults(funcao=_planejar)
+
+    importar = comandos.add_parser('importar-estoque',
+                                   help='Substitui o estoque do banco pelo conteúdo de um CSV ou Parquet (lido em blocos)')
+    importar.add_argument('arquivo')
+    importar.set_defaults(funcao=_importar_estoque)
+
+    for nome, ajuda, funcao in [('exportar-estoque', 'Exporta o estoque do banco', _exportar_estoque),
+                                ('exportar-pedidos', 'Exporta o histórico de pedidos do banco', _exportar_pedidos)]:
+        exportar = comandos.add_parser(nome, help=f'{ajuda} em CSV ou Parquet (gravado em blocos)')
+        exportar.add_argument('--saida', default='-', help="Arquivo de saída (padrão: '-', a saída padrão)")
+        exportar.add_argument('--formato', choices=['CSV', 'Parquet'],
+                              help='Padrão: Parquet se a saída terminar em .parquet, senão CSV')
+        exportar.set_defaults(funcao=funcao)
+
+    exportar_mov = comandos.add_parser('exportar-movimentos', help='Exporta o livro de movimentos do estoque em CSV')
+    exportar_mov.add_argument('--desde', type=int, default=0,
+                              help='Só os movimentos com número maior que este (padrão: todos)')
+    exportar_mov.add_argument('--saida', default='-', help="Arquivo de saída (padrão: '-', a saída padrão)")
+    exportar_mov.set_defaults(funcao=_exportar_movimentos)
+
+    aplicar_mov = comandos.add_parser('aplicar-movimentos',
+                                      help='Aplica ao banco os movimentos exportados de outro banco (cópia)')
+    aplicar_mov.add_argument('arquivo')
+    aplicar_mov.set_defaults(funcao=_aplicar_movimentos)
+
+    recuperar = comandos.add_parser('recuperar-estoque',
+                                    help='Refaz o estoque a partir do último snapshot e dos movimentos seguintes')
+    recuperar.set_defaults(funcao=_recuperar_estoque)
+
+    cenarios = comandos.add_parser('cenarios', help='Compara catálogos de chapas refazendo o histórico de pedidos')
+    cenarios.add_argument('catalogos', nargs='+',
+                          help="CSVs de catálogo (Modelo_Chapa, Largura_m, Comprimento_m, Preco_Kg; "
+                               "Tipo_Papel e Gramatura opcionais); o nome do arquivo é o nome do cenário")
+    cenarios.add_argument('--historico', help="CSV do histórico de pedidos (padrão: log de pedidos do banco)")
+    cenarios.add_argument('--processos', type=int, help='Processos em paralelo (padrão: número de CPUs)')
+    cenarios.add_argument('--sem-retalhos', action='store_true', help='Não reaproveita os retalhos gerados')
+    cenarios.add_argument('--saida', help="Grava o resumo por cenário em CSV ('-' para a saída padrão)")
+    cenarios.add_argument('--saida-chapas', help='Grava o consumo por chapa de cada cenário em CSV')
+    cenarios.set_defaults(funcao=_cenarios)
+
+    benchmark = comandos.add_parser('benchmark', help='Benchmark dos caminhos críticos (veja python -m gbs.benchmark -h)',
+                                    add_help=False)
+    benchmark.set_defaults(funcao=_benchmark)  # Os argumentos seguintes vão direto para gbs.benchmark
+    return parser
+
+
+def main(argv=None):
+    parser = criar_parser()
+    args, restantes = parser.parse_known_args(argv)
+    if args.comando == 'benchmark':
+        args.argumentos = restantes
+    elif restantes:
+        parser.error(f"argumentos não reconhecidos: {' '.join(restantes)}")
+    if not args.metricas:
+        return args.funcao(args)
+
+    from gbs.metricas import perfil
+
+    os.environ['GBS_METRICAS'] = args.metricas  # Lido por gbs.metricas.emitir
+    with perfil(f'cli.{args.comando}'):
+        return args.funcao(args)
@@ -0,0 +1,264 @@
+"""Otimização global de corte: combina peças de vários pedidos na mesma chapa.
+
+O plano por pedido (``calcular_aproveitamento_lote``) aninha só peças iguais em
+cada chapa; aqui os pedidos pendentes de um mesmo Tipo_Papel e Gramatura são
+resolvidos juntos, como um problema de corte (cutting stock) guilhotinado de
+dois estágios, por uma heurística sequencial com limite de tempo:
+
+1. Para cada altura de faixa possível, uma mochila 0/1 (NumPy, resolução de
+   1 mm) escolhe as peças (de qualquer pedido, normal ou girada) que melhor
+   preenchem a largura da chapa.
+2. Uma segunda mochila empilha essas faixas ao longo do comprimento da chapa.
+3. O padrão resultante é repetido enquanto houver demanda para ele; a demanda
+   restante gera o próximo padrão.
+
+Depois de cada padrão, o plano é comparado com o que sairia completando a
+demanda restante pelo plano por pedido, e fica o melhor dos dois: o resultado
+nunca usa mais folhas que o plano por pedido (sem nenhum padrão, é o próprio
+plano por pedido). O limite de tempo é conferido também dentro das mochilas;
+se ele acabar, vale o melhor plano encontrado até ali.
+"""
+import math
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from gbs.cache_aproveitamento import calcular_aproveitamento
+from gbs.estoque import PREFIXO_RETALHO
+
+
+FORMATOS_OTIMIZADOS = 3  # Formatos de chapa (os melhores no plano por pedido) que recebem o tempo da otimização
+
+
+class ResultadoCorteGlobal(NamedTuple):
+    """Comparação entre o plano combinado e o plano atual (um pedido por vez) numa chapa."""
+    folhas_global: int
+    folhas_por_pedido: int
+    desperdicio_global_m2: float
+    desperdicio_por_pedido_m2: float
+    padroes: list  # [{'repeticoes': int, 'pecas': {indice_pedido: qtd_por_chapa}, 'sobra_ponta_mm': float}]
+    nao_cabem: list  # Índices dos pedidos cuja peça não cabe na chapa
+    completo: bool  # False se o limite de tempo interrompeu a busca de padrões
+    tempo_s: float
+
+
+def _mochila_01(pesos, valores, capacidade, prazo=None):
+    """Mochila 0/1 vetorizada. Devolve ``(valor, índices escolhidos)``, ou ``None`` se passar de ``prazo``."""
+    capacidade = int(capacidade)
+    dp = np.zeros(capacidade + 1)
+    escolhas = np.zeros((len(pesos), capacidade + 1), dtype=bool)
+    for j, (peso, valor) in enumerate(zip(pesos, valores)):
+        if prazo is not None and time.perf_counter() > prazo:
+            return None
+        if peso > capacidade:
+            continue
+        candidato = np.full(capacidade + 1, -np.inf)
+        candidato[peso:] = dp[:capacidade + 1 - peso] + valor
+        melhor = candidato > dp
+        escolhas[j] = melhor
+        dp = np.where(melhor, candidato, dp)
+
+    escolhidos = []
+    resto = int(np.argmax(dp))
+    for j in range(len(pesos) - 1, -1, -1):
+        if escolhas[j, resto]:
+            escolhidos.append(j)
+            resto -= pesos[j]
+    return float(dp.max()), escolhidos
+
+
+def _dividir_limite(peso, valor, limite, indice):
+    """Divisão binária (1, 2, 4, ...) de um item limitado em itens 0/1 ``(peso, valor, qtd, indice)``."""
+    partes, k = [], 1
+    while limite > 0:
+        qtd = min(k, limite)
+        partes.append((peso * qtd, valor * qtd, qtd, indice))
+        limite -= qtd
+        k *= 2
+    return partes
+
+
+def _gerar_padrao(larguras, comprimentos, demanda, L, C, prazo=None):
+    """Melhor padrão de dois estágios para a demanda restante.
+
+    Devolve ``(pecas_por_tipo, sobra_ponta)``, ou ``None`` se passar de ``prazo`` (``time.perf_counter``).
+    """
+    areas = larguras * comprimentos
+    # Orientações candidatas: (tipo, largura ocupada na faixa, altura da faixa)
+    orientacoes = [(i, larguras[i], comprimentos[i]) for i in range(len(demanda)) if demanda[i] > 0]
+    orientacoes += [(i, comprimentos[i], larguras[i]) for i in range(len(demanda))
+                    if demanda[i] > 0 and larguras[i] != comprimentos[i]]
+    orientacoes = [o for o in orientacoes if o[1] <= L and o[2] <= C]
+
+    # 1º estágio: a melhor composição de cada altura de faixa
+    faixas = []
+    for altura in sorted({o[2] for o in orientacoes}):
+        partes = []
+        for i, largura, altura_peca in orientacoes:
+            if altura_peca <= altura:
+                partes += _dividir_limite(largura, areas[i], min(demanda[i], L // largura), i)
+        mochila = _mochila_01([p[0] for p in partes], [p[1] for p in partes], L, prazo)
+        if mochila is None:
+            return None
+        valor, escolhidos = mochila
+        pecas = np.zeros(len(demanda), dtype=np.int64)
+        for j in escolhidos:
+            pecas[partes[j][3]] += partes[j][2]
+        if valor > 0:
+            # Repetir a faixa além do necessário para a demanda de suas peças não ajuda
+            repeticoes = max(int(np.max(np.ceil(demanda[pecas > 0] / pecas[pecas > 0]))), 1)
+            faixas.append((altura, valor, pecas, min(repeticoes, C // altura)))
+
+    # 2º estágio: empilhar faixas ao longo do comprimento
+    partes = []
+    for f, (altura, valor, _, limite) in enumerate(faixas):
+        partes += _dividir_limite(altura, valor, limite, f)
+    mochila = _mochila_01([p[0] for p in partes], [p[1] for p in partes], C, prazo)
+    if mochila is None:
+        return None
+    _, escolhidos = mochila
+
+    pecas = np.zeros(len(demanda), dtype=np.int64)
+    altura_usada = 0
+    for j in escolhidos:
+        _, _, qtd, f = partes[j]
+        pecas += faixas[f][2] * qtd
+        altura_usada += faixas[f][0] * qtd
+    return np.minimum(pecas, demanda), C - altura_usada
+
+
+def otimizar_corte_global(larguras_corte_mm, comprimentos_corte_mm, quantidades,
+                          largura_chapa_mm, comprimento_chapa_mm, tempo_limite_s=2.0):
+    """Planeja juntos os pedidos (mesmo Tipo e Gramatura) numa chapa ``L x C``.
+
+    As listas de entrada têm um elemento por pedido. Compara o total de folhas
+    e o desperdício (área das folhas menos área das peças) com o plano atual,
+    que corta cada pedido separadamente. ``folhas_global`` nunca passa de
+    ``folhas_por_pedido``; com ``tempo_limite_s=0`` o resultado é o plano por pedido.
+    """
+    inicio = time.perf_counter()
+    prazo = inicio + tempo_limite_s
+    larguras = np.rint(np.asarray(larguras_corte_mm, dtype=np.float64)).astype(np.int64)
+    comprimentos = np.rint(np.asarray(comprimentos_corte_mm, dtype=np.float64)).astype(np.int64)
+    quantidades = np.asarray(quantidades, dtype=np.int64)
+    L, C = int(largura_chapa_mm), int(comprimento_chapa_mm)
+    area_chapa_m2 = L * C / 1e6
+    areas_m2 = larguras * comprimentos / 1e6
+
+    # Plano atual: cada pedido com seu melhor padrão de peças iguais
+    caixas_por_chapa = calcular_aproveitamento(larguras, comprimentos, L, C).caixas_por_chapa
+    cabe = caixas_por_chapa > 0
+    folhas_pedido = np.zeros(len(quantidades), dtype=np.int64)
+    folhas_pedido[cabe] = -(-quantidades[cabe] // caixas_por_chapa[cabe])
+    area_pecas_m2 = float(np.sum(quantidades[cabe] * areas_m2[cabe]))
+
+    demanda = np.where(cabe, quantidades, 0)
+    padroes, folhas_padroes, completo = [], 0, True
+    # Melhor plano até aqui: os primeiros ``usar_padroes`` padrões e o restante pelo plano por pedido
+    folhas_global, usar_padroes = int(folhas_pedido.sum()), 0
+    while demanda.sum() > 0:
+        # Nem aproveitando as chapas por inteiro o restante ficaria abaixo do melhor plano
+        if folhas_padroes + math.ceil(np.sum(demanda * areas_m2) / area_chapa_m2 - 1e-9) >= folhas_global:
+            break
+        gerado = None if time.perf_counter() > prazo else _gerar_padrao(larguras, comprimentos, demanda, L, C, prazo)
+        if gerado is None:
+            completo = False
+            break
+        pecas, sobra_ponta = gerado
+        if pecas.sum() == 0:
+            break
+        usadas = pecas > 0
+        repeticoes = max(int(np.min(demanda[usadas] // pecas[usadas])), 1)
+        demanda = demanda - np.minimum(pecas * repeticoes, demanda)
+        folhas_padroes += repeticoes
+        padroes.append({'repeticoes': repeticoes,
+                        'pecas': {int(i): int(pecas[i]) for i in np.flatnonzero(usadas)},
+                        'sobra_ponta_mm': float(sobra_ponta)})
+        restante = demanda > 0
+        folhas = folhas_padroes + int(np.sum(-(-demanda[restante] // caixas_por_chapa[restante])))
+        if folhas < folhas_global:
+            folhas_global, usar_padroes = folhas, len(padroes)
+
+    return ResultadoCorteGlobal(
+        folhas_global=folhas_global,
+        folhas_por_pedido=int(folhas_pedido.sum()),
+        desperdicio_global_m2=folhas_global * area_chapa_m2 - area_pecas_m2,
+        desperdicio_por_pedido_m2=float(folhas_pedido.sum()) * area_chapa_m2 - area_pecas_m2,
+        padroes=padroes[:usar_padroes],
+        nao_cabem=[int(i) for i in np.flatnonzero(~cabe)],
+        completo=completo,
+        tempo_s=time.perf_counter() - inicio,
+    )
+
+
+def _ordem_formatos(item):
+    # Formatos em que alguma peça não cabe ficam por último; depois, a área total de chapas consumida
+    (L, C), resultado = item
+    return len(resultado.nao_cabem), resultado.folhas_global * L * C
+
+
+def comparar_formatos(larguras_corte_mm, comprimentos_corte_mm, quantidades, formatos_mm, tempo_limite_s=5.0):
+    """Roda ``otimizar_corte_global`` para os formatos ``(L, C)`` de chapa dentro de ``tempo_limite_s``.
+
+    Todos os formatos são comparados pelo plano por pedido (barato); o tempo vai
+    para os ``FORMATOS_OTIMIZADOS`` melhores, um após o outro, e o que um não usa
+    passa para os seguintes. Devolve a lista ``[(formato, ResultadoCorteGlobal)]``
+    ordenada pela área total de chapas consumida no plano combinado.
+    """
+    prazo = time.perf_counter() + tempo_limite_s
+    formatos = list(dict.fromkeys((int(L), int(C)) for L, C in formatos_mm))
+    resultados = {formato: otimizar_corte_global(larguras_corte_mm, comprimentos_corte_mm, quantidades,
+                                                 formato[0], formato[1], 0)
+                  for formato in formatos}
+    candidatos = sorted(resultados.items(), key=_ordem_formatos)[:FORMATOS_OTIMIZADOS]
+    for n, (formato, _) in enumerate(candidatos):
+        tempo = max(prazo - time.perf_counter(), 0) / (len(candidatos) - n)
+        resultados[formato] = otimizar_corte_global(larguras_corte_mm, comprimentos_corte_mm, quantidades,
+                                                    formato[0], formato[1], tempo)
+    return sorted(resultados.items(), key=_ordem_formatos)
+
+
+def otimizar_pedidos_estoque(estoque, df_pedidos, tempo_limite_s=5.0):
+    """Resumo da otimização global para pedidos pendentes (colunas de ``gbs.lote.COLUNAS_LOTE``).
+
+    Os pedidos são agrupados por (Tipo_Papel, Gramatura); em cada grupo são
+    testados os formatos de chapa inteira (não retalhos) com folhas no estoque.
+    O tempo é repartido entre os grupos pelo número de pedidos, e o que um grupo
+    não usa passa para os seguintes. Devolve um DataFrame com uma linha por
+    grupo e o melhor formato encontrado.
+    """
+    prazo = time.perf_counter() + tempo_limite_s
+    validos = df_pedidos.dropna(subset=['Largura_Corte_m', 'Comprimento_Corte_m', 'Quantidade_Caixas', 'Gramatura'])
+    validos = validos[(validos['Largura_Corte_m'] > 0) & (validos['Comprimento_Corte_m'] > 0)
+                      & (validos['Quantidade_Caixas'] > 0)]
+    grupos = list(validos.groupby(['Tipo_Papel', 'Gramatura'], sort=False))
+
+    linhas, pedidos_restantes = [], sum(len(grupo) for _, grupo in grupos)
+    for (tipo_papel, gramatura), grupo in grupos:
+        tempo_grupo = max(prazo - time.perf_counter(), 0) * len(grupo) / pedidos_restantes
+        pedidos_restantes -= len(grupo)
+        posicoes = estoque.posicoes_compativeis(tipo_papel, gramatura)
+        inteiras = ((estoque.coluna('Quantidade_Folhas', posicoes) > 0)
+                    & ~np.char.startswith(estoque.coluna('Modelo_Chapa', posicoes).astype(str), PREFIXO_RETALHO))
+        formatos = zip(estoque.coluna('Largura_mm', posicoes[inteiras]).tolist(),
+                       estoque.coluna('Comprimento_mm', posicoes[inteiras]).tolist())
+        resultados = comparar_formatos(grupo['Largura_Corte_m'] * 1000, grupo['Comprimento_Corte_m'] * 1000,
+                                       grupo['Quantidade_Caixas'], formatos, tempo_grupo)
+        if not resultados:
+            continue
+        (L, C), resultado = resultados[0]
+        linhas.append({
+            'Tipo_Papel': tipo_papel, 'Gramatura': gramatura, 'Pedidos': len(grupo),
+            'Chapa_LxC_m': f"{L / 1000}x{C / 1000}",
+            'Folhas_Plano_Atual': resultado.folhas_por_pedido,
+            'Folhas_Otimizado': resultado.folhas_global,
+            'Economia_Folhas': resultado.folhas_por_pedido - resultado.folhas_global,
+            'Desperdicio_Atual_m2': resultado.desperdicio_por_pedido_m2,
+            'Desperdicio_Otimizado_m2': resultado.desperdicio_global_m2,
+            'Padroes_de_Corte': len(resultado.padroes),
+            'Pedidos_Nao_Cabem': ", ".join(str(grupo['OS'].iloc[i]) for i in resultado.nao_cabem),
+            'Otimizacao_Completa': resultado.completo,
+        })
+    return pd.DataFrame(linhas)
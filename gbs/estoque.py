@@ -0,0 +1,519 @@
+"""Estoque em memória indexado, com materialização em DataFrame sob demanda.
+
+Substitui as buscas por máscara booleana e os ``pd.concat`` de uma linha sobre
+o DataFrame inteiro: as colunas ficam em arrays NumPy com crescimento
+amortizado e três dicionários dão acesso O(1) às linhas:
+
+* ``(Modelo_Chapa, Tipo_Papel, Gramatura)`` -> posição (chave do item);
+* ``(Medida, Tipo_Papel, Gramatura)`` -> posição (busca de retalhos);
+* ``(Tipo_Papel, Gramatura)`` -> posições compatíveis (ranking de chapas).
+
+As dimensões ficam em milímetros inteiros (``int32``) e Tipo_Papel, que tem
+poucos valores distintos, como código ``int32``: as buscas por dimensão são
+exatas e cada linha ocupa 60 bytes nas colunas. Modelo_Chapa continua como
+``object``, já que quase todo item tem um modelo próprio e a string é a mesma
+da chave do índice. ``coluna`` devolve Tipo_Papel decodificado (e
+``Largura_m``/``Comprimento_m`` em metros); os DataFrames gerados trazem
+Tipo_Papel com o dtype ``category``.
+
+Os totais do estoque (geral e por Tipo_Papel/Gramatura) são mantidos
+incrementalmente a cada alteração, sem somar as colunas a cada exibição.
+
+Os retalhos com folhas disponíveis ficam também num ``IndiceRetalhos``
+(``gbs.retalhos``), mantido a cada alteração, para a busca do menor retalho
+que comporta uma peça.
+
+As posições são estáveis (linhas nunca são removidas) e servem de rótulo do
+índice do DataFrame gerado por ``para_dataframe``.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from gbs.metricas import etapa
+from gbs.paginacao import Pagina, limitar_pagina
+from gbs.retalhos import IndiceRetalhos
+
+COLUNAS_ESTOQUE = [
+    'Modelo_Chapa', 'Largura_m', 'Comprimento_m', 'Tipo_Papel', 'Gramatura',
+    'Quantidade_Folhas', 'Preco_Kg', 'Peso_Total_kg', 'Valor_Total_R$'
+]
+
+# Colunas guardadas; as de _COLUNAS_CATEGORICAS são códigos de _Categorias
+_TIPOS_COLUNAS = {
+    'Modelo_Chapa': object, 'Largura_mm': np.int32, 'Comprimento_mm': np.int32,
+    'Tipo_Papel': np.int32, 'Gramatura': np.float64, 'Quantidade_Folhas': np.int64,
+    'Preco_Kg': np.float64, 'Peso_Total_kg': np.float64, 'Valor_Total_R$': np.float64,
+}
+_COLUNAS_CATEGORICAS = ('Tipo_Papel',)
+_COLUNAS_EM_METROS = {'Largura_m': 'Largura_mm', 'Comprimento_m': 'Comprimento_mm'}  # Calculadas a partir dos mm
+
+# Totais acumulados (geral e por Tipo_Papel/Gramatura), na ordem do vetor interno de totais
+COLUNAS_TOTAIS = ['Quantidade_Folhas', 'Area_Total_m2', 'Peso_Total_kg', 'Valor_Total_R$']
+
+PREFIXO_RETALHO = 'RETALHO-'
+PRECO_KG_RETALHO_PADRAO = 0.01  # Preço padrão para novos retalhos, pode ser ajustado manualmente
+ORDEM_EXIBICAO = ['Modelo_Chapa', 'Tipo_Papel', 'Gramatura']
+
+
+# Colunas lidas do arquivo de estoque, com o tipo aplicado já pelo parser. Peso_Total_kg e
+# Valor_Total_R$ não são lidos: são recalculados. Folhas como float para aceitar célula vazia (= 0).
+_TIPOS_LEITURA = {
+    'Modelo_Chapa': str, 'Largura_m': np.float64, 'Comprimento_m': np.float64, 'Tipo_Papel': str,
+    'Gramatura': np.float64, 'Quantidade_Folhas': np.float64, 'Preco_Kg': np.float64,
+}
+
+TAMANHO_BLOCO_PADRAO = 100_000  # Linhas por bloco na leitura e exportação em partes
+
+
+def _conferir_colunas(colunas):
+    faltando = [coluna for coluna in _TIPOS_LEITURA if coluna not in colunas]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no arquivo de estoque: {', '.join(faltando)}")
+
+
+def _opcoes_csv():
+    return dict(sep=';', decimal=',', usecols=lambda coluna: coluna in _TIPOS_LEITURA, dtype=_TIPOS_LEITURA)
+
+
+def ler_estoque_csv(arquivo):
+    """Lê o CSV de estoque (separador ``;`` e vírgula decimal) com as colunas numéricas já tipadas.
+
+    Levanta ``ValueError`` se faltar coluna ou se houver texto numa coluna numérica.
+    """
+    df = pd.read_csv(arquivo, **_opcoes_csv())
+    _conferir_colunas(df.columns)
+    return df
+
+
+def ler_estoque_em_blocos(arquivo, nome_arquivo='', tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+    """Lê o estoque em blocos de até ``tamanho_bloco`` linhas, para importar com memória limitada.
+
+    Aceita CSV (``;`` e vírgula decimal) ou, se ``nome_arquivo`` terminar em
+    ``.parquet``, Parquet. Os blocos já vêm com as colunas tipadas, como em
+    ``ler_estoque_csv``. Levanta ``ValueError`` se faltar coluna.
+    """
+    if nome_arquivo.lower().endswith('.parquet'):
+        import pyarrow.parquet as pq  # Requer o pacote pyarrow (só para Parquet)
+        arquivo_parquet = pq.ParquetFile(arquivo)
+        _conferir_colunas(arquivo_parquet.schema_arrow.names)
+        numericas = {coluna: tipo for coluna, tipo in _TIPOS_LEITURA.items() if tipo is not str}
+        for lote in arquivo_parquet.iter_batches(batch_size=tamanho_bloco, columns=list(_TIPOS_LEITURA)):
+            yield lote.to_pandas().astype(numericas)
+        return
+    with pd.read_csv(arquivo, chunksize=tamanho_bloco, **_opcoes_csv()) as leitor:
+        for bloco in leitor:
+            _conferir_colunas(bloco.columns)
+            yield bloco
+
+
+def calcular_peso_valor(df):
+    """Preenche ``Peso_Total_kg`` e ``Valor_Total_R$`` de um bloco do estoque (mesma conta de ``EstoqueMemoria``)."""
+    df['Peso_Total_kg'] = df['Largura_m'] * df['Comprimento_m'] * (df['Gramatura'] / 1000) * df['Quantidade_Folhas']
+    df['Valor_Total_R$'] = df['Peso_Total_kg'] * df['Preco_Kg']
+    return df
+
+
+def nome_retalho(largura_mm, comprimento_mm):
+    """Modelo usado para retalhos gerados pelo corte, ex.: ``RETALHO-1200x200``."""
+    return f"{PREFIXO_RETALHO}{largura_mm:.0f}x{comprimento_mm:.0f}"
+
+
+class Medida(NamedTuple):
+    """Largura x comprimento de uma chapa ou retalho em milímetros inteiros (comparação e hash exatos)."""
+    largura_mm: int
+    comprimento_mm: int
+
+    @classmethod
+    def de_metros(cls, largura_m, comprimento_m):
+        # Arredondada ao milímetro: não depende de igualdade de float (ex.: 1.2 * 1000)
+        return cls(round(largura_m * 1000), round(comprimento_m * 1000))
+
+    @property
+    def largura_m(self):
+        return self.largura_mm / 1000
+
+    @property
+    def comprimento_m(self):
+        return self.comprimento_mm / 1000
+
+    @property
+    def area_m2(self):
+        return self.largura_mm * self.comprimento_mm / 1_000_000
+
+    def __str__(self):
+        return f"{self.largura_mm}x{self.comprimento_mm}"
+
+
+class Chapa(NamedTuple):
+    """Identificação de uma linha do estoque (chapa inteira ou retalho), sem os saldos."""
+    modelo: str
+    medida: Medida
+    tipo_papel: str
+    gramatura: float
+
+    @property
+    def retalho(self):
+        return self.modelo.startswith(PREFIXO_RETALHO)
+
+
+class _Categorias:
+    """Valores distintos de uma coluna de texto; as linhas guardam só o código (posição em ``valores``)."""
+
+    __slots__ = ('valores', '_codigos', '_cache')
+
+    def __init__(self, valores=(), codigos=None):
+        self.valores = list(valores)
+        self._codigos = dict(codigos) if codigos is not None else {valor: i for i, valor in enumerate(self.valores)}
+        self._cache = None  # (quantidade de valores, array dos valores, valores ordenados, posto de cada código)
+
+    def copia(self):
+        return _Categorias(self.valores, self._codigos)
+
+    def codigo(self, valor):
+        codigo = self._codigos.get(valor)
+        if codigo is None:
+            codigo = self._codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def _arrays(self):
+        # Só cresce: o cache vale enquanto não entrar valor novo
+        if self._cache is None or self._cache[0] != len(self.valores):
+            valores = np.array(self.valores, dtype=object)
+            ordem = np.argsort(valores, kind='stable')
+            postos = np.empty(len(valores), dtype=np.int32)
+            postos[ordem] = np.arange(len(valores), dtype=np.int32)
+            self._cache = (len(self.valores), valores, valores[ordem], postos)
+        return self._cache[1:]
+
+    def decodificar(self, codigos):
+        return self._arrays()[0][codigos]
+
+    def postos(self, codigos):
+        """Posição de cada valor na ordem alfabética: ordena as linhas sem decodificar o texto."""
+        return self._arrays()[2][codigos]
+
+    def categorical(self, codigos):
+        """``pd.Categorical`` só com os valores presentes em ``codigos``, em ordem alfabética."""
+        _, ordenados, postos = self._arrays()
+        usados, novos_codigos = np.unique(postos[codigos], return_inverse=True)
+        return pd.Categorical.from_codes(novos_codigos.reshape(-1), categories=ordenados[usados])
+
+    def contem(self, texto, codigos):
+        """Máscara das linhas cujo valor contém ``texto`` (já em minúsculas); cada valor distinto é testado uma vez."""
+        valores = pd.Series(self._arrays()[0], dtype=object)
+        return valores.str.lower().str.contains(texto, regex=False).to_numpy(dtype=bool)[codigos]
+
+
+class EstoqueMemoria:
+    """Estoque de chapas e retalhos com upsert O(1) e DataFrame gerado só para exibição."""
+
+    def __init__(self, capacidade=64):
+        self._n = 0
+        self._colunas = {nome: np.empty(capacidade, dtype=tipo) for nome, tipo in _TIPOS_COLUNAS.items()}
+        self._categorias = {nome: _Categorias() for nome in _COLUNAS_CATEGORICAS}
+        self._por_chave = {}
+        self._por_dimensao = {}
+        self._por_tipo_gramatura = {}
+        self._retalhos = IndiceRetalhos()
+        self._total_geral = np.zeros(len(COLUNAS_TOTAIS))
+        self._totais_por_tipo_gramatura = {}  # (tipo, gramatura) -> vetor de COLUNAS_TOTAIS
+        self._versao = 0
+        self._df_cache = None  # (versão, DataFrame)
+        self._ordem_cache = None  # (versão, posições na ordem de exibição)
+
+    # --- Construção ---
+
+    @classmethod
+    def de_dataframe(cls, df):
+        """Cria o estoque a partir de um DataFrame com ``COLUNAS_ESTOQUE`` (ex.: CSV carregado).
+
+        Linhas repetidas para o mesmo (Modelo, Tipo, Gramatura) têm as folhas somadas.
+        """
+        estoque = cls(capacidade=max(64, len(df)))
+        quantidades = pd.to_numeric(df['Quantidade_Folhas'], errors='coerce').fillna(0).astype(np.int64)
+        for linha in zip(df['Modelo_Chapa'], df['Largura_m'], df['Comprimento_m'], df['Tipo_Papel'],
+                         df['Gramatura'], quantidades, df['Preco_Kg']):
+            estoque.upsert(*linha)
+        return estoque
+
+    def _garantir_capacidade(self):
+        capacidade = len(self._colunas['Modelo_Chapa'])
+        if self._n < capacidade:
+            return
+        for nome, array in self._colunas.items():
+            novo = np.empty(capacidade * 2, dtype=array.dtype)
+            novo[:self._n] = array[:self._n]
+            self._colunas[nome] = novo
+
+    def _tipo_papel(self, pos):
+        return self._categorias['Tipo_Papel'].valores[self._colunas['Tipo_Papel'][pos]]
+
+    def _recalcular_linha(self, pos, delta_folhas):
+        """Recalcula peso e valor da linha após mudar ``delta_folhas`` folhas (ou o preço) e atualiza os totais."""
+        col = self._colunas
+        peso_antes, valor_antes = col['Peso_Total_kg'][pos], col['Valor_Total_R$'][pos]
+        largura_mm, comprimento_mm = int(col['Largura_mm'][pos]), int(col['Comprimento_mm'][pos])
+        area_chapa_m2 = (largura_mm / 1000) * (comprimento_mm / 1000)
+        col['Peso_Total_kg'][pos] = area_chapa_m2 * (col['Gramatura'][pos] / 1000) * col['Quantidade_Folhas'][pos]
+        col['Valor_Total_R$'][pos] = col['Peso_Total_kg'][pos] * col['Preco_Kg'][pos]
+
+        delta = np.array([delta_folhas, delta_folhas * area_chapa_m2,
+                          col['Peso_Total_kg'][pos] - peso_antes, col['Valor_Total_R$'][pos] - valor_antes])
+        self._total_geral += delta
+        tipo_papel = self._tipo_papel(pos)
+        chave = (tipo_papel, col['Gramatura'][pos])
+        if chave in self._totais_por_tipo_gramatura:
+            self._totais_por_tipo_gramatura[chave] += delta
+        else:
+            self._totais_por_tipo_gramatura[chave] = delta
+        if col['Modelo_Chapa'][pos].startswith(PREFIXO_RETALHO):
+            # Retalho zerado sai do índice de reaproveitamento; ao voltar a ter folhas, retorna
+            self._retalhos.atualizar(pos, tipo_papel, col['Gramatura'][pos], largura_mm, comprimento_mm,
+                                     col['Quantidade_Folhas'][pos] > 0)
+
+    def _adicionar_linha(self, modelo, medida, tipo_papel, gramatura, quantidade, preco_kg):
+        self._garantir_capacidade()
+        pos = self._n
+        col = self._colunas
+        col['Modelo_Chapa'][pos] = modelo
+        col['Largura_mm'][pos], col['Comprimento_mm'][pos] = medida
+        col['Tipo_Papel'][pos] = self._categorias['Tipo_Papel'].codigo(tipo_papel)
+        col['Gramatura'][pos] = gramatura
+        col['Quantidade_Folhas'][pos] = quantidade
+        col['Preco_Kg'][pos] = preco_kg
+        col['Peso_Total_kg'][pos] = col['Valor_Total_R$'][pos] = 0.0
+        self._recalcular_linha(pos, quantidade)
+        self._n += 1
+
+        self._por_chave[(modelo, tipo_papel, gramatura)] = pos
+        self._por_dimensao.setdefault((medida, tipo_papel, gramatura), pos)
+        self._por_tipo_gramatura.setdefault((tipo_papel, gramatura), []).append(pos)
+        return pos
+
+    def copia(self):
+        """Cópia independente (ex.: para simular um lote de pedidos sem tocar no estoque real)."""
+        nova = EstoqueMemoria.__new__(EstoqueMemoria)
+        nova._n = self._n
+        nova._colunas = {nome: array.copy() for nome, array in self._colunas.items()}
+        nova._categorias = {nome: categorias.copia() for nome, categorias in self._categorias.items()}
+        nova._por_chave = dict(self._por_chave)
+        nova._por_dimensao = dict(self._por_dimensao)
+        nova._por_tipo_gramatura = {chave: list(posicoes) for chave, posicoes in self._por_tipo_gramatura.items()}
+        nova._retalhos = self._retalhos.copia()
+        nova._total_geral = self._total_geral.copy()
+        nova._totais_por_tipo_gramatura = {chave: totais.copy()
+                                           for chave, totais in self._totais_por_tipo_gramatura.items()}
+        nova._versao = self._versao
+        nova._df_cache = None
+        nova._ordem_cache = None
+        return nova
+
+    # --- Consultas ---
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def vazio(self):
+        return self._n == 0
+
+    @property
+    def versao(self):
+        """Contador incrementado a cada alteração do estoque."""
+        return self._versao
+
+    def localizar(self, modelo, tipo_papel, gramatura):
+        """Posição do item (Modelo, Tipo, Gramatura), ou ``None``."""
+        return self._por_chave.get((modelo, tipo_papel, gramatura))
+
+    def localizar_por_dimensao(self, medida, tipo_papel, gramatura):
+        """Posição do primeiro item com esta ``Medida`` (mm), Tipo e Gramatura, ou ``None``."""
+        return self._por_dimensao.get((medida, tipo_papel, gramatura))
+
+    def posicoes_compativeis(self, tipo_papel, gramatura):
+        """Posições de todas as chapas e retalhos de um Tipo e Gramatura."""
+        return np.asarray(self._por_tipo_gramatura.get((tipo_papel, gramatura), ()), dtype=np.int64)
+
+    def menor_retalho_que_comporta(self, tipo_papel, gramatura, largura_mm, comprimento_mm, ignorar=()):
+        """Posição do menor retalho (em área) com folhas que comporta a peça, ou ``None``.
+
+        A peça pode ser girada; posições em ``ignorar`` são puladas.
+        """
+        return self._retalhos.menor_que_comporta(tipo_papel, gramatura, largura_mm, comprimento_mm, ignorar)
+
+    def coluna(self, nome, posicoes=None):
+        """Valores de uma coluna (todas as linhas ou só ``posicoes``), sem cópia do estoque inteiro.
+
+        Além de ``COLUNAS_ESTOQUE`` aceita ``Largura_mm`` e ``Comprimento_mm`` (``int32``).
+        Tipo_Papel vem decodificado (array de ``str``).
+        """
+        if nome in _COLUNAS_EM_METROS:
+            return self.coluna(_COLUNAS_EM_METROS[nome], posicoes) / 1000
+        valores = self._colunas[nome][:self._n]
+        if posicoes is not None:
+            valores = valores[posicoes]
+        if nome in self._categorias:
+            return self._categorias[nome].decodificar(valores)
+        return valores
+
+    def chapa(self, pos):
+        """``Chapa`` (modelo, medida, tipo e gramatura) da linha ``pos``."""
+        col = self._colunas
+        return Chapa(col['Modelo_Chapa'][pos], Medida(int(col['Largura_mm'][pos]), int(col['Comprimento_mm'][pos])),
+                     self._tipo_papel(pos), float(col['Gramatura'][pos]))
+
+    # --- Alterações ---
+
+    def _alterado(self):
+        self._versao += 1
+
+    def upsert(self, modelo, largura_m, comprimento_m, tipo_papel, gramatura, quantidade, preco_kg):
+        """Soma ``quantidade`` folhas ao item ou o cria. Devolve ``(posição, criado)``.
+
+        Num item existente o preço por kg passa a ser ``preco_kg``.
+        """
+        pos = self.localizar(modelo, tipo_papel, gramatura)
+        if pos is None:
+            pos = self._adicionar_linha(modelo, Medida.de_metros(largura_m, comprimento_m), tipo_papel, gramatura,
+                                        quantidade, preco_kg)
+            self._alterado()
+            return pos, True
+        self._colunas['Quantidade_Folhas'][pos] += quantidade
+        self._colunas['Preco_Kg'][pos] = preco_kg
+        self._recalcular_linha(pos, quantidade)
+        self._alterado()
+        return pos, False
+
+    def definir(self, modelo, largura_m, comprimento_m, tipo_papel, gramatura, quantidade, preco_kg):
+        """Grava o estado absoluto de um item (ex.: linha vinda do banco), criando-o se preciso."""
+        pos = self.localizar(modelo, tipo_papel, gramatura)
+        if pos is None:
+            pos = self._adicionar_linha(modelo, Medida.de_metros(largura_m, comprimento_m), tipo_papel, gramatura,
+                                        quantidade, preco_kg)
+        else:
+            delta_folhas = quantidade - self._colunas['Quantidade_Folhas'][pos]
+            self._colunas['Quantidade_Folhas'][pos] = quantidade
+            self._colunas['Preco_Kg'][pos] = preco_kg
+            self._recalcular_linha(pos, delta_folhas)
+        self._alterado()
+        return pos
+
+    def debitar(self, pos, folhas):
+        """Abate ``folhas`` do item na posição ``pos``, recalculando peso e valor."""
+        self._colunas['Quantidade_Folhas'][pos] -= folhas
+        self._recalcular_linha(pos, -folhas)
+        self._alterado()
+
+    def creditar_retalho(self, largura_mm, comprimento_mm, tipo_papel, gramatura, quantidade,
+                         preco_kg=PRECO_KG_RETALHO_PADRAO):
+        """Soma retalhos ao estoque. Devolve ``(posição, criado)``.
+
+        Reaproveita o item ``RETALHO-LxC`` do mesmo Tipo e Gramatura ou qualquer
+        item com as mesmas dimensões; se não houver, cria ``RETALHO-LxC`` com ``preco_kg``.
+        """
+        medida = Medida(round(largura_mm), round(comprimento_mm))
+        modelo = nome_retalho(*medida)
+        pos = self.localizar(modelo, tipo_papel, gramatura)
+        if pos is None:
+            pos = self.localizar_por_dimensao(medida, tipo_papel, gramatura)
+        if pos is None:
+            pos = self._adicionar_linha(modelo, medida, tipo_papel, gramatura, quantidade, preco_kg)
+            self._alterado()
+            return pos, True
+        self._colunas['Quantidade_Folhas'][pos] += quantidade
+        self._recalcular_linha(pos, quantidade)
+        self._alterado()
+        return pos, False
+
+    # --- Totais ---
+
+    def totais(self):
+        """Totais do estoque inteiro (``COLUNAS_TOTAIS``), mantidos a cada alteração."""
+        totais = dict(zip(COLUNAS_TOTAIS, self._total_geral.tolist()))
+        totais['Quantidade_Folhas'] = round(totais['Quantidade_Folhas'])
+        return totais
+
+    def totais_por_tipo_gramatura(self):
+        """DataFrame com os totais de cada (Tipo_Papel, Gramatura), uma linha por grupo."""
+        chaves = sorted(self._totais_por_tipo_gramatura)
+        df = pd.DataFrame([self._totais_por_tipo_gramatura[chave] for chave in chaves],
+                          columns=COLUNAS_TOTAIS).astype({'Quantidade_Folhas': np.int64})
+        df.insert(0, 'Tipo_Papel', [tipo for tipo, _ in chaves])
+        df.insert(1, 'Gramatura', np.array([gramatura for _, gramatura in chaves], dtype=np.float64))
+        return df
+
+    # --- Materialização ---
+
+    def _dados(self, posicoes):
+        """Colunas de ``COLUNAS_ESTOQUE`` das ``posicoes``, com Tipo_Papel como ``category``."""
+        dados = {}
+        for nome in COLUNAS_ESTOQUE:
+            if nome in self._categorias:
+                dados[nome] = self._categorias[nome].categorical(self._colunas[nome][posicoes])
+            elif nome in _COLUNAS_EM_METROS:
+                dados[nome] = self._colunas[_COLUNAS_EM_METROS[nome]][posicoes] / 1000
+            else:
+                dados[nome] = self._colunas[nome][posicoes]
+        return dados
+
+    def para_dataframe(self, ordenar=True):
+        """DataFrame do estoque, indexado pela posição de cada item.
+
+        Gerado no máximo uma vez por versão do estoque (só quando for exibido ou exportado).
+        """
+        if self._df_cache is not None and self._df_cache[0] == (self._versao, ordenar):
+            return self._df_cache[1]
+        posicoes = self._ordem_exibicao() if ordenar else np.arange(self._n)
+        with etapa('estoque.para_dataframe', linhas=self._n):
+            df = pd.DataFrame(self._dados(posicoes), index=posicoes)
+        self._df_cache = ((self._versao, ordenar), df)
+        return df
+
+    def blocos(self, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+        """DataFrames de até ``tamanho_bloco`` linhas, na ordem de exibição, sem montar o estoque inteiro."""
+        ordem = self._ordem_exibicao()
+        for inicio in range(0, max(len(ordem), 1), tamanho_bloco):
+            posicoes = ordem[inicio:inicio + tamanho_bloco]
+            yield pd.DataFrame(self._dados(posicoes), index=posicoes)
+
+    def _chave_ordenacao(self, nome):
+        """Valores que ordenam a coluna ``nome`` como o texto/número original, sem decodificar."""
+        valores = self._colunas[_COLUNAS_EM_METROS.get(nome, nome)][:self._n]
+        return self._categorias[nome].postos(valores) if nome in self._categorias else valores
+
+    def _ordem_exibicao(self):
+        """Posições na ordem de ``ORDEM_EXIBICAO``, calculada no máximo uma vez por versão."""
+        if self._ordem_cache is None or self._ordem_cache[0] != self._versao:
+            # lexsort ordena pela última chave primeiro e é estável, como sort_values(kind='stable')
+            with etapa('estoque.ordenar', linhas=self._n):
+                chaves = [self._chave_ordenacao(nome) for nome in reversed(ORDEM_EXIBICAO)]
+                self._ordem_cache = (self._versao, np.lexsort(chaves) if self._n else np.arange(0))
+        return self._ordem_cache[1]
+
+    def pagina(self, filtro='', ordenar_por=None, crescente=True, pagina=1, tamanho_pagina=50):
+        """Uma página do estoque (``gbs.paginacao.Pagina``), sem materializar as demais linhas.
+
+        ``filtro`` procura o texto (sem diferenciar maiúsculas) em Modelo_Chapa e
+        Tipo_Papel. Sem ``ordenar_por`` vale a ordem de exibição (``ORDEM_EXIBICAO``).
+        """
+        if ordenar_por:
+            with etapa('estoque.ordenar', linhas=self._n, coluna=ordenar_por):
+                posicoes = np.argsort(self._chave_ordenacao(ordenar_por), kind='stable')
+        else:
+            posicoes = self._ordem_exibicao()
+        texto = filtro.strip().lower()
+        if texto:
+            with etapa('estoque.filtrar', linhas=self._n):
+                modelos = pd.Series(self.coluna('Modelo_Chapa'), copy=False)
+                encontrado = (modelos.str.lower().str.contains(texto, regex=False).to_numpy(dtype=bool)
+                              | self._categorias['Tipo_Papel'].contem(texto, self._colunas['Tipo_Papel'][:self._n]))
+                posicoes = posicoes[encontrado[posicoes]]  # Mantém a ordem
+        if not crescente:
+            posicoes = posicoes[::-1]
+
+        numero, total_paginas, inicio = limitar_pagina(pagina, len(posicoes), tamanho_pagina)
+        visiveis = posicoes[inicio:inicio + tamanho_pagina]
+        return Pagina(pd.DataFrame(self._dados(visiveis), index=visiveis), len(posicoes), numero, total_paginas)
@@ -0,0 +1,171 @@
+"""Planejamento de pedidos em lote (CSV ou XLSX com várias OS).
+
+Os pedidos são planejados em ordem contra uma cópia do estoque: cada pedido
+consome folhas e gera retalhos nessa cópia, de modo que os pedidos seguintes
+já enxergam o estoque abatido e podem reaproveitar os retalhos recém-gerados.
+Cada pedido consome primeiro os retalhos que comportam a peça (índice de
+retalhos do estoque, menor primeiro); o restante vem da melhor chapa, escolhida
+avaliando de uma vez todas as chapas compatíveis (``melhor_chapa``). O resultado traz os movimentos prontos para
+``BancoEstoque.confirmar_lote``, que grava tudo em uma única transação.
+"""
+import math
+
+import pandas as pd
+
+from gbs.aproveitamento import descrever_padrao, retalhos_para_lista
+from gbs.cache_aproveitamento import calcular_aproveitamento
+from gbs.otimizador import melhor_chapa
+
+COLUNAS_LOTE = [
+    'OS', 'Cliente', 'Descricao_Pedido', 'Valor_Pedido_Total_R$', 'Largura_Corte_m',
+    'Comprimento_Corte_m', 'Quantidade_Caixas', 'Tipo_Papel', 'Gramatura'
+]
+COLUNA_MODELO_OPCIONAL = 'Modelo_Chapa'  # Se vazio, a melhor chapa do estoque é escolhida
+
+_COLUNAS_NUMERICAS = ['Valor_Pedido_Total_R$', 'Largura_Corte_m', 'Comprimento_Corte_m',
+                      'Quantidade_Caixas', 'Gramatura']
+
+STATUS_OK = 'OK'
+
+
+def ler_pedidos_lote(arquivo, nome_arquivo):
+    """Lê o arquivo de pedidos (``.csv`` com ``;`` e vírgula decimal, ou ``.xlsx``).
+
+    Levanta ``ValueError`` se faltar alguma coluna de ``COLUNAS_LOTE``.
+    """
+    if nome_arquivo.lower().endswith('.xlsx'):
+        df = pd.read_excel(arquivo)  # Requer o pacote openpyxl
+    else:
+        df = pd.read_csv(arquivo, sep=';', decimal=',')
+
+    faltando = [coluna for coluna in COLUNAS_LOTE if coluna not in df.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no arquivo de pedidos: {', '.join(faltando)}")
+
+    for coluna in _COLUNAS_NUMERICAS:
+        df[coluna] = pd.to_numeric(df[coluna], errors='coerce')
+    if COLUNA_MODELO_OPCIONAL not in df.columns:
+        df[COLUNA_MODELO_OPCIONAL] = ''
+    for coluna in ['OS', 'Cliente', 'Descricao_Pedido', 'Tipo_Papel', COLUNA_MODELO_OPCIONAL]:
+        df[coluna] = df[coluna].fillna('').astype(str).str.strip()
+    return df
+
+
+def _consumo(estoque, pos, largura_corte_mm, comprimento_corte_mm, caixas_restantes, limite_folhas=None):
+    """Folhas, caixas e retalhos ao cortar ``caixas_restantes`` peças da chapa ``pos`` (até ``limite_folhas``)."""
+    chapa = estoque.chapa(pos)
+    resultado = calcular_aproveitamento(largura_corte_mm, comprimento_corte_mm, *chapa.medida)
+    caixas_por_chapa = int(resultado.caixas_por_chapa[0])
+    folhas = math.ceil(caixas_restantes / caixas_por_chapa)
+    if limite_folhas is not None:
+        folhas = min(folhas, limite_folhas)
+    return {
+        'pos': pos, 'Modelo_Chapa': chapa.modelo,
+        'Largura_m': chapa.medida.largura_m, 'Comprimento_m': chapa.medida.comprimento_m,
+        'Folhas': folhas, 'Caixas_por_Chapa': caixas_por_chapa,
+        'Caixas': min(folhas * caixas_por_chapa, caixas_restantes),
+        'Padrao_Corte': descrever_padrao(resultado, 0),
+        'Aproveitamento_%': float(resultado.aproveitamento[0]) * 100,
+        # (largura_mm, comprimento_mm, quantidade total) já numéricos, sem reinterpretar "LxC"
+        'Retalhos': [(larg, comp, qtd * folhas) for larg, comp, qtd in retalhos_para_lista(resultado, 0)],
+    }
+
+
+def planejar_pedido(estoque, pedido, usar_retalhos=True):
+    """Planeja um pedido contra ``estoque`` (que é alterado). Devolve ``(plano, movimento)``.
+
+    Sem modelo fixado e com ``usar_retalhos``, os retalhos são consumidos antes
+    das chapas inteiras: a cada passo o menor retalho que comporta a peça
+    (``EstoqueMemoria.menor_retalho_que_comporta``); o que faltar vem da melhor
+    chapa do estoque. ``plano['Consumos']`` detalha cada chapa ou retalho usado.
+    ``movimento`` é ``None`` quando o pedido não pode ser atendido; o motivo vai
+    em ``plano['Status']`` e o estoque fica intacto.
+    """
+    largura_corte_m = pedido['Largura_Corte_m']
+    comprimento_corte_m = pedido['Comprimento_Corte_m']
+    qtd_caixas = pedido['Quantidade_Caixas']
+    tipo_papel = pedido['Tipo_Papel']
+    gramatura = pedido['Gramatura']
+    plano = {
+        'OS': pedido['OS'], 'Cliente': pedido['Cliente'], 'Descricao_Pedido': pedido['Descricao_Pedido'],
+        'Valor_Pedido_Total_R$': pedido['Valor_Pedido_Total_R$'],
+        'Dimensao_Corte_LxC_m': f"{largura_corte_m}x{comprimento_corte_m}",
+        'Quantidade_Caixas': qtd_caixas, 'Modelo_Chapa_Pedido': pedido[COLUNA_MODELO_OPCIONAL],
+        'Tipo_Papel_Pedido': tipo_papel, 'Gramatura_Pedido': gramatura,
+        'Chapas_Consumidas': 0, 'Retalhos_Gerados_Dimensoes': '', 'Peso_Total_Pedido_kg': 0.0,
+    }
+
+    if (not pedido['OS'] or not tipo_papel or pd.isna(largura_corte_m) or pd.isna(comprimento_corte_m)
+            or pd.isna(qtd_caixas) or pd.isna(gramatura) or largura_corte_m <= 0 or comprimento_corte_m <= 0
+            or qtd_caixas <= 0 or gramatura <= 0):
+        plano['Status'] = 'Dados do pedido incompletos ou inválidos'
+        return plano, None
+    qtd_caixas = int(qtd_caixas)
+    plano['Quantidade_Caixas'] = qtd_caixas
+    largura_corte_mm, comprimento_corte_mm = largura_corte_m * 1000, comprimento_corte_m * 1000
+
+    modelo = pedido[COLUNA_MODELO_OPCIONAL]
+    consumos, restante, usados = [], qtd_caixas, set()
+    if usar_retalhos and not modelo:
+        # Cada retalho escolhido é esgotado ou completa o pedido, então não volta a ser candidato
+        # O índice guarda mm inteiros: a peça é arredondada para cima para garantir que cabe
+        peca_mm = (math.ceil(round(largura_corte_mm, 3)), math.ceil(round(comprimento_corte_mm, 3)))
+        while restante > 0:
+            pos = estoque.menor_retalho_que_comporta(tipo_papel, gramatura, *peca_mm, usados)
+            if pos is None:
+                break
+            usados.add(pos)
+            consumo = _consumo(estoque, pos, largura_corte_mm, comprimento_corte_mm, restante,
+                               int(estoque.coluna('Quantidade_Folhas')[pos]))
+            if consumo['Caixas'] > 0:
+                consumos.append(consumo)
+                restante -= consumo['Caixas']
+
+    if restante > 0:
+        # O estoque só é debitado no fim: os retalhos já escolhidos ainda mostram o saldo antigo
+        pos = melhor_chapa(estoque, tipo_papel, gramatura, largura_corte_m, comprimento_corte_m, restante, modelo,
+                           usados)
+        if pos is None:
+            plano['Status'] = (f"Chapa '{modelo}' não encontrada, não comporta a peça ou sem folhas suficientes" if modelo
+                               else 'Nenhuma chapa compatível com folhas suficientes')
+            return plano, None
+        consumos.append(_consumo(estoque, pos, largura_corte_mm, comprimento_corte_mm, restante))
+
+    # Aplica no estoque só com o plano completo: os próximos pedidos veem o saldo e os retalhos novos
+    retalhos_texto = []
+    for consumo in consumos:
+        estoque.debitar(consumo['pos'], consumo['Folhas'])
+        for largura_mm, comprimento_mm, quantidade in consumo['Retalhos']:
+            estoque.creditar_retalho(largura_mm, comprimento_mm, tipo_papel, gramatura, quantidade)
+            retalhos_texto.append(f"{quantidade}x {largura_mm}x{comprimento_mm}")
+
+    plano.update({
+        'Modelo_Chapa_Pedido': ", ".join(consumo['Modelo_Chapa'] for consumo in consumos),
+        'Chapas_Consumidas': sum(consumo['Folhas'] for consumo in consumos),
+        'Retalhos_Gerados_Dimensoes': ", ".join(retalhos_texto),
+        'Peso_Total_Pedido_kg': largura_corte_m * comprimento_corte_m * (gramatura / 1000) * qtd_caixas,
+        'Status': STATUS_OK,
+    })
+    registro_pedido = {coluna: valor for coluna, valor in plano.items() if coluna != 'Status'}
+    plano['Consumos'] = consumos
+    movimento = (tipo_papel, gramatura,
+                 [(consumo['Modelo_Chapa'], consumo['Folhas'], consumo['Retalhos']) for consumo in consumos],
+                 registro_pedido)
+    return plano, movimento
+
+
+def planejar_lote(estoque, df_pedidos):
+    """Planeja todos os pedidos de ``df_pedidos`` (na ordem do arquivo) sem alterar ``estoque``.
+
+    Devolve ``(df_plano, movimentos)``: o plano de cada pedido com a coluna
+    ``Status`` e os movimentos dos pedidos atendidos, para ``confirmar_lote``.
+    """
+    trabalho = estoque.copia()
+    planos, movimentos = [], []
+    for pedido in df_pedidos.to_dict('records'):
+        plano, movimento = planejar_pedido(trabalho, pedido)
+        plano.pop('Consumos', None)
+        planos.append(plano)
+        if movimento is not None:
+            movimentos.append(movimento)
+    return pd.DataFrame(planos), movimentos
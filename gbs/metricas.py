@@ -0,0 +1,175 @@
+"""Cronometragem das etapas de uma execução (um rerun do Streamlit, um comando da CLI).
+
+Uso::
+
+    with perfil('rerun', sessao=id_sessao) as atual:
+        with etapa('estoque.pagina') as dados:
+            pagina = estoque.pagina(...)
+            dados['linhas'] = len(pagina.dados)
+
+``etapa`` pode ser chamada de qualquer ponto do pacote: o perfil ativo fica
+num ``ContextVar`` (um por thread, ou seja, por sessão do Streamlit) e, sem
+perfil ativo, a etapa não mede nada. Etapas aninhadas são registradas com o
+nível, então o tempo próprio de uma etapa é o dela menos o das filhas.
+
+Ao terminar, o perfil vai para um histórico do processo (``ultimos_perfis``,
+usado pelo painel de desempenho do aplicativo) e é emitido como métrica
+estruturada: uma linha JSON no logger ``gbs.metricas`` e, se a variável de
+ambiente ``GBS_METRICAS`` apontar para um arquivo, anexada a ele (JSON Lines).
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+HISTORICO_PADRAO = 200  # Perfis guardados em memória para o painel
+
+logger = logging.getLogger('gbs.metricas')
+
+_perfil_atual = contextvars.ContextVar('gbs_perfil_atual', default=None)
+_historico = deque(maxlen=HISTORICO_PADRAO)
+_trava = threading.Lock()
+
+
+class Perfil:
+    """Etapas cronometradas de uma execução, na ordem em que terminaram (uma etapa interna antes da externa)."""
+
+    def __init__(self, nome, **atributos):
+        self.nome = nome
+        self.atributos = atributos
+        self.data = datetime.now().isoformat(timespec='milliseconds')
+        self.duracao_ms = None  # Preenchida ao terminar
+        self.etapas = []  # dicts com nome, nivel, inicio_ms (desde o início do perfil), duracao_ms e atributos
+        self._nivel = 0
+        self._inicio = time.perf_counter()
+
+    def registrar(self, nome, inicio, duracao_s, nivel=0, **atributos):
+        """Acrescenta uma etapa que começou em ``inicio`` (``time.perf_counter``) e durou ``duracao_s``."""
+        self.etapas.append({'nome': nome, 'nivel': nivel, 'inicio_ms': (inicio - self._inicio) * 1000,
+                            'duracao_ms': duracao_s * 1000, **atributos})
+
+    def finalizar(self):
+        self.duracao_ms = (time.perf_counter() - self._inicio) * 1000
+
+    def para_dict(self):
+        return {'evento': self.nome, 'data': self.data, 'duracao_ms': self.duracao_ms,
+                **self.atributos, 'etapas': self.etapas}
+
+
+@contextlib.contextmanager
+def perfil(nome, **atributos):
+    """Ativa um ``Perfil`` durante o bloco; ao sair (mesmo por exceção) guarda e emite o resultado."""
+    atual = Perfil(nome, **atributos)
+    token = _perfil_atual.set(atual)
+    try:
+        yield atual
+    finally:
+        _perfil_atual.reset(token)
+        atual.finalizar()
+        emitir(atual)
+
+
+@contextlib.contextmanager
+def etapa(nome, **atributos):
+    """Cronometra o bloco como uma etapa do perfil ativo.
+
+    Devolve um dict em que o bloco pode acrescentar atributos (ex.: ``linhas``)
+    depois de saber o resultado. Sem perfil ativo, não mede nada.
+    """
+    atual = _perfil_atual.get()
+    if atual is None:
+        yield atributos
+        return
+    nivel = atual._nivel
+    atual._nivel += 1
+    inicio = time.perf_counter()
+    try:
+        yield atributos
+    finally:
+        atual._nivel = nivel
+        atual.registrar(nome, inicio, time.perf_counter() - inicio, nivel, **atributos)
+
+
+def contar(**quantidades):
+    """Soma ``quantidades`` aos atributos do perfil ativo (ex.: acertos do cache nesta execução). Sem perfil, nada."""
+    atual = _perfil_atual.get()
+    if atual is None:
+        return
+    for nome, quantidade in quantidades.items():
+        atual.atributos[nome] = atual.atributos.get(nome, 0) + quantidade
+
+
+def cronometrar_blocos(nome, blocos):
+    """Repassa os blocos de um gerador, somando numa única etapa o tempo gasto para produzi-los.
+
+    Serve para leituras em blocos (ex.: ``ler_estoque_em_blocos``): só o tempo de
+    leitura entra na etapa, não o de quem consome cada bloco. Registra também o total de linhas.
+    """
+    atual = _perfil_atual.get()
+    if atual is None:
+        yield from blocos
+        return
+    nivel, linhas, gasto, primeiro = atual._nivel, 0, 0.0, time.perf_counter()
+    iterador = iter(blocos)
+    try:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                bloco = next(iterador)
+            except StopIteration:
+                break
+            finally:
+                gasto += time.perf_counter() - inicio
+            linhas += len(bloco)
+            yield bloco
+    finally:
+        atual.registrar(nome, primeiro, gasto, nivel, linhas=linhas)
+
+
+def tamanho_dataframe(df):
+    """Linhas, colunas e bytes de um DataFrame, para anexar a uma etapa (sem medir o texto a fundo)."""
+    return {'linhas': len(df), 'colunas': len(df.columns), 'bytes': int(df.memory_usage(deep=False).sum())}
+
+
+def emitir(atual):
+    """Guarda o perfil no histórico do processo e o emite como métrica estruturada (JSON)."""
+    registro = atual.para_dict()
+    with _trava:
+        _historico.append(registro)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+    caminho = os.environ.get('GBS_METRICAS')
+    if caminho:
+        linha = json.dumps(registro, ensure_ascii=False, default=str) + '\n'
+        with _trava, open(caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linha)
+
+
+def ultimos_perfis(nome=None, quantidade=None):
+    """Perfis mais recentes do processo (todas as sessões), do mais antigo ao mais novo."""
+    with _trava:
+        perfis = [registro for registro in _historico if nome is None or registro['evento'] == nome]
+    return perfis[-quantidade:] if quantidade else perfis
+
+
+def resumo_etapas(perfis):
+    """DataFrame com as etapas de vários perfis agrupadas por nome: execuções, p50, p95, máximo e total (ms)."""
+    import pandas as pd
+
+    linhas = [(item['nome'], item['duracao_ms']) for registro in perfis for item in registro['etapas']]
+    grupos = pd.DataFrame(linhas, columns=['nome', 'duracao_ms']).groupby('nome')['duracao_ms']
+    resumo = pd.DataFrame({
+        'execucoes': grupos.size(), 'p50_ms': grupos.quantile(0.5), 'p95_ms': grupos.quantile(0.95),
+        'max_ms': grupos.max(), 'total_ms': grupos.sum(),
+    })
+    return resumo.sort_values('total_ms', ascending=False).reset_index()
+
+
+def para_jsonl(perfis):
+    """Conteúdo JSON Lines (bytes UTF-8) dos perfis, para exportar."""
+    return ''.join(json.dumps(registro, ensure_ascii=False, default=str) + '\n' for registro in perfis).encode('utf-8')
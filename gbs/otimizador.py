@@ -0,0 +1,86 @@
+"""Seleção automática da melhor chapa do estoque para um pedido.
+
+O estoque (``EstoqueMemoria``) é indexado por (Tipo_Papel, Gramatura): para um
+pedido, só as linhas compatíveis (chapas inteiras e retalhos ``RETALHO-*``)
+passam pelo motor de aproveitamento, todas em uma única chamada vetorizada.
+"""
+import numpy as np
+import pandas as pd
+
+from gbs.cache_aproveitamento import calcular_aproveitamento
+
+# Ordem de desempate do ranking (todos crescentes): menos folhas, menos sobra, menor custo
+CRITERIOS_RANKING = ['Folhas_Necessarias', 'Area_Sobra_m2', 'Custo_Chapas_R$']
+
+COLUNAS_RANKING = [
+    'Modelo_Chapa', 'Largura_m', 'Comprimento_m', 'Quantidade_Folhas', 'Preco_Kg',
+    'Caixas_por_Chapa', 'Folhas_Necessarias', 'Aproveitamento_%', 'Area_Sobra_m2',
+    'Peso_Consumido_kg', 'Custo_Chapas_R$', 'Estoque_Suficiente'
+]
+
+
+def _avaliar_candidatos(estoque, tipo_papel, gramatura, largura_corte_m, comprimento_corte_m, qtd_caixas):
+    """Colunas do ranking (arrays) para as chapas compatíveis em que a peça cabe, já ordenadas."""
+    posicoes = estoque.posicoes_compativeis(tipo_papel, gramatura)
+    largura_mm = estoque.coluna('Largura_mm', posicoes)
+    comprimento_mm = estoque.coluna('Comprimento_mm', posicoes)
+
+    resultado = calcular_aproveitamento(largura_corte_m * 1000, comprimento_corte_m * 1000, largura_mm, comprimento_mm)
+    cabe = resultado.caixas_por_chapa > 0
+    posicoes, largura_m, comprimento_m = posicoes[cabe], largura_mm[cabe] / 1000, comprimento_mm[cabe] / 1000
+    caixas_por_chapa = resultado.caixas_por_chapa[cabe]
+    quantidade_folhas = estoque.coluna('Quantidade_Folhas', posicoes)
+    preco_kg = estoque.coluna('Preco_Kg', posicoes)
+
+    folhas = -(-qtd_caixas // caixas_por_chapa)  # Divisão com arredondamento para cima
+    area_chapa_m2 = largura_m * comprimento_m
+    peso_consumido_kg = folhas * area_chapa_m2 * (gramatura / 1000)
+    colunas = {
+        'Largura_m': largura_m,
+        'Comprimento_m': comprimento_m,
+        'Quantidade_Folhas': quantidade_folhas,
+        'Preco_Kg': preco_kg,
+        'Caixas_por_Chapa': caixas_por_chapa,
+        'Folhas_Necessarias': folhas,
+        'Aproveitamento_%': resultado.aproveitamento[cabe] * 100,
+        'Area_Sobra_m2': folhas * area_chapa_m2 - qtd_caixas * largura_corte_m * comprimento_corte_m,
+        'Peso_Consumido_kg': peso_consumido_kg,
+        'Custo_Chapas_R$': peso_consumido_kg * preco_kg,
+        'Estoque_Suficiente': quantidade_folhas >= folhas,
+    }
+    # np.lexsort usa a última chave como primária: suficientes primeiro, depois CRITERIOS_RANKING
+    ordem = np.lexsort([colunas[criterio] for criterio in reversed(CRITERIOS_RANKING)]
+                       + [~colunas['Estoque_Suficiente']])
+    return posicoes[ordem], {nome: valores[ordem] for nome, valores in colunas.items()}
+
+
+def ranquear_chapas(estoque, tipo_papel, gramatura, largura_corte_m, comprimento_corte_m, qtd_caixas):
+    """Classifica as chapas compatíveis do estoque para produzir ``qtd_caixas``.
+
+    Devolve um DataFrame indexado pelas posições do ``estoque``, só com as
+    chapas em que a peça cabe. As chapas com estoque suficiente vêm primeiro,
+    depois ordenadas por ``CRITERIOS_RANKING``.
+    """
+    posicoes, colunas = _avaliar_candidatos(estoque, tipo_papel, gramatura,
+                                            largura_corte_m, comprimento_corte_m, qtd_caixas)
+    colunas = {'Modelo_Chapa': estoque.coluna('Modelo_Chapa', posicoes), **colunas}
+    return pd.DataFrame(colunas, index=posicoes, columns=COLUNAS_RANKING)
+
+
+def melhor_chapa(estoque, tipo_papel, gramatura, largura_corte_m, comprimento_corte_m, qtd_caixas, modelo='',
+                 ignorar=()):
+    """Posição da melhor chapa com folhas suficientes, ou ``None`` se não houver.
+
+    Com ``modelo``, só aceita aquela chapa (se comportar a peça e tiver folhas suficientes).
+    Posições em ``ignorar`` são puladas (ex.: retalhos já usados no mesmo pedido).
+    Não monta o DataFrame do ranking: é a versão usada no planejamento em lote.
+    """
+    posicoes, colunas = _avaliar_candidatos(estoque, tipo_papel, gramatura,
+                                            largura_corte_m, comprimento_corte_m, qtd_caixas)
+    posicoes = posicoes[colunas['Estoque_Suficiente']]
+    if ignorar:
+        posicoes = posicoes[~np.isin(posicoes, list(ignorar))]
+    if modelo:
+        pos = estoque.localizar(modelo, tipo_papel, gramatura)
+        return pos if pos is not None and pos in posicoes else None
+    return int(posicoes[0]) if len(posicoes) else None
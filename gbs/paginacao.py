@@ -0,0 +1,26 @@
+"""Filtragem, ordenação e paginação feitas no servidor.
+
+Só a página visível vira DataFrame e é enviada ao navegador; o estoque
+(``EstoqueMemoria.pagina``) filtra e ordena direto nos arrays das colunas e o
+log de pedidos (``BancoEstoque.consultar_pedidos``) usa ``LIMIT``/``OFFSET``.
+"""
+from typing import NamedTuple
+
+import pandas as pd
+
+TAMANHOS_PAGINA = [25, 50, 100, 500]
+
+
+class Pagina(NamedTuple):
+    """Uma página de resultados e o total de linhas que passaram pelo filtro."""
+    dados: pd.DataFrame
+    total: int
+    pagina: int  # 1-based, já limitada a ``total_paginas``
+    total_paginas: int
+
+
+def limitar_pagina(pagina, total, tamanho_pagina):
+    """Devolve ``(página válida, total de páginas, deslocamento da primeira linha)``."""
+    total_paginas = max(1, -(-total // tamanho_pagina))
+    pagina = min(max(1, int(pagina)), total_paginas)
+    return pagina, total_paginas, (pagina - 1) * tamanho_pagina
@@ -0,0 +1,640 @@
+"""Armazenamento persistente do estoque e dos pedidos em SQLite.
+
+O banco é a fonte de verdade compartilhada entre operadores; cada sessão do
+aplicativo mantém uma cópia em memória (``EstoqueMemoria``) e a atualiza de
+forma incremental: toda escrita incrementa o contador ``versao`` e grava esse
+valor nas linhas alteradas, de modo que a sessão só busca as linhas com
+``versao`` maior que a última vista. Uma importação completa (CSV) incrementa
+``geracao`` e obriga as sessões a recarregar o estoque inteiro.
+
+A confirmação de um pedido (débito das chapas, crédito dos retalhos e registro
+no log) acontece em uma única transação ``BEGIN IMMEDIATE``.
+
+Toda alteração do estoque também entra, na mesma transação, no livro de
+movimentos (tabela ``movimentos``, só recebe inserções): débitos de pedidos,
+créditos de retalhos, ajustes manuais e importações. A cada
+``INTERVALO_SNAPSHOT`` movimentos o estado do estoque é copiado para um
+snapshot; o estoque de qualquer momento é o snapshot anterior mais os
+movimentos seguintes (``reconstruir_estoque``). A tabela ``estoque`` continua
+sendo o estado atual materializado, lido pelas sessões; ``recuperar_estoque``
+a refaz a partir do livro, e ``movimentos``/``aplicar_movimentos`` levam as
+alterações de um banco para outro.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from gbs.estoque import (COLUNAS_ESTOQUE, PRECO_KG_RETALHO_PADRAO, TAMANHO_BLOCO_PADRAO, EstoqueMemoria,
+                         calcular_peso_valor, nome_retalho)
+from gbs.paginacao import Pagina, limitar_pagina
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS estoque (
+    id INTEGER PRIMARY KEY,
+    modelo_chapa TEXT NOT NULL,
+    largura_mm INTEGER NOT NULL,
+    comprimento_mm INTEGER NOT NULL,
+    tipo_papel TEXT NOT NULL,
+    gramatura REAL NOT NULL,
+    quantidade_folhas INTEGER NOT NULL,
+    preco_kg REAL NOT NULL,
+    versao INTEGER NOT NULL,
+    UNIQUE (modelo_chapa, tipo_papel, gramatura)
+);
+CREATE INDEX IF NOT EXISTS ix_estoque_tipo_dimensao ON estoque (tipo_papel, gramatura, largura_mm, comprimento_mm);
+CREATE INDEX IF NOT EXISTS ix_estoque_versao ON estoque (versao);
+
+CREATE TABLE IF NOT EXISTS pedidos (
+    id INTEGER PRIMARY KEY,
+    os TEXT NOT NULL,
+    cliente TEXT,
+    descricao_pedido TEXT,
+    valor_pedido_total REAL,
+    dimensao_corte_lxc_m TEXT,
+    quantidade_caixas INTEGER,
+    modelo_chapa_pedido TEXT,
+    tipo_papel_pedido TEXT,
+    gramatura_pedido REAL,
+    chapas_consumidas INTEGER,
+    retalhos_gerados_dimensoes TEXT,
+    peso_total_pedido_kg REAL,
+    data_processamento TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_pedidos_os ON pedidos (os);
+CREATE INDEX IF NOT EXISTS ix_pedidos_data ON pedidos (data_processamento);
+
+CREATE TABLE IF NOT EXISTS movimentos (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    modelo_chapa TEXT,
+    largura_mm INTEGER,
+    comprimento_mm INTEGER,
+    tipo_papel TEXT,
+    gramatura REAL,
+    delta_folhas INTEGER NOT NULL,
+    preco_kg REAL,
+    os TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_movimentos_data ON movimentos (data);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    ultimo_movimento INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshot_estoque (
+    snapshot_id INTEGER NOT NULL,
+    modelo_chapa TEXT NOT NULL,
+    largura_mm INTEGER NOT NULL,
+    comprimento_mm INTEGER NOT NULL,
+    tipo_papel TEXT NOT NULL,
+    gramatura REAL NOT NULL,
+    quantidade_folhas INTEGER NOT NULL,
+    preco_kg REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_snapshot_estoque ON snapshot_estoque (snapshot_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (chave, valor) VALUES ('versao', 0), ('geracao', 0);
+"""
+
+# Colunas do log de pedidos (DataFrame do app) -> colunas da tabela ``pedidos``
+COLUNAS_PEDIDOS = {
+    'OS': 'os', 'Cliente': 'cliente', 'Descricao_Pedido': 'descricao_pedido',
+    'Valor_Pedido_Total_R$': 'valor_pedido_total', 'Dimensao_Corte_LxC_m': 'dimensao_corte_lxc_m',
+    'Quantidade_Caixas': 'quantidade_caixas', 'Modelo_Chapa_Pedido': 'modelo_chapa_pedido',
+    'Tipo_Papel_Pedido': 'tipo_papel_pedido', 'Gramatura_Pedido': 'gramatura_pedido',
+    'Chapas_Consumidas': 'chapas_consumidas', 'Retalhos_Gerados_Dimensoes': 'retalhos_gerados_dimensoes',
+    'Peso_Total_Pedido_kg': 'peso_total_pedido_kg', 'Data_Processamento': 'data_processamento',
+}
+
+# Tipos das colunas do log de pedidos ao exportar: iguais em todos os blocos (necessário para o Parquet)
+_TIPOS_PEDIDOS = {
+    'OS': 'string', 'Cliente': 'string', 'Descricao_Pedido': 'string', 'Valor_Pedido_Total_R$': 'float64',
+    'Dimensao_Corte_LxC_m': 'string', 'Quantidade_Caixas': 'Int64', 'Modelo_Chapa_Pedido': 'string',
+    'Tipo_Papel_Pedido': 'string', 'Gramatura_Pedido': 'float64', 'Chapas_Consumidas': 'Int64',
+    'Retalhos_Gerados_Dimensoes': 'string', 'Peso_Total_Pedido_kg': 'float64', 'Data_Processamento': 'string',
+}
+
+# Colunas de texto em que o filtro do log de pedidos procura
+_COLUNAS_FILTRO_PEDIDOS = ['os', 'cliente', 'descricao_pedido', 'modelo_chapa_pedido', 'tipo_papel_pedido']
+
+# Colunas do arquivo de estoque que não podem ter célula vazia na importação (Quantidade_Folhas vazia vale 0)
+_COLUNAS_IMPORTACAO_OBRIGATORIAS = ['Modelo_Chapa', 'Largura_m', 'Comprimento_m', 'Tipo_Papel', 'Gramatura', 'Preco_Kg']
+
+_COLUNAS_ESTOQUE_SQL = "modelo_chapa, largura_mm, comprimento_mm, tipo_papel, gramatura, quantidade_folhas, preco_kg"
+
+# Soma folhas ao item ou o cria; o último parâmetro é o novo preço (None mantém o do item)
+_SQL_UPSERT = (f"INSERT INTO estoque ({_COLUNAS_ESTOQUE_SQL}, versao) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+               "ON CONFLICT (modelo_chapa, tipo_papel, gramatura) DO UPDATE SET "
+               "quantidade_folhas = quantidade_folhas + excluded.quantidade_folhas, "
+               "preco_kg = COALESCE(?, preco_kg), versao = excluded.versao")
+
+# Tipos de movimento do livro. A importação zera o estoque; os itens importados vêm em seguida como ajustes.
+MOVIMENTO_IMPORTACAO = 'importacao'
+MOVIMENTO_AJUSTE = 'ajuste'
+MOVIMENTO_DEBITO = 'debito'
+MOVIMENTO_RETALHO = 'retalho'
+
+# Colunas do livro de movimentos (DataFrame) -> colunas da tabela ``movimentos``
+COLUNAS_MOVIMENTOS = {
+    'Movimento': 'id', 'Data': 'data', 'Tipo': 'tipo', 'Modelo_Chapa': 'modelo_chapa',
+    'Largura_mm': 'largura_mm', 'Comprimento_mm': 'comprimento_mm', 'Tipo_Papel': 'tipo_papel',
+    'Gramatura': 'gramatura', 'Delta_Folhas': 'delta_folhas', 'Preco_Kg': 'preco_kg', 'OS': 'os',
+}
+_COLUNAS_MOVIMENTOS_SQL = ", ".join(COLUNAS_MOVIMENTOS.values())
+
+INTERVALO_SNAPSHOT = 5_000  # Movimentos entre snapshots: limita o que é refeito para chegar ao estado atual
+SNAPSHOTS_MANTIDOS = 10  # Além do primeiro, que é a base de todo o livro
+
+
+def _agora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _aplicar_movimento(itens, tipo, modelo, largura_mm, comprimento_mm, tipo_papel, gramatura, delta_folhas,
+                       preco_kg):
+    """Aplica um movimento a ``itens``: (modelo, tipo, gramatura) -> linha no formato de ``_COLUNAS_ESTOQUE_SQL``."""
+    if tipo == MOVIMENTO_IMPORTACAO:
+        itens.clear()
+        return
+    item = itens.get((modelo, tipo_papel, gramatura))
+    if item is None:
+        itens[(modelo, tipo_papel, gramatura)] = [modelo, largura_mm, comprimento_mm, tipo_papel, gramatura,
+                                                  delta_folhas, preco_kg if preco_kg is not None else 0.0]
+    else:
+        item[5] += delta_folhas
+        if preco_kg is not None:
+            item[6] = preco_kg
+
+
+class EstoqueInsuficiente(Exception):
+    """A chapa não existe mais ou não tem folhas suficientes (ex.: consumida por outro operador)."""
+
+
+class BancoEstoque:
+    """Acesso ao banco SQLite do estoque; seguro para uso por várias threads/sessões."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._conexao().executescript(_ESQUEMA)
+        with self._transacao() as con:
+            if con.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0] == 0:
+                # Base do livro: o estoque que já existia (banco anterior aos movimentos) ou vazio
+                self._criar_snapshot(con)
+
+    def _conexao(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            # Autocommit: as transações são abertas explicitamente em _transacao()
+            con = sqlite3.connect(self.caminho, isolation_level=None, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")  # Leitores não bloqueiam o escritor
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    @contextmanager
+    def _transacao(self):
+        con = self._conexao()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    @staticmethod
+    def _proxima_versao(con):
+        con.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'versao'")
+        return con.execute("SELECT valor FROM meta WHERE chave = 'versao'").fetchone()[0]
+
+    def _cursor_atual(self, con):
+        valores = dict(con.execute("SELECT chave, valor FROM meta"))
+        return valores['geracao'], valores['versao']
+
+    # --- Leitura / sincronização com a memória ---
+
+    @staticmethod
+    def _aplicar_linhas(estoque, linhas):
+        for modelo, largura_mm, comprimento_mm, tipo, gramatura, quantidade, preco_kg in linhas:
+            estoque.definir(modelo, largura_mm / 1000, comprimento_mm / 1000, tipo, gramatura, quantidade, preco_kg)
+
+    def carregar_estoque(self):
+        """Lê o estoque inteiro. Devolve ``(EstoqueMemoria, cursor)`` para sincronizações futuras."""
+        con = self._conexao()
+        con.execute("BEGIN")  # Leitura consistente do cursor e das linhas
+        try:
+            cursor = self._cursor_atual(con)
+            linhas = con.execute(f"SELECT {_COLUNAS_ESTOQUE_SQL} FROM estoque ORDER BY id").fetchall()
+        finally:
+            con.execute("COMMIT")
+        estoque = EstoqueMemoria(capacidade=max(64, len(linhas)))
+        self._aplicar_linhas(estoque, linhas)
+        return estoque, cursor
+
+    def sincronizar(self, estoque, cursor):
+        """Aplica em ``estoque`` só as linhas alteradas desde ``cursor``.
+
+        Se houve importação completa desde então, recarrega tudo. Devolve
+        ``(estoque, novo_cursor)`` (o estoque pode ser um objeto novo).
+        """
+        con = self._conexao()
+        con.execute("BEGIN")
+        try:
+            novo_cursor = self._cursor_atual(con)
+            if novo_cursor == cursor:
+                return estoque, cursor
+            if novo_cursor[0] != cursor[0]:
+                linhas = None
+            else:
+                linhas = con.execute(f"SELECT {_COLUNAS_ESTOQUE_SQL} FROM estoque WHERE versao > ? ORDER BY id",
+                                     (cursor[1],)).fetchall()
+        finally:
+            con.execute("COMMIT")
+        if linhas is None:
+            return self.carregar_estoque()
+        self._aplicar_linhas(estoque, linhas)
+        return estoque, novo_cursor
+
+    # --- Escrita ---
+
+    @staticmethod
+    def _linhas_importacao(bloco):
+        """Linhas de um bloco do arquivo de estoque no formato de ``_COLUNAS_ESTOQUE_SQL``, convertidas de uma vez.
+
+        Levanta ``ValueError`` se houver célula vazia numa coluna obrigatória
+        (Quantidade_Folhas vazia vale 0), em vez de deixar o NOT NULL do SQLite falhar.
+        """
+        vazias = [f"{coluna} ({quantidade} linha(s))" for coluna, quantidade in
+                  bloco[_COLUNAS_IMPORTACAO_OBRIGATORIAS].isna().sum().items() if quantidade]
+        if vazias:
+            raise ValueError(f"Células vazias no arquivo de estoque: {', '.join(vazias)}.")
+        try:
+            colunas = [
+                bloco['Modelo_Chapa'].tolist(),
+                (bloco['Largura_m'].astype(np.float64) * 1000).round().astype(np.int64).tolist(),
+                (bloco['Comprimento_m'].astype(np.float64) * 1000).round().astype(np.int64).tolist(),
+                bloco['Tipo_Papel'].tolist(),
+                bloco['Gramatura'].astype(np.float64).tolist(),
+                pd.to_numeric(bloco['Quantidade_Folhas'], errors='coerce').fillna(0).astype(np.int64).tolist(),
+                bloco['Preco_Kg'].astype(np.float64).tolist(),
+            ]
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Medidas inválidas ou vazias no arquivo de estoque ({e})") from e
+        return list(zip(*colunas))
+
+    def importar_estoque(self, dados):
+        """Substitui todo o estoque pelo conteúdo de ``dados`` (ex.: CSV de uma sessão anterior).
+
+        ``dados`` é um DataFrame com ``COLUNAS_ESTOQUE`` ou uma sequência de
+        blocos (``ler_estoque_em_blocos``), gravados à medida que são lidos, sem
+        montar o estoque em memória. Linhas repetidas da mesma chave têm as
+        folhas somadas. Tudo numa única transação: se um bloco falhar, o
+        estoque anterior fica intacto.
+        """
+        blocos = [dados] if isinstance(dados, pd.DataFrame) else dados
+        with self._transacao() as con:
+            versao = self._proxima_versao(con)
+            con.execute("DELETE FROM estoque")
+            con.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'geracao'")
+            data = _agora()
+            self._registrar_movimento(con, data, MOVIMENTO_IMPORTACAO)
+            for bloco in blocos:
+                linhas = self._linhas_importacao(bloco)
+                con.executemany(_SQL_UPSERT, (linha + (versao, linha[6]) for linha in linhas))
+                con.executemany(
+                    f"INSERT INTO movimentos ({_COLUNAS_MOVIMENTOS_SQL}) VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+                    ((data, MOVIMENTO_AJUSTE) + linha for linha in linhas))
+            self._criar_snapshot(con)  # O estoque importado vira a base: nada antes dele precisa ser refeito
+
+    def upsert(self, modelo, largura_m, comprimento_m, tipo_papel, gramatura, quantidade, preco_kg):
+        """Soma ``quantidade`` folhas ao item (Modelo, Tipo, Gramatura) ou o cria. Devolve a nova quantidade."""
+        linha = (modelo, round(largura_m * 1000), round(comprimento_m * 1000), tipo_papel, float(gramatura),
+                 int(quantidade), float(preco_kg))
+        with self._transacao() as con:
+            versao = self._proxima_versao(con)
+            self._upsert(con, versao, *linha)
+            self._registrar_movimento(con, _agora(), MOVIMENTO_AJUSTE, *linha)
+            self._snapshot_se_necessario(con)
+            return con.execute(
+                "SELECT quantidade_folhas FROM estoque WHERE modelo_chapa = ? AND tipo_papel = ? AND gramatura = ?",
+                (modelo, tipo_papel, float(gramatura))).fetchone()[0]
+
+    @staticmethod
+    def _upsert(con, versao, modelo, largura_mm, comprimento_mm, tipo_papel, gramatura, quantidade, preco_kg):
+        con.execute(_SQL_UPSERT, (modelo, largura_mm, comprimento_mm, tipo_papel, gramatura, quantidade,
+                                  preco_kg if preco_kg is not None else 0.0, versao, preco_kg))
+
+    @staticmethod
+    def _registrar_movimento(con, data, tipo, modelo=None, largura_mm=None, comprimento_mm=None, tipo_papel=None,
+                             gramatura=None, delta_folhas=0, preco_kg=None, os_pedido=None):
+        con.execute(f"INSERT INTO movimentos ({_COLUNAS_MOVIMENTOS_SQL}) VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (data, tipo, modelo, largura_mm, comprimento_mm, tipo_papel, gramatura, delta_folhas,
+                     preco_kg, os_pedido))
+
+    def _creditar_retalho(self, con, versao, data, os_pedido, largura_mm, comprimento_mm, tipo_papel, gramatura,
+                          quantidade):
+        # Mesmo critério de EstoqueMemoria.creditar_retalho: modelo RETALHO-LxC, depois qualquer item com a dimensão
+        largura_mm, comprimento_mm = round(largura_mm), round(comprimento_mm)
+        linha = con.execute(
+            "SELECT id, modelo_chapa FROM estoque WHERE modelo_chapa = ? AND tipo_papel = ? AND gramatura = ?",
+            (nome_retalho(largura_mm, comprimento_mm), tipo_papel, gramatura)).fetchone()
+        if linha is None:
+            linha = con.execute(
+                "SELECT id, modelo_chapa FROM estoque "
+                "WHERE tipo_papel = ? AND gramatura = ? AND largura_mm = ? AND comprimento_mm = ? "
+                "ORDER BY id LIMIT 1", (tipo_papel, gramatura, largura_mm, comprimento_mm)).fetchone()
+        if linha is not None:
+            con.execute("UPDATE estoque SET quantidade_folhas = quantidade_folhas + ?, versao = ? WHERE id = ?",
+                        (quantidade, versao, linha[0]))
+            self._registrar_movimento(con, data, MOVIMENTO_RETALHO, linha[1], largura_mm, comprimento_mm,
+                                      tipo_papel, gramatura, quantidade, None, os_pedido)
+            return False
+        modelo = nome_retalho(largura_mm, comprimento_mm)
+        con.execute(f"INSERT INTO estoque ({_COLUNAS_ESTOQUE_SQL}, versao) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (modelo, largura_mm, comprimento_mm, tipo_papel, gramatura,
+                     quantidade, PRECO_KG_RETALHO_PADRAO, versao))
+        self._registrar_movimento(con, data, MOVIMENTO_RETALHO, modelo, largura_mm, comprimento_mm,
+                                  tipo_papel, gramatura, quantidade, PRECO_KG_RETALHO_PADRAO, os_pedido)
+        return True
+
+    def _confirmar_pedido(self, con, versao, tipo_papel, gramatura, consumos, registro_pedido):
+        gramatura = float(gramatura)
+        data, os_pedido = _agora(), registro_pedido.get('OS')
+        retalhos_criados = []
+        for modelo, folhas, retalhos in consumos:
+            linha = con.execute(
+                "SELECT id, quantidade_folhas FROM estoque WHERE modelo_chapa = ? AND tipo_papel = ? AND gramatura = ?",
+                (modelo, tipo_papel, gramatura)).fetchone()
+            if linha is None or linha[1] < folhas:
+                disponivel = 0 if linha is None else linha[1]
+                raise EstoqueInsuficiente(
+                    f"Chapa '{modelo}' ({tipo_papel}, {gramatura:g}g/m²) tem {disponivel} folhas; "
+                    f"o pedido OS {registro_pedido.get('OS')} precisa de {folhas}.")
+
+            con.execute("UPDATE estoque SET quantidade_folhas = quantidade_folhas - ?, versao = ? WHERE id = ?",
+                        (folhas, versao, linha[0]))
+            self._registrar_movimento(con, data, MOVIMENTO_DEBITO, modelo, None, None, tipo_papel, gramatura,
+                                      -folhas, None, os_pedido)
+            retalhos_criados += [
+                nome_retalho(largura_mm, comprimento_mm)
+                for largura_mm, comprimento_mm, quantidade in retalhos
+                if quantidade > 0 and self._creditar_retalho(con, versao, data, os_pedido, largura_mm, comprimento_mm,
+                                                             tipo_papel, gramatura, quantidade)
+            ]
+        # Data da confirmação, não do planejamento (um lote pode ficar minutos em revisão)
+        registro_pedido['Data_Processamento'] = data
+        self._registrar_pedido(con, registro_pedido)
+        return retalhos_criados
+
+    def confirmar_pedido(self, tipo_papel, gramatura, consumos, registro_pedido):
+        """Debita as chapas, credita os retalhos e registra o pedido em uma única transação.
+
+        ``consumos`` é uma sequência de ``(modelo, folhas, retalhos)``, uma por
+        chapa ou retalho usado no pedido, com ``retalhos`` como
+        ``(largura_mm, comprimento_mm, quantidade)``; ``registro_pedido`` é um
+        dicionário com as colunas de ``COLUNAS_PEDIDOS``, cuja ``Data_Processamento``
+        é preenchida com a data da confirmação. Levanta
+        ``EstoqueInsuficiente`` (sem alterar nada) se algum item não tiver as
+        folhas necessárias. Devolve os modelos de retalho criados.
+        """
+        with self._transacao() as con:
+            versao = self._proxima_versao(con)
+            retalhos_criados = self._confirmar_pedido(con, versao, tipo_papel, gramatura, consumos, registro_pedido)
+            self._snapshot_se_necessario(con)
+            return retalhos_criados
+
+    def confirmar_lote(self, movimentos):
+        """Confirma vários pedidos em uma única transação: ou todos entram, ou nenhum.
+
+        ``movimentos`` é uma sequência de tuplas com os argumentos de
+        ``confirmar_pedido``, aplicadas em ordem (retalhos criados por um pedido
+        já podem ser consumidos pelos seguintes). Devolve os modelos de retalho criados.
+        """
+        retalhos_criados = []
+        with self._transacao() as con:
+            versao = self._proxima_versao(con)
+            for movimento in movimentos:
+                retalhos_criados.extend(self._confirmar_pedido(con, versao, *movimento))
+            self._snapshot_se_necessario(con)
+        return retalhos_criados
+
+    @staticmethod
+    def _registrar_pedido(con, registro_pedido):
+        colunas = [COLUNAS_PEDIDOS[nome] for nome in registro_pedido]
+        con.execute(f"INSERT INTO pedidos ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+                    tuple(registro_pedido.values()))
+
+    # --- Livro de movimentos e snapshots ---
+
+    @staticmethod
+    def _criar_snapshot(con):
+        ultimo = con.execute("SELECT COALESCE(MAX(id), 0) FROM movimentos").fetchone()[0]
+        snapshot_id = con.execute("INSERT INTO snapshots (ultimo_movimento, data) VALUES (?, ?)",
+                                  (ultimo, _agora())).lastrowid
+        con.execute(f"INSERT INTO snapshot_estoque (snapshot_id, {_COLUNAS_ESTOQUE_SQL}) "
+                    f"SELECT ?, {_COLUNAS_ESTOQUE_SQL} FROM estoque ORDER BY id", (snapshot_id,))
+        # O primeiro snapshot fica sempre: é a base para refazer qualquer momento do livro
+        antigos = con.execute("SELECT id FROM snapshots WHERE id > (SELECT MIN(id) FROM snapshots) "
+                              "ORDER BY id DESC LIMIT -1 OFFSET ?", (SNAPSHOTS_MANTIDOS,)).fetchall()
+        con.executemany("DELETE FROM snapshot_estoque WHERE snapshot_id = ?", antigos)
+        con.executemany("DELETE FROM snapshots WHERE id = ?", antigos)
+        return ultimo
+
+    def _snapshot_se_necessario(self, con):
+        ultimo_snapshot = con.execute("SELECT MAX(ultimo_movimento) FROM snapshots").fetchone()[0]
+        ultimo = con.execute("SELECT COALESCE(MAX(id), 0) FROM movimentos").fetchone()[0]
+        if ultimo - ultimo_snapshot >= INTERVALO_SNAPSHOT:
+            self._criar_snapshot(con)
+
+    def criar_snapshot(self):
+        """Copia o estoque atual para um novo snapshot. Devolve o último movimento que ele inclui."""
+        with self._transacao() as con:
+            return self._criar_snapshot(con)
+
+    def _reconstruir(self, con, ate_movimento):
+        snapshot = con.execute(
+            "SELECT id, ultimo_movimento FROM snapshots WHERE ultimo_movimento <= ? "
+            "ORDER BY ultimo_movimento DESC, id DESC LIMIT 1", (ate_movimento,)).fetchone()
+        if snapshot is None:  # Antes do primeiro snapshot: o mais antigo é o melhor estado conhecido
+            snapshot = con.execute("SELECT id, ultimo_movimento FROM snapshots ORDER BY id LIMIT 1").fetchone()
+        snapshot_id, base = snapshot
+        itens = {}
+        for linha in con.execute(f"SELECT {_COLUNAS_ESTOQUE_SQL} FROM snapshot_estoque WHERE snapshot_id = ?",
+                                 (snapshot_id,)):
+            itens[(linha[0], linha[3], linha[4])] = list(linha)
+        for movimento in con.execute(
+                "SELECT tipo, modelo_chapa, largura_mm, comprimento_mm, tipo_papel, gramatura, delta_folhas, preco_kg "
+                "FROM movimentos WHERE id > ? AND id <= ? ORDER BY id", (base, ate_movimento)):
+            _aplicar_movimento(itens, *movimento)
+        return itens
+
+    def reconstruir_estoque(self, ate_movimento=None, ate_data=None):
+        """Estoque como estava após o movimento ``ate_movimento`` ou na data ``ate_data``.
+
+        ``ate_data`` é um ``datetime`` ou texto ``AAAA-MM-DD HH:MM:SS`` (inclusive).
+        Sem nenhum dos dois, o estado atual. Parte do snapshot mais recente
+        anterior ao ponto pedido e refaz só os movimentos seguintes. Devolve
+        ``(EstoqueMemoria, último movimento incluído)``.
+        """
+        if isinstance(ate_data, datetime):
+            ate_data = ate_data.strftime("%Y-%m-%d %H:%M:%S")
+        con = self._conexao()
+        con.execute("BEGIN")  # Snapshot e movimentos lidos do mesmo estado do banco
+        try:
+            if ate_data is not None:
+                alvo = con.execute("SELECT COALESCE(MAX(id), 0) FROM movimentos WHERE data <= ?",
+                                   (str(ate_data),)).fetchone()[0]
+            else:
+                alvo = con.execute("SELECT COALESCE(MAX(id), 0) FROM movimentos").fetchone()[0]
+            if ate_movimento is not None:
+                alvo = min(alvo, int(ate_movimento))
+            itens = self._reconstruir(con, alvo)
+        finally:
+            con.execute("COMMIT")
+        estoque = EstoqueMemoria(capacidade=max(64, len(itens)))
+        self._aplicar_linhas(estoque, itens.values())
+        return estoque, alvo
+
+    def recuperar_estoque(self):
+        """Refaz a tabela ``estoque`` a partir do último snapshot e dos movimentos seguintes.
+
+        Para recuperar o estado atual sem reimportar um CSV (ex.: tabela
+        danificada ou banco restaurado só com o livro). As sessões recarregam o
+        estoque inteiro. Devolve a quantidade de itens.
+        """
+        with self._transacao() as con:
+            itens = self._reconstruir(con, con.execute("SELECT COALESCE(MAX(id), 0) FROM movimentos").fetchone()[0])
+            versao = self._proxima_versao(con)
+            con.execute("DELETE FROM estoque")
+            con.executemany(f"INSERT INTO estoque ({_COLUNAS_ESTOQUE_SQL}, versao) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (tuple(linha) + (versao,) for linha in itens.values()))
+            con.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'geracao'")
+        return len(itens)
+
+    def movimentos(self, desde=0, ate=None):
+        """Movimentos com número maior que ``desde`` (e até ``ate``), em ordem, com as colunas de ``COLUNAS_MOVIMENTOS``."""
+        sql = f"SELECT {_COLUNAS_MOVIMENTOS_SQL} FROM movimentos WHERE id > ?"
+        parametros = (int(desde),)
+        if ate is not None:
+            sql, parametros = sql + " AND id <= ?", parametros + (int(ate),)
+        linhas = self._conexao().execute(sql + " ORDER BY id", parametros).fetchall()
+        return pd.DataFrame(linhas, columns=list(COLUNAS_MOVIMENTOS))
+
+    def ultimo_movimento(self):
+        return self._conexao().execute("SELECT COALESCE(MAX(id), 0) FROM movimentos").fetchone()[0]
+
+    def aplicar_movimentos(self, df_movimentos):
+        """Aplica movimentos de outro banco (``movimentos()`` de lá) a este, em uma única transação.
+
+        Para manter uma cópia em outra máquina só com o que mudou: os números
+        dos movimentos são preservados e os já aplicados (até
+        ``ultimo_movimento()``) são ignorados, então reenviar um trecho não
+        duplica nada. A cópia não deve receber lançamentos próprios. Devolve
+        quantos movimentos foram aplicados.
+        """
+        df = df_movimentos.astype(object).where(df_movimentos.notna(), None)
+        with self._transacao() as con:
+            ultimo = con.execute("SELECT COALESCE(MAX(id), 0) FROM movimentos").fetchone()[0]
+            novos = [linha for linha in df[list(COLUNAS_MOVIMENTOS)].itertuples(index=False, name=None)
+                     if int(linha[0]) > ultimo]
+            if not novos:
+                return 0
+            versao = self._proxima_versao(con)
+            for (numero, data, tipo, modelo, largura_mm, comprimento_mm, tipo_papel, gramatura, delta_folhas,
+                 preco_kg, os_pedido) in sorted(novos, key=lambda linha: int(linha[0])):
+                gramatura = float(gramatura) if gramatura is not None else None
+                delta_folhas = int(delta_folhas)
+                if tipo == MOVIMENTO_IMPORTACAO:
+                    con.execute("DELETE FROM estoque")
+                    con.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'geracao'")
+                elif largura_mm is None:
+                    # Débito: o movimento só identifica o item, que já tem que existir na cópia
+                    atualizado = con.execute(
+                        "UPDATE estoque SET quantidade_folhas = quantidade_folhas + ?, versao = ? "
+                        "WHERE modelo_chapa = ? AND tipo_papel = ? AND gramatura = ?",
+                        (delta_folhas, versao, modelo, tipo_papel, gramatura)).rowcount
+                    if not atualizado:
+                        raise ValueError(f"Movimento {numero}: item '{modelo}' ({tipo_papel}, {gramatura:g}g/m²) "
+                                         "não existe neste banco; a cópia não acompanha o banco de origem.")
+                else:
+                    self._upsert(con, versao, modelo, int(largura_mm), int(comprimento_mm), tipo_papel, gramatura,
+                                 delta_folhas, preco_kg)
+                con.execute(f"INSERT INTO movimentos ({_COLUNAS_MOVIMENTOS_SQL}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (int(numero), data, tipo, modelo, largura_mm, comprimento_mm, tipo_papel, gramatura,
+                             delta_folhas, preco_kg, os_pedido))
+            self._snapshot_se_necessario(con)
+        return len(novos)
+
+    # --- Consultas ao log de pedidos ---
+
+    @staticmethod
+    def _filtro_pedidos(filtro):
+        texto = filtro.strip()
+        if not texto:
+            return "", ()
+        condicao = " OR ".join(f"{coluna} LIKE ? ESCAPE '\\'" for coluna in _COLUNAS_FILTRO_PEDIDOS)
+        padrao = "%" + texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return f" WHERE {condicao}", (padrao,) * len(_COLUNAS_FILTRO_PEDIDOS)
+
+    def consultar_pedidos(self, filtro='', ordenar_por=None, crescente=False, pagina=1, tamanho_pagina=50):
+        """Uma página do log de pedidos (``gbs.paginacao.Pagina``), com as colunas de ``COLUNAS_PEDIDOS``.
+
+        ``filtro`` procura o texto em OS, Cliente, Descrição, Modelo e Tipo de
+        papel; ``ordenar_por`` é uma coluna de ``COLUNAS_PEDIDOS`` (padrão: ordem
+        de lançamento). Filtro, ordenação e paginação são feitos pelo SQLite.
+        """
+        where, parametros = self._filtro_pedidos(filtro)
+        # Só nomes conhecidos entram no SQL; o id desempata (e é a ordem de lançamento)
+        coluna_ordem = COLUNAS_PEDIDOS.get(ordenar_por, 'id')
+        direcao = "ASC" if crescente else "DESC"
+        con = self._conexao()
+        total = con.execute(f"SELECT COUNT(*) FROM pedidos{where}", parametros).fetchone()[0]
+        numero, total_paginas, inicio = limitar_pagina(pagina, total, tamanho_pagina)
+        linhas = con.execute(
+            f"SELECT {', '.join(COLUNAS_PEDIDOS.values())} FROM pedidos{where} "
+            f"ORDER BY {coluna_ordem} {direcao}, id {direcao} LIMIT ? OFFSET ?",
+            parametros + (tamanho_pagina, inicio)).fetchall()
+        return Pagina(pd.DataFrame(linhas, columns=list(COLUNAS_PEDIDOS)), total, numero, total_paginas)
+
+    def exportar_pedidos(self):
+        """Log de pedidos completo, em ordem de lançamento (para download)."""
+        linhas = self._conexao().execute(f"SELECT {', '.join(COLUNAS_PEDIDOS.values())} FROM pedidos ORDER BY id").fetchall()
+        return pd.DataFrame(linhas, columns=list(COLUNAS_PEDIDOS))
+
+    def _blocos(self, sql, colunas, tipos, tamanho_bloco):
+        # Conexão própria: o gerador pode ser consumido aos poucos (ex.: gravando um arquivo) sem
+        # prender a conexão da thread, e a leitura vê um único estado do banco do início ao fim
+        con = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            cursor = con.execute(sql)
+            while True:
+                linhas = cursor.fetchmany(tamanho_bloco)
+                yield pd.DataFrame(linhas, columns=colunas).astype(tipos)
+                if len(linhas) < tamanho_bloco:
+                    break
+        finally:
+            con.close()
+
+    def pedidos_em_blocos(self, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+        """Log de pedidos em ordem de lançamento, em DataFrames de até ``tamanho_bloco`` linhas (ao menos um)."""
+        return self._blocos(f"SELECT {', '.join(COLUNAS_PEDIDOS.values())} FROM pedidos ORDER BY id",
+                            list(COLUNAS_PEDIDOS), _TIPOS_PEDIDOS, tamanho_bloco)
+
+    def estoque_em_blocos(self, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+        """Estoque direto do banco com ``COLUNAS_ESTOQUE``, em blocos, sem carregar um ``EstoqueMemoria``."""
+        sql = ("SELECT modelo_chapa, largura_mm / 1000.0, comprimento_mm / 1000.0, tipo_papel, gramatura, "
+               "quantidade_folhas, preco_kg, 0.0, 0.0 FROM estoque ORDER BY modelo_chapa, tipo_papel, gramatura")
+        tipos = {'Modelo_Chapa': object, 'Tipo_Papel': object, 'Quantidade_Folhas': np.int64}
+        for bloco in self._blocos(sql, COLUNAS_ESTOQUE, tipos, tamanho_bloco):
+            yield calcular_peso_valor(bloco)
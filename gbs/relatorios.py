@@ -0,0 +1,87 @@
+"""Relatórios exportados em CSV (formato das planilhas do GBS: ``;`` e vírgula decimal) ou Parquet.
+
+As exportações recebem blocos de DataFrame (``EstoqueMemoria.blocos``,
+``BancoEstoque.estoque_em_blocos``, ``BancoEstoque.pedidos_em_blocos``) e
+gravam um bloco por vez, então o estoque ou o histórico inteiro nunca precisa
+estar montado num único DataFrame. O Parquet requer o pacote ``pyarrow``.
+"""
+import io
+from datetime import datetime
+
+import pandas as pd
+
+# Ordem das colunas do log de pedidos na tela e nos arquivos exportados
+COLUNAS_PEDIDOS_EXIBICAO = [
+    'OS', 'Cliente', 'Descricao_Pedido', 'Valor_Pedido_Total_R$',
+    'Peso_Total_Pedido_kg', 'Quantidade_Caixas',
+    'Dimensao_Corte_LxC_m', 'Modelo_Chapa_Pedido', 'Tipo_Papel_Pedido',
+    'Gramatura_Pedido', 'Chapas_Consumidas', 'Retalhos_Gerados_Dimensoes',
+    'Data_Processamento'
+]
+
+# Formato -> (extensão, tipo MIME)
+FORMATOS = {
+    'CSV': ('.csv', 'text/csv'),
+    'Parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def formato_do_arquivo(nome_arquivo):
+    """``'Parquet'`` para ``*.parquet``, senão ``'CSV'``."""
+    return 'Parquet' if nome_arquivo.lower().endswith('.parquet') else 'CSV'
+
+
+def ler_tabela(arquivo, nome_arquivo=''):
+    """Lê uma tabela exportada pelo GBS (CSV com ``;`` e vírgula decimal, ou ``.parquet``)."""
+    if formato_do_arquivo(nome_arquivo or str(arquivo)) == 'Parquet':
+        return pd.read_parquet(arquivo)  # Requer o pacote pyarrow
+    return pd.read_csv(arquivo, sep=';', decimal=',')
+
+
+def para_csv(df):
+    """Conteúdo CSV (bytes UTF-8) de um DataFrame, sem o índice."""
+    return df.to_csv(index=False, sep=';', decimal=',').encode('utf-8')
+
+
+def escrever_csv(blocos, destino):
+    """Grava os blocos em ``destino`` (arquivo binário) como um único CSV, com o cabeçalho só no início."""
+    for i, bloco in enumerate(blocos):
+        destino.write(bloco.to_csv(index=False, header=i == 0, sep=';', decimal=',').encode('utf-8'))
+
+
+def escrever_parquet(blocos, destino):
+    """Grava os blocos em ``destino`` como um Parquet, um grupo de linhas por bloco."""
+    import pyarrow as pa  # Requer o pacote pyarrow
+    import pyarrow.parquet as pq
+
+    escritor = None
+    try:
+        for bloco in blocos:
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(destino, tabela.schema)
+            escritor.write_table(tabela.cast(escritor.schema))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def exportar(blocos, formato, destino):
+    """Grava os blocos em ``destino`` (arquivo binário) no ``formato`` (chave de ``FORMATOS``)."""
+    (escrever_parquet if formato == 'Parquet' else escrever_csv)(blocos, destino)
+
+
+def para_bytes(blocos, formato='CSV'):
+    """Conteúdo do arquivo exportado, para um botão de download."""
+    buffer = io.BytesIO()
+    exportar(blocos, formato, buffer)
+    return buffer.getvalue()
+
+
+def pedidos_blocos(banco):
+    """Histórico completo de pedidos do banco, em ordem de lançamento e com as colunas da tela."""
+    return (bloco[COLUNAS_PEDIDOS_EXIBICAO] for bloco in banco.pedidos_em_blocos())
+
+
+def nome_arquivo_pedidos(formato='CSV'):
+    return f"pedidos_gbs_{datetime.now().strftime('%Y%m%d_%H%M%S')}{FORMATOS[formato][0]}"
@@ -0,0 +1,84 @@
+"""Índice de retalhos para reaproveitamento por "best-fit".
+
+Os retalhos disponíveis (quantidade > 0) de cada (Tipo_Papel, Gramatura) ficam
+em faixas pelo menor lado (dimensões inteiras em mm normalizadas para
+(menor lado, maior lado)): uma lista ordenada dos menores lados existentes e,
+para cada um, a lista dos retalhos ordenada pelo maior lado, que dentro da
+faixa é a ordem por área.
+
+A consulta "menor retalho que comporta W x C" localiza por busca binária a
+primeira faixa com menor lado suficiente e, em cada faixa, o primeiro retalho
+com maior lado suficiente (o de menor área da faixa). As faixas são
+percorridas em ordem crescente só enquanto o limite inferior de área delas
+(menor lado x maior lado da peça) ainda pode bater o melhor encontrado; retalhos
+estreitos demais nunca são visitados. O custo é O(k log n), com k o número de
+faixas visitadas até a poda, limitado pelos menores lados distintos (poucas
+centenas de medidas em mm). Inclusão e retirada custam uma busca binária e um
+deslocamento dentro de uma faixa.
+"""
+from bisect import bisect_left, insort
+
+
+class IndiceRetalhos:
+    """Retalhos disponíveis por (Tipo_Papel, Gramatura), em faixas pelo menor lado."""
+
+    def __init__(self):
+        # (tipo, gramatura) -> ([menor_mm] ordenada, {menor_mm: [(maior_mm, pos)] ordenada})
+        self._por_grupo = {}
+        self._entradas = {}  # pos -> ((tipo, gramatura), menor_mm, maior_mm)
+
+    def copia(self):
+        nova = IndiceRetalhos()
+        nova._por_grupo = {grupo: (list(lados), {lado: list(faixa) for lado, faixa in faixas.items()})
+                           for grupo, (lados, faixas) in self._por_grupo.items()}
+        nova._entradas = dict(self._entradas)
+        return nova
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def atualizar(self, pos, tipo_papel, gramatura, largura_mm, comprimento_mm, disponivel):
+        """Inclui (``disponivel``) ou retira o retalho da posição ``pos`` do índice."""
+        if disponivel == (pos in self._entradas):
+            return
+        if disponivel:
+            menor, maior = sorted((int(largura_mm), int(comprimento_mm)))
+            grupo = (tipo_papel, gramatura)
+            lados, faixas = self._por_grupo.setdefault(grupo, ([], {}))
+            if menor not in faixas:
+                insort(lados, menor)
+                faixas[menor] = []
+            insort(faixas[menor], (maior, pos))
+            self._entradas[pos] = (grupo, menor, maior)
+        else:
+            grupo, menor, maior = self._entradas.pop(pos)
+            lados, faixas = self._por_grupo[grupo]
+            faixa = faixas[menor]
+            del faixa[bisect_left(faixa, (maior, pos))]
+            if not faixa:
+                del faixas[menor]
+                del lados[bisect_left(lados, menor)]
+
+    def menor_que_comporta(self, tipo_papel, gramatura, largura_mm, comprimento_mm, ignorar=()):
+        """Posição do retalho de menor área que comporta a peça ``largura x comprimento``, ou ``None``.
+
+        Empates de área ficam com o retalho de menor lado mais curto e, depois, com a menor posição.
+        """
+        grupo = self._por_grupo.get((tipo_papel, gramatura))
+        if not grupo:
+            return None
+        lados, faixas = grupo
+        menor_peca, maior_peca = sorted((largura_mm, comprimento_mm))
+        melhor = None  # (area, pos)
+        for i in range(bisect_left(lados, menor_peca), len(lados)):
+            menor = lados[i]
+            if melhor is not None and menor * max(maior_peca, menor) >= melhor[0]:
+                break  # Faixas seguintes são mais largas: nenhuma tem área menor que a do melhor
+            faixa = faixas[menor]
+            for j in range(bisect_left(faixa, (maior_peca,)), len(faixa)):
+                maior, pos = faixa[j]
+                if pos not in ignorar:
+                    if melhor is None or menor * maior < melhor[0]:
+                        melhor = (menor * maior, pos)
+                    break
+        return None if melhor is None else melhor[1]
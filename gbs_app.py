@@ -1,76 +1,162 @@
 import streamlit as st
 import pandas as pd
-import math
-import io
+import os
+import uuid
 from datetime import datetime
 
-# --- Lógica de Cálculo de Aproveitamento e Retalhos com Sequência de Corte Real ---
-def calcular_aproveitamento_e_retalhos_novo(largura_corte_mm, comprimento_corte_mm, largura_chapa_base_mm, comprimento_chapa_base_mm):
-    # Dimensões da chapa base (do seu estoque)
-    L_base = largura_chapa_base_mm
-    C_base = comprimento_chapa_base_mm
-
-    # Dimensões da chapa de corte da caixa
-    L_corte = largura_corte_mm
-    C_corte = comprimento_corte_mm
-
-    retalhos_gerados_map = {} # Dicionário para armazenar dimensões e quantidades de retalhos POR CHAPA BASE
-
-    # --- SIMULAÇÃO DA SEQUÊNCIA DE CORTE REAL (Prioriza corte no COMPRIMENTO da chapa base) ---
-
-    # 1. Quantidade de peças que cabem ao longo do COMPRIMENTO da chapa base (C_base)
-    pecas_ao_longo_comprimento = math.floor(C_base / C_corte)
-    
-    # 2. Quantidade de peças que cabem ao longo da LARGURA da chapa base (L_base)
-    pecas_ao_longo_largura = math.floor(L_base / L_corte)
-
-    qtd_caixas_produzidas_por_chapa = pecas_ao_longo_comprimento * pecas_ao_longo_largura
-
-    # --- Cálculo dos Retalhos ---
-
-    # Retalho do COMPRIMENTO (Vertical): O grande retalho gerado na ponta do comprimento da chapa
-    sobra_C = C_base - (pecas_ao_longo_comprimento * C_corte)
-    if sobra_C > 0.1: # Considera sobra se for maior que 0.1mm (para evitar retalhos muito pequenos por erro de float)
-        # Formato LARGURA x COMPRIMENTO
-        retalho_C_dim = f"{L_base:.0f}x{sobra_C:.0f}" # Largura total da chapa base x sobra de comprimento
-        # A quantidade é 1 POR CHAPA BASE.
-        retalhos_gerados_map[retalho_C_dim] = retalhos_gerados_map.get(retalho_C_dim, 0) + 1 
-
-    # Retalhos da LARGURA (Horizontais): Múltiplos retalhos gerados na lateral da chapa
-    sobra_L = L_base - (pecas_ao_longo_largura * L_corte)
-    if sobra_L > 0.1: # Considera sobra se for maior que 0.1mm
-        # Formato LARGURA x COMPRIMENTO
-        # O comprimento deste retalho é o comprimento da peça de corte, conforme sua descrição.
-        retalho_L_dim = f"{sobra_L:.0f}x{C_corte:.0f}" # Sobra de largura x Comprimento da PEÇA CORTADA
-        # A quantidade é igual ao número de peças que couberam no COMPRIMENTO (pecas_ao_longo_comprimento)
-        retalhos_gerados_map[retalho_L_dim] = retalhos_gerados_map.get(retalho_L_dim, 0) + pecas_ao_longo_comprimento
-
-    return qtd_caixas_produzidas_por_chapa, retalhos_gerados_map
-
+from gbs.aproveitamento import avaliar_estoque
+from gbs.cache_aproveitamento import calcular_aproveitamento, obter_cache
+from gbs.corte_global import otimizar_pedidos_estoque
+from gbs.estoque import COLUNAS_ESTOQUE, ler_estoque_em_blocos
+from gbs.metricas import (
+    cronometrar_blocos, etapa, para_jsonl, perfil, resumo_etapas, tamanho_dataframe, ultimos_perfis
+)
+from gbs.lote import (
+    COLUNA_MODELO_OPCIONAL, COLUNAS_LOTE, STATUS_OK, ler_pedidos_lote, planejar_lote, planejar_pedido
+)
+from gbs.otimizador import ranquear_chapas
+from gbs.paginacao import TAMANHOS_PAGINA
+from gbs.persistencia import BancoEstoque, EstoqueInsuficiente
+from gbs.relatorios import COLUNAS_PEDIDOS_EXIBICAO, FORMATOS, nome_arquivo_pedidos, para_bytes, pedidos_blocos
+
+# Banco SQLite compartilhado por todos os operadores deste servidor
+CAMINHO_BANCO = os.environ.get('GBS_BANCO', 'gbs_estoque.db')
+
+# --- Banco de dados: uma instância por processo, compartilhada entre as sessões ---
+@st.cache_resource
+def obter_banco():
+    return BancoEstoque(CAMINHO_BANCO)
+
+
+# --- Atualiza o estoque da sessão com o que mudou no banco (nesta ou em outras sessões) ---
+def sincronizar_estoque(banco):
+    with etapa('sincronizar_estoque') as dados:
+        if 'estoque' not in st.session_state:
+            st.session_state.estoque, st.session_state.estoque_cursor = banco.carregar_estoque()
+        else:
+            st.session_state.estoque, st.session_state.estoque_cursor = banco.sincronizar(
+                st.session_state.estoque, st.session_state.estoque_cursor)
+        dados['linhas'] = len(st.session_state.estoque)
+    return st.session_state.estoque
+
+
+# --- Tabela enviada ao navegador; a serialização é cronometrada com o tamanho do DataFrame ---
+def exibir_dataframe(nome, df, **opcoes):
+    with etapa(f'st.dataframe.{nome}', **tamanho_dataframe(df)):
+        st.dataframe(df, use_container_width=True, **opcoes)
+
+
+# --- Controles de filtro, ordenação e página de uma tabela paginada ---
+def controles_tabela(chave, colunas):
+    col_filtro, col_ordem, col_direcao, col_tamanho, col_pagina = st.columns([3, 2, 1, 1, 1])
+    filtro = col_filtro.text_input("Filtrar", key=f"{chave}_filtro", placeholder="Texto a procurar")
+    ordenar_por = col_ordem.selectbox("Ordenar por", ["(padrão)"] + list(colunas), key=f"{chave}_ordem")
+    decrescente = col_direcao.checkbox("Decrescente", key=f"{chave}_decrescente")
+    tamanho_pagina = col_tamanho.selectbox("Linhas", TAMANHOS_PAGINA, index=1, key=f"{chave}_tamanho")
+    pagina = col_pagina.number_input("Página", min_value=1, step=1, key=f"{chave}_pagina")
+    return filtro, (None if ordenar_por == "(padrão)" else ordenar_por), not decrescente, pagina, tamanho_pagina
+
+
+def exibir_pagina(nome, pagina, column_config):
+    exibir_dataframe(nome, pagina.dados, column_config=column_config)
+    st.caption(f"Página {pagina.pagina} de {pagina.total_paginas} ({pagina.total} linha(s))")
+
+
+# --- Tabela do estoque (tipada, paginada) e totais mantidos pelo próprio estoque ---
+def exibir_estoque(estoque, chave):
+    totais = estoque.totais()
+    col_folhas, col_area, col_peso, col_valor = st.columns(4)
+    col_folhas.metric("Folhas em Estoque", f"{totais['Quantidade_Folhas']:,}".replace(',', '.'))
+    col_area.metric("Área Total (m²)", f"{totais['Area_Total_m2']:.2f}")
+    col_peso.metric("Peso Total (kg)", f"{totais['Peso_Total_kg']:.2f}")
+    col_valor.metric("Valor Total (R$)", f"{totais['Valor_Total_R$']:.2f}")
+
+    # Filtro, ordenação e paginação no servidor: só a página visível é enviada ao navegador
+    filtro, ordenar_por, crescente, pagina, tamanho_pagina = controles_tabela(chave, COLUNAS_ESTOQUE)
+    with etapa('estoque.pagina', linhas=len(estoque)):
+        pagina_estoque = estoque.pagina(filtro, ordenar_por, crescente, pagina, tamanho_pagina)
+    exibir_pagina(chave, pagina_estoque, {
+        "Preco_Kg": st.column_config.NumberColumn(format="%.2f"),
+        "Peso_Total_kg": st.column_config.NumberColumn(format="%.2f"),
+        "Valor_Total_R$": st.column_config.NumberColumn(format="%.2f")
+    })
+    with st.expander("Totais por Tipo de Papel e Gramatura"):
+        exibir_dataframe(f'{chave}_totais', estoque.totais_por_tipo_gramatura(), hide_index=True,
+                         column_config={
+                             "Area_Total_m2": st.column_config.NumberColumn(format="%.2f"),
+                             "Peso_Total_kg": st.column_config.NumberColumn(format="%.2f"),
+                             "Valor_Total_R$": st.column_config.NumberColumn(format="%.2f")
+                         })
+
+
+# --- Painel de desempenho: etapas do último rerun e das últimas execuções deste servidor ---
+def exibir_painel_desempenho():
+    perfis = ultimos_perfis('rerun')
+    if not perfis:
+        return
+    st.divider()
+    st.header("⏱️ Desempenho")
+    # O histórico é do servidor inteiro; "último rerun" é o desta sessão
+    ultimo = next((registro for registro in reversed(perfis) if registro.get('sessao') == st.session_state.id_sessao),
+                  perfis[-1])
+    duracoes = pd.Series([registro['duracao_ms'] for registro in perfis])
+    col_ultimo, col_p50, col_p95, col_cache = st.columns(4)
+    col_ultimo.metric("Último rerun (ms)", f"{ultimo['duracao_ms']:.1f}")
+    col_p50.metric(f"p50 dos últimos {len(perfis)} (ms)", f"{duracoes.quantile(0.5):.1f}")
+    col_p95.metric(f"p95 dos últimos {len(perfis)} (ms)", f"{duracoes.quantile(0.95):.1f}")
+    col_cache.metric("Cache no último rerun", f"{ultimo['cache_acertos']} acertos / {ultimo['cache_falhas']} falhas")
+
+    st.subheader("Etapas do último rerun")
+    # Na ordem de início, com recuo pelo nível: o tempo de uma etapa inclui o das etapas logo abaixo dela
+    etapas = pd.DataFrame(ultimo['etapas'])
+    if not etapas.empty:
+        etapas = etapas.sort_values('inicio_ms', kind='stable')
+        etapas.insert(0, 'Etapa', ['\u2003' * nivel + nome for nivel, nome in zip(etapas.pop('nivel'), etapas.pop('nome'))])
+    st.dataframe(etapas, use_container_width=True, hide_index=True,
+                 column_config={nome: st.column_config.NumberColumn(format="%.2f") for nome in ['inicio_ms', 'duracao_ms']})
+
+    st.subheader("Etapas nas últimas execuções (todas as sessões)")
+    st.dataframe(resumo_etapas(perfis), use_container_width=True, hide_index=True,
+                 column_config={nome: st.column_config.NumberColumn(format="%.2f")
+                                for nome in ['p50_ms', 'p95_ms', 'max_ms', 'total_ms']})
+    st.download_button(label="Baixar métricas (JSON Lines)", data=lambda: para_jsonl(ultimos_perfis()),
+                       file_name=f"metricas_gbs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                       mime="application/jsonl")
 
-# --- Configuração da Página do Streamlit (DEVE SER A PRIMEIRA COISA A SER CHAMADA) ---
-st.set_page_config(layout="wide", page_title="GBS - Planejamento de Produção")
 
 # --- Função principal do Streamlit ---
 def main():
+    # Configuração da página: deve ser a primeira chamada do Streamlit no rerun.
+    # Fica aqui (e não no import) para que o módulo possa ser importado sem o servidor.
+    st.set_page_config(layout="wide", page_title="GBS - Planejamento de Produção")
+    mostrar_desempenho = st.sidebar.checkbox("Mostrar painel de desempenho", key="painel_desempenho",
+                                             help="Tempo de cada etapa do rerun, tamanho das tabelas e uso do cache.")
+    if 'id_sessao' not in st.session_state:
+        st.session_state.id_sessao = uuid.uuid4().hex[:8]
+
+    # Cada rerun é um perfil: as etapas (aqui e no pacote gbs) são cronometradas e emitidas como métricas
+    # Acertos e falhas do cache são somados pelo próprio cache ao perfil ativo (só os desta sessão)
+    with perfil('rerun', sessao=st.session_state.id_sessao, cache_acertos=0, cache_falhas=0) as perfil_rerun:
+        try:
+            executar_abas()
+        finally:
+            perfil_rerun.atributos.update(
+                itens_estoque=len(st.session_state.estoque) if 'estoque' in st.session_state else 0,
+                cache_itens=obter_cache().estatisticas()['itens'])
+    if mostrar_desempenho:
+        exibir_painel_desempenho()
+
+
+def executar_abas():
     st.title("📦 GBS - Planejamento e Controle de Produção")
 
-    # --- Inicialização dos DataFrames na memória (st.session_state) ---
-    # Estoque
-    if 'df_estoque' not in st.session_state:
-        st.session_state.df_estoque = pd.DataFrame(columns=[
-            'Modelo_Chapa', 'Largura_m', 'Comprimento_m', 'Tipo_Papel', 'Gramatura', 
-            'Quantidade_Folhas', 'Preco_Kg', 'Peso_Total_kg', 'Valor_Total_R$'
-        ])
-    # Pedidos (log da sessão atual)
-    if 'df_pedidos' not in st.session_state: 
-        st.session_state.df_pedidos = pd.DataFrame(columns=[
-            'OS', 'Cliente', 'Descricao_Pedido', 'Valor_Pedido_Total_R$', 
-            'Dimensao_Corte_LxC_m', 'Quantidade_Caixas', 
-            'Modelo_Chapa_Pedido', 'Tipo_Papel_Pedido', 'Gramatura_Pedido', 
-            'Chapas_Consumidas', 'Retalhos_Gerados_Dimensoes', 
-            'Peso_Total_Pedido_kg', 'Data_Processamento'
-        ])
+    # --- Inicialização dos dados na memória (st.session_state) ---
+    # Estoque: carregado do banco na primeira execução; depois só as linhas alteradas
+    banco = obter_banco()
+    estoque = sincronizar_estoque(banco)
+    # Pedidos lançados nesta sessão (registros; o histórico completo fica na tabela de pedidos do banco)
+    if 'pedidos_sessao' not in st.session_state:
+        st.session_state.pedidos_sessao = []
     
     # Inicializa variáveis para o cálculo temporário do pedido
     if 'calculo_pedido_temp' not in st.session_state:
@@ -82,31 +168,24 @@ def main():
     with tab_estoque:
         st.header("➕ Lançar e Visualizar Estoque")
 
-        # --- Carregar Estoque Existente (CSV) ---
-        st.subheader("Carregar Estoque Existente da Última Sessão")
-        st.info("Para começar com seus dados anteriores, faça o upload do arquivo 'estoque_gbs_atualizado.csv' que você baixou na sua última sessão.")
-        uploaded_file = st.file_uploader("Carregar arquivo de Estoque CSV (.csv)", type=["csv"], key="estoque_uploader")
-        if uploaded_file is not None:
+        # --- Carregar Estoque Existente (CSV ou Parquet) ---
+        st.subheader("Importar Estoque de Arquivo CSV ou Parquet")
+        st.info("O estoque fica salvo no banco de dados e é compartilhado entre os operadores. Importar um arquivo CSV ou Parquet (ex.: 'estoque_gbs_atualizado.csv') SUBSTITUI todo o estoque do banco.")
+        uploaded_file = st.file_uploader("Carregar arquivo de Estoque (.csv ou .parquet)", type=["csv", "parquet"], key="estoque_uploader")
+        # O uploader devolve o arquivo a cada rerun: só recarrega quando é um arquivo novo
+        if uploaded_file is not None and st.session_state.get('estoque_arquivo_id') != uploaded_file.file_id:
             try:
-                st.session_state.df_estoque = pd.read_csv(uploaded_file, sep=';', decimal=',') # Considera ; como separador
-                # Garante que as colunas numéricas estejam no tipo correto
-                st.session_state.df_estoque['Largura_m'] = pd.to_numeric(st.session_state.df_estoque['Largura_m'], errors='coerce')
-                st.session_state.df_estoque['Comprimento_m'] = pd.to_numeric(st.session_state.df_estoque['Comprimento_m'], errors='coerce')
-                st.session_state.df_estoque['Gramatura'] = pd.to_numeric(st.session_state.df_estoque['Gramatura'], errors='coerce')
-                st.session_state.df_estoque['Quantidade_Folhas'] = pd.to_numeric(st.session_state.df_estoque['Quantidade_Folhas'], errors='coerce')
-                st.session_state.df_estoque['Preco_Kg'] = pd.to_numeric(st.session_state.df_estoque['Preco_Kg'], errors='coerce')
-
-                # Recalcula Peso_Total_kg e Valor_Total_R$ para garantir consistência
-                st.session_state.df_estoque['Peso_Total_kg'] = (
-                    st.session_state.df_estoque['Largura_m'] * st.session_state.df_estoque['Comprimento_m'] * (st.session_state.df_estoque['Gramatura'] / 1000) * st.session_state.df_estoque['Quantidade_Folhas']
-                )
-                st.session_state.df_estoque['Valor_Total_R'] = (
-                    st.session_state.df_estoque['Peso_Total_kg'] * st.session_state.df_estoque['Preco_Kg']
-                )
-
-                st.success("Estoque carregado com sucesso! Lembre-se que este estoque é válido apenas para esta sessão.")
+                # CSV com separador ';' e vírgula decimal, lido em blocos já tipados e gravado direto no banco
+                # Peso_Total_kg e Valor_Total_R$ não são lidos: o estoque os recalcula para garantir consistência
+                with etapa('importar_estoque'):
+                    banco.importar_estoque(cronometrar_blocos(
+                        'ler_arquivo_estoque', ler_estoque_em_blocos(uploaded_file, uploaded_file.name)))
+                st.session_state.estoque_arquivo_id = uploaded_file.file_id
+                estoque = sincronizar_estoque(banco)
+
+                st.success("Estoque importado com sucesso para o banco de dados!")
             except Exception as e:
-                st.error(f"Erro ao carregar o arquivo CSV: {e}. Verifique o formato, o separador (deve ser ponto e vírgula) e as colunas. Confirme se os números decimais usam VÍRGULA.")
+                st.error(f"Erro ao carregar o arquivo: {e}. Verifique o formato, o separador (deve ser ponto e vírgula) e as colunas. Confirme se os números decimais usam VÍRGULA.")
         
         st.subheader("Adicionar Novo Item ou Atualizar Quantidade")
         with st.form("form_estoque"):
@@ -128,74 +207,22 @@ def main():
                 if not modelo_chapa or not tipo_papel or largura_m <= 0 or comprimento_m <= 0 or gramatura <= 0 or preco_kg <= 0:
                     st.error("Por favor, preencha todos os campos obrigatórios do estoque corretamente (Modelo, Dimensões, Tipo, Gramatura, Preço Kg).")
                 else:
-                    # Calcula peso_m2_kg automaticamente da gramatura
-                    peso_m2_kg_calc = gramatura / 1000 
-                    
-                    # Calcula Peso_Total_kg e Valor_Total_R$ para o novo item
-                    area_chapa_m2 = largura_m * comprimento_m
-                    peso_total_item_kg = area_chapa_m2 * peso_m2_kg_calc * quantidade
-                    valor_total_item_rs = peso_total_item_kg * preco_kg
-
-                    item_existente_idx = st.session_state.df_estoque[
-                        (st.session_state.df_estoque['Modelo_Chapa'] == modelo_chapa) &
-                        (st.session_state.df_estoque['Tipo_Papel'] == tipo_papel) &
-                        (st.session_state.df_estoque['Gramatura'] == gramatura)
-                    ].index
-
-                    if not item_existente_idx.empty:
-                        # Atualiza a quantidade e recalcula pesos/valores
-                        st.session_state.df_estoque.loc[item_existente_idx, 'Quantidade_Folhas'] += quantidade
-                        # Recalcula pesos/valores para o item atualizado
-                        existing_qty = st.session_state.df_estoque.loc[item_existente_idx, 'Quantidade_Folhas'].iloc[0]
-                        st.session_state.df_estoque.loc[item_existente_idx, 'Peso_Total_kg'] = area_chapa_m2 * peso_m2_kg_calc * existing_qty
-                        st.session_state.df_estoque.loc[item_existente_idx, 'Valor_Total_R$'] = st.session_state.df_estoque.loc[item_existente_idx, 'Peso_Total_kg'] * preco_kg
+                    # Upsert pela chave (Modelo, Tipo, Gramatura) no banco; peso e valor são recalculados pelo estoque
+                    item_novo = estoque.localizar(modelo_chapa, tipo_papel, gramatura) is None
+                    existing_qty = banco.upsert(modelo_chapa, largura_m, comprimento_m, tipo_papel,
+                                                gramatura, quantidade, preco_kg)
+                    estoque = sincronizar_estoque(banco)
+                    if not item_novo:
                         st.success(f"Quantidade do modelo '{modelo_chapa}' ({largura_m}x{comprimento_m}m, {gramatura}g/m²) atualizada para {existing_qty} folhas.")
                     else:
-                        # Adiciona novo item
-                        novo_item = pd.DataFrame([{
-                            'Modelo_Chapa': modelo_chapa,
-                            'Largura_m': largura_m,
-                            'Comprimento_m': comprimento_m,
-                            'Tipo_Papel': tipo_papel,
-                            'Gramatura': gramatura,
-                            'Quantidade_Folhas': quantidade,
-                            'Preco_Kg': preco_kg,
-                            'Peso_Total_kg': peso_total_item_kg,
-                            'Valor_Total_R$': valor_total_item_rs
-                        }])
-                        st.session_state.df_estoque = pd.concat([st.session_state.df_estoque, novo_item], ignore_index=True)
                         st.success(f"Item de estoque {modelo_chapa} adicionado com sucesso!")
-                    
-                    st.session_state.df_estoque = st.session_state.df_estoque.sort_values(by=['Modelo_Chapa', 'Tipo_Papel', 'Gramatura']).reset_index(drop=True)
-
-
-        st.subheader("Estoque Atual na Memória:")
-        if not st.session_state.df_estoque.empty:
-            # Calcular totais para exibição na tabela
-            df_estoque_display = st.session_state.df_estoque.copy()
-            total_area_m2_estoque = (df_estoque_display['Largura_m'] * df_estoque_display['Comprimento_m'] * df_estoque_display['Quantidade_Folhas']).sum()
-            total_peso_estoque_kg = df_estoque_display['Peso_Total_kg'].sum()
-            total_valor_estoque_rs = df_estoque_display['Valor_Total_R$'].sum()
-
-            # Adicionar linha de totais na tabela para exibição na tela
-            df_estoque_display.loc[''] = '' # Linha em branco para separar
-            df_estoque_display.loc['Total Geral'] = {
-                'Modelo_Chapa': 'TOTAL GERAL',
-                'Largura_m': f"{total_area_m2_estoque:.2f}", # Formata para string na exibição
-                'Comprimento_m': 'm² (Área Total)', 
-                'Tipo_Papel': '', 'Gramatura': '', 'Quantidade_Folhas': '', 'Preco_Kg': '',
-                'Peso_Total_kg': total_peso_estoque_kg,
-                'Valor_Total_R$': total_valor_estoque_rs
-            }
-            
-            st.dataframe(df_estoque_display, use_container_width=True, 
-                          column_config={
-                              "Preco_Kg": st.column_config.NumberColumn(format="%.2f"),
-                              "Peso_Total_kg": st.column_config.NumberColumn(format="%.2f"),
-                              "Valor_Total_R$": st.column_config.NumberColumn(format="%.2f")
-                          })
+
+
+        st.subheader("Estoque Atual:")
+        if not estoque.vazio:
+            exibir_estoque(estoque, "estoque_lancamento")
         else:
-            st.info("Nenhum item no estoque na memória. Adicione acima ou carregue um arquivo CSV.")
+            st.info("Nenhum item no estoque. Adicione acima ou importe um arquivo CSV.")
 
     with tab_pedido:
         # --- Formulário de Lançamento de Pedido (agora em 2 etapas) ---
@@ -214,231 +241,271 @@ def main():
             with col3:
                 qtd_caixas = st.number_input("Quantidade de Caixas no Pedido", min_value=1, key="pedido_qtd_caixas_input")
                 # Campos para identificar a chapa no estoque
-                modelo_chapa_pedido = st.text_input("Modelo da Chapa (do Estoque) para o Pedido", key="pedido_modelo_chapa_input").strip()
+                modelo_chapa_pedido = st.text_input("Modelo da Chapa (do Estoque) para o Pedido", key="pedido_modelo_chapa_input",
+                                                    help="Deixe em branco para escolher automaticamente a melhor chapa (ou retalho) do estoque.").strip()
                 tipo_papel_pedido = st.text_input("Tipo de Papel (do Estoque) para o Pedido", key="pedido_tipo_input").strip()
                 gramatura_pedido = st.number_input("Gramatura (do Estoque) para o Pedido (g/m²)", min_value=1, key="pedido_gramatura_input")
+                usar_retalhos_pedido = st.checkbox("Consumir retalhos antes de chapas inteiras", value=True, key="pedido_usar_retalhos_input",
+                                                   help="Com o Modelo em branco, usa primeiro os menores retalhos que comportam a chapa de corte.")
 
             calcular_btn = st.form_submit_button("Calcular Consumo do Pedido")
 
             if calcular_btn:
                 if not os_pedido or not cliente or not descricao or valor_pedido_total <= 0 or \
                    dim_largura_corte_m <= 0 or dim_comprimento_corte_m <= 0 or qtd_caixas <= 0 or \
-                   not modelo_chapa_pedido or not tipo_papel_pedido or gramatura_pedido <= 0:
+                   not tipo_papel_pedido or gramatura_pedido <= 0:
                     st.error("Por favor, preencha todos os campos obrigatórios do pedido corretamente para calcular o consumo.")
                     st.session_state.calculo_pedido_temp = None # Resetar calculo temporário
                 else:
-                    # --- Localizar a Chapa no Estoque pela Modelo, Tipo e Gramatura ---
-                    chapa_estoque_idx = st.session_state.df_estoque[
-                        (st.session_state.df_estoque['Modelo_Chapa'] == modelo_chapa_pedido) &
-                        (st.session_state.df_estoque['Tipo_Papel'] == tipo_papel_pedido) &
-                        (st.session_state.df_estoque['Gramatura'] == gramatura_pedido)
-                    ].index
-
-                    if chapa_estoque_idx.empty:
-                        st.error(f"Erro: Chapa do modelo '{modelo_chapa_pedido}' com Tipo '{tipo_papel_pedido}' e Gramatura '{gramatura_pedido}g/m²' não encontrada no estoque. Verifique os dados na aba 'Lançar Estoque'.")
+                    # --- Ranking de todas as chapas compatíveis (Tipo e Gramatura), incluindo retalhos ---
+                    with etapa('ranquear_chapas'):
+                        ranking_chapas = ranquear_chapas(estoque, tipo_papel_pedido, gramatura_pedido,
+                                                         dim_largura_corte_m, dim_comprimento_corte_m, qtd_caixas)
+
+                    # --- Plano do pedido: retalhos que comportam a peça primeiro (menor primeiro), depois a melhor chapa ---
+                    # Calculado numa cópia: o estoque só muda na confirmação
+                    pedido = {
+                        'OS': os_pedido, 'Cliente': cliente, 'Descricao_Pedido': descricao,
+                        'Valor_Pedido_Total_R$': valor_pedido_total, 'Largura_Corte_m': dim_largura_corte_m,
+                        'Comprimento_Corte_m': dim_comprimento_corte_m, 'Quantidade_Caixas': qtd_caixas,
+                        'Tipo_Papel': tipo_papel_pedido, 'Gramatura': gramatura_pedido,
+                        COLUNA_MODELO_OPCIONAL: modelo_chapa_pedido,
+                    }
+                    with etapa('planejar_pedido'):
+                        plano_pedido, movimento_pedido = planejar_pedido(estoque.copia(), pedido, usar_retalhos_pedido)
+
+                    if movimento_pedido is None:
+                        if modelo_chapa_pedido:
+                            st.error(f"Erro: Chapa do modelo '{modelo_chapa_pedido}' com Tipo '{tipo_papel_pedido}' e Gramatura '{gramatura_pedido}g/m²' não encontrada no estoque, não comporta a chapa de corte {dim_largura_corte_m}x{dim_comprimento_corte_m}m ou não tem folhas suficientes. Verifique os dados na aba 'Lançar Estoque'.")
+                        else:
+                            st.error(f"Erro: Nenhuma chapa do estoque com Tipo '{tipo_papel_pedido}' e Gramatura '{gramatura_pedido}g/m²' comporta a chapa de corte com folhas suficientes para o pedido.")
                         st.session_state.calculo_pedido_temp = None # Resetar
                     else:
-                        chapa_estoque_data = st.session_state.df_estoque.loc[chapa_estoque_idx].iloc[0]
-                        largura_chapa_estoque_m = chapa_estoque_data['Largura_m']
-                        comprimento_chapa_estoque_m = chapa_estoque_data['Comprimento_m']
-                        preco_kg_chapa_estoque = chapa_estoque_data['Preco_Kg']
-                        
-                        # CONVERTER DIMENSÕES PARA MM para a função de aproveitamento
-                        largura_chapa_estoque_mm = largura_chapa_estoque_m * 1000
-                        comprimento_chapa_estoque_mm = comprimento_chapa_estoque_m * 1000
-                        dim_largura_corte_mm = dim_largura_corte_m * 1000
-                        dim_comprimento_corte_mm = dim_comprimento_corte_m * 1000
-
-                        qtd_caixas_por_chapa_base, retalhos_gerados_map_por_chapa = \
-                            calcular_aproveitamento_e_retalhos_novo(dim_largura_corte_mm, dim_comprimento_corte_mm, 
-                                                                 largura_chapa_estoque_mm, comprimento_chapa_estoque_mm)
-
-                        if qtd_caixas_por_chapa_base == 0:
-                            st.error(f"Erro: A chapa de corte {dim_largura_corte_m}x{dim_comprimento_c_m}m não cabe na chapa do estoque '{modelo_chapa_pedido}' ({largura_chapa_estoque_m}x{comprimento_chapa_estoque_m}m) em nenhuma orientação. Verifique as dimensões.")
-                            st.session_state.calculo_pedido_temp = None # Resetar
-                        else:
-                            num_folhas_consumidas = math.ceil(qtd_caixas / qtd_caixas_por_chapa_base)
-                            
-                            area_chapa_corte_por_caixa_m2 = dim_largura_corte_m * dim_comprimento_corte_m
-                            peso_total_pedido_kg = area_chapa_corte_por_caixa_m2 * (gramatura_pedido / 1000) * qtd_caixas
-
-                            # AQUI ESTÁ O AJUSTE PRINCIPAL: Multiplicar a quantidade de retalhos pela quantidade de chapas consumidas.
-                            retalhos_gerados_dims_string_list = []
-                            retalhos_gerados_map_final = {} # Para armazenar qty_total_retalho para cada dim
-                            for dim, qty_por_chapa in retalhos_gerados_map_por_chapa.items():
-                                total_qty_retalho_dim = qty_por_chapa * num_folhas_consumidas
-                                if total_qty_retalho_dim > 0:
-                                    retalhos_gerados_dims_string_list.append(f"{total_qty_retalho_dim}x {dim}")
-                                    retalhos_gerados_map_final[dim] = total_qty_retalho_dim
-
-
-                            # Armazenar resultados temporariamente no session_state
-                            st.session_state.calculo_pedido_temp = {
-                                'os_pedido': os_pedido, 'cliente': cliente, 'descricao': descricao,
-                                'valor_pedido_total': valor_pedido_total, 'dim_largura_corte_m': dim_largura_corte_m,
-                                'dim_comprimento_corte_m': dim_comprimento_corte_m, 'qtd_caixas': qtd_caixas,
-                                'modelo_chapa_pedido': modelo_chapa_pedido, 'tipo_papel_pedido': tipo_papel_pedido,
-                                'gramatura_pedido': gramatura_pedido, 'chapa_estoque_idx': chapa_estoque_idx,
-                                'largura_chapa_estoque_m': largura_chapa_estoque_m,
-                                'comprimento_chapa_estoque_m': comprimento_chapa_estoque_m,
-                                'preco_kg_chapa_estoque': preco_kg_chapa_estoque,
-                                'qtd_caixas_por_chapa_base': qtd_caixas_por_chapa_base,
-                                'retalhos_gerados_map_final': retalhos_gerados_map_final, # Passa o map com qtys totais
-                                'num_folhas_consumidas': num_folhas_consumidas,
-                                'peso_total_pedido_kg': peso_total_pedido_kg,
-                                'retalhos_gerados_dims_string_list': retalhos_gerados_dims_string_list # Passa a lista de strings formatadas
-                            }
-                            st.rerun() # Dispara rerun para mostrar resultados e botão de confirmação
+                        # Armazenar resultados temporariamente no session_state
+                        st.session_state.calculo_pedido_temp = {
+                            'plano': plano_pedido, 'movimento': movimento_pedido,
+                            'dim_largura_corte_m': dim_largura_corte_m, 'dim_comprimento_corte_m': dim_comprimento_corte_m,
+                            'ranking_chapas': ranking_chapas.head(10)
+                        }
+                        st.rerun() # Dispara rerun para mostrar resultados e botão de confirmação
 
 
         # --- Exibição dos Resultados do Cálculo e Botão de Confirmação ---
         if st.session_state.calculo_pedido_temp:
             temp_data = st.session_state.calculo_pedido_temp
             st.subheader("2. Revisar e Confirmar Lançamento do Pedido")
-            st.info(f"**OS:** {temp_data['os_pedido']} | **Cliente:** {temp_data['cliente']} | **Descrição:** {temp_data['descricao']}")
-            st.info(f"**Chapa do Estoque (Largura x Comprimento):** {temp_data['largura_chapa_estoque_m']}x{temp_data['comprimento_chapa_estoque_m']}m ({temp_data['modelo_chapa_pedido']})")
-            st.info(f"**Chapa de Corte (Largura x Comprimento):** {temp_data['dim_largura_corte_m']}x{temp_data['dim_comprimento_corte_m']}m")
-            st.info(f"**Caixas/Folha:** {temp_data['qtd_caixas_por_chapa_base']} | **Folhas Consumidas:** {temp_data['num_folhas_consumidas']}")
-            st.info(f"**Peso Total Pedido (Caixas):** {temp_data['peso_total_pedido_kg']:.2f} kg | **Retalhos Gerados:** {', '.join(temp_data['retalhos_gerados_dims_string_list'])}")
+            plano_pedido = temp_data['plano']
+            st.info(f"**OS:** {plano_pedido['OS']} | **Cliente:** {plano_pedido['Cliente']} | **Descrição:** {plano_pedido['Descricao_Pedido']}")
+            st.info(f"**Chapa de Corte (Largura x Comprimento):** {temp_data['dim_largura_corte_m']}x{temp_data['dim_comprimento_corte_m']}m | **Folhas Consumidas:** {plano_pedido['Chapas_Consumidas']}")
+            for consumo in plano_pedido['Consumos']:
+                st.info(f"**Chapa do Estoque (Largura x Comprimento):** {consumo['Largura_m']}x{consumo['Comprimento_m']}m ({consumo['Modelo_Chapa']}) | "
+                        f"**Caixas/Folha:** {consumo['Caixas_por_Chapa']} | **Folhas:** {consumo['Folhas']} | **Caixas:** {consumo['Caixas']}\n\n"
+                        f"**Padrão de Corte:** {consumo['Padrao_Corte']} | **Aproveitamento da Chapa:** {consumo['Aproveitamento_%']:.1f}%")
+            st.info(f"**Peso Total Pedido (Caixas):** {plano_pedido['Peso_Total_Pedido_kg']:.2f} kg | **Retalhos Gerados:** {plano_pedido['Retalhos_Gerados_Dimensoes']}")
+
+            with st.expander("Melhores chapas do estoque para este pedido (mesmo Tipo e Gramatura)"):
+                exibir_dataframe('ranking_chapas', temp_data['ranking_chapas'],
+                                 column_config={
+                                     "Aproveitamento_%": st.column_config.NumberColumn(format="%.1f"),
+                                     "Area_Sobra_m2": st.column_config.NumberColumn(format="%.3f"),
+                                     "Peso_Consumido_kg": st.column_config.NumberColumn(format="%.2f"),
+                                     "Custo_Chapas_R$": st.column_config.NumberColumn(format="%.2f")
+                                 })
+                st.caption("Para usar outra chapa, informe o Modelo desejado no formulário e calcule novamente.")
+
+            with st.expander("Aproveitamento desta chapa de corte em todo o estoque"):
+                # Pontua todas as chapas do estoque de uma vez (motor vetorizado)
+                with etapa('avaliar_estoque', linhas=len(estoque)):
+                    df_aproveitamento = avaliar_estoque(estoque.para_dataframe(),
+                                                        temp_data['dim_largura_corte_m'], temp_data['dim_comprimento_corte_m'],
+                                                        motor=calcular_aproveitamento)
+                    df_aproveitamento = df_aproveitamento[df_aproveitamento['Caixas_por_Chapa'] > 0]
+                # Só as 50 melhores vão para o navegador
+                exibir_dataframe('aproveitamento_estoque', df_aproveitamento.nlargest(50, 'Aproveitamento_%')[[
+                    'Modelo_Chapa', 'Largura_m', 'Comprimento_m', 'Tipo_Papel', 'Gramatura', 'Quantidade_Folhas',
+                    'Caixas_por_Chapa', 'Aproveitamento_%', 'Direcao_Corte', 'Faixas_Normais', 'Faixas_Giradas'
+                ]],
+                    column_config={
+                        "Aproveitamento_%": st.column_config.NumberColumn(format="%.1f")
+                    })
 
             if st.button("Confirmar e Lançar Pedido"):
                 # --- Executar Lógica de Abatimento e Adição de Retalhos ---
                 
-                # Abater chapas consumidas
-                chapa_estoque_idx = temp_data['chapa_estoque_idx']
-                st.session_state.df_estoque.loc[chapa_estoque_idx, 'Quantidade_Folhas'] -= temp_data['num_folhas_consumidas']
-                
-                # Atualiza Peso_Total_kg e Valor_Total_R$ para o item abatido
-                existing_qty = st.session_state.df_estoque.loc[chapa_estoque_idx, 'Quantidade_Folhas'].iloc[0]
-                area_chapa_estoque_m2_recalc = temp_data['largura_chapa_estoque_m'] * temp_data['comprimento_chapa_estoque_m']
-                peso_m2_kg_chapa_estoque_recalc = temp_data['gramatura_pedido'] / 1000 
-                st.session_state.df_estoque.loc[chapa_estoque_idx, 'Peso_Total_kg'] = area_chapa_estoque_m2_recalc * peso_m2_kg_chapa_estoque_recalc * existing_qty
-                st.session_state.df_estoque.loc[chapa_estoque_idx, 'Valor_Total_R$'] = st.session_state.df_estoque.loc[chapa_estoque_idx, 'Peso_Total_kg'] * temp_data['preco_kg_chapa_estoque']
-
-                # Adicionar Retalhos Gerados ao Estoque
-                # A lista 'retalhos_gerados_dims_string_list' já está pronta em temp_data.
-                # Vamos usá-la para o log, mas para adicionar ao estoque, usamos o map final.
-                
-                for dim_retalho_mm_str, qty_total_retalho in temp_data['retalhos_gerados_map_final'].items(): # Usa o map com qtys totais
-                    if qty_total_retalho == 0:
-                        continue
-                    
-                    retalho_largura_m, retalho_comprimento_m = [float(x)/1000 for x in dim_retalho_mm_str.split('x')]
-                    
-                    # Procura por retalhos existentes no estoque pelo TIPO, GRAMATURA e DIMENSÃO
-                    # Adicione o Modelo_Chapa na busca para evitar misturar retalhos de modelos diferentes se o Modelo_Chapa for "RETALHO-..."
-                    item_retalho_idx = st.session_state.df_estoque[
-                        (st.session_state.df_estoque['Modelo_Chapa'] == f"RETALHO-{dim_retalho_mm_str}") |
-                        ((st.session_state.df_estoque['Largura_m'] == retalho_largura_m) &
-                         (st.session_state.df_estoque['Comprimento_m'] == retalho_comprimento_m) &
-                         (st.session_state.df_estoque['Tipo_Papel'] == temp_data['tipo_papel_pedido']) &
-                         (st.session_state.df_estoque['Gramatura'] == temp_data['gramatura_pedido']))
-                    ].index
-                    
-                    if not item_retalho_idx.empty:
-                        st.session_state.df_estoque.loc[item_retalho_idx, 'Quantidade_Folhas'] += qty_total_retalho
-                        existing_qty_retalho = st.session_state.df_estoque.loc[item_retalho_idx, 'Quantidade_Folhas'].iloc[0]
-                        area_retalho_m2_recalc = retalho_largura_m * retalho_comprimento_m
-                        # Usa o preço kg do retalho existente, se houver, ou 0.01 se for um novo "RETALHO-..."
-                        preco_kg_retalho = st.session_state.df_estoque.loc[item_retalho_idx, 'Preco_Kg'].iloc[0] 
-                        st.session_state.df_estoque.loc[item_retalho_idx, 'Peso_Total_kg'] = area_retalho_m2_recalc * (temp_data['gramatura_pedido']/1000) * existing_qty_retalho
-                        st.session_state.df_estoque.loc[item_retalho_idx, 'Valor_Total_R$'] = st.session_state.df_estoque.loc[item_retalho_idx, 'Peso_Total_kg'] * preco_kg_retalho
-                    else:
-                        # Se o retalho não existe no estoque com essas características, adiciona como novo item
-                        st.warning(f"Retalho {dim_retalho_mm_str} ({temp_data['tipo_papel_pedido']}, {temp_data['gramatura_pedido']}g/m²) gerado e adicionado como novo item de estoque com modelo 'RETALHO-{dim_retalho_mm_str}'. Considere atualizar seu preço na aba 'Lançar Estoque'.")
-                        novo_retalho = pd.DataFrame([{
-                            'Modelo_Chapa': f"RETALHO-{dim_retalho_mm_str}", # Identificador claro para retalhos
-                            'Largura_m': retalho_largura_m,
-                            'Comprimento_m': retalho_comprimento_m,
-                            'Tipo_Papel': temp_data['tipo_papel_pedido'],
-                            'Gramatura': temp_data['gramatura_pedido'],
-                            'Quantidade_Folhas': qty_total_retalho,
-                            'Preco_Kg': 0.01, # Preço padrão para novos retalhos, pode ser ajustado manualmente
-                            'Peso_Total_kg': retalho_largura_m * retalho_comprimento_m * (temp_data['gramatura_pedido']/1000) * qty_total_retalho,
-                            'Valor_Total_R$': retalho_largura_m * retalho_comprimento_m * (temp_data['gramatura_pedido']/1000) * qty_total_retalho * 0.01
-                        }])
-                        st.session_state.df_estoque = pd.concat([st.session_state.df_estoque, novo_retalho], ignore_index=True)
-                        
-                st.session_state.df_estoque = st.session_state.df_estoque.sort_values(by=['Modelo_Chapa', 'Tipo_Papel', 'Gramatura']).reset_index(drop=True)
-
-                # --- Registrar Pedido no Log da Sessão (st.session_state.df_pedidos) ---
-                novo_pedido_log = pd.DataFrame([{
-                    'OS': temp_data['os_pedido'], 'Cliente': temp_data['cliente'], 'Descricao_Pedido': temp_data['descricao'], 
-                    'Valor_Pedido_Total_R$': temp_data['valor_pedido_total'], 
-                    'Dimensao_Corte_LxC_m': f"{temp_data['dim_largura_corte_m']}x{temp_data['dim_comprimento_corte_m']}",
-                    'Quantidade_Caixas': temp_data['qtd_caixas'], 'Modelo_Chapa_Pedido': temp_data['modelo_chapa_pedido'],
-                    'Tipo_Papel_Pedido': temp_data['tipo_papel_pedido'], 'Gramatura_Pedido': temp_data['gramatura_pedido'], 
-                    'Chapas_Consumidas': temp_data['num_folhas_consumidas'], 
-                    'Retalhos_Gerados_Dimensoes': ", ".join(temp_data['retalhos_gerados_dims_string_list']), # Agora está correto
-                    'Peso_Total_Pedido_kg': temp_data['peso_total_pedido_kg'],
-                    'Data_Processamento': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }])
-                st.session_state.df_pedidos = pd.concat([st.session_state.df_pedidos, novo_pedido_log], ignore_index=True)
-
-                st.success(f"Pedido OS: {temp_data['os_pedido']} LANÇADO E ESTOQUE ATUALIZADO com sucesso!")
-                st.info("Verifique a tabela de estoque e baixe os relatórios para salvar os dados.")
+                # Registro do pedido (log da sessão e tabela de pedidos do banco)
+                tipo_papel_pedido, gramatura_pedido, consumos_pedido, registro_pedido = temp_data['movimento']
+
+                # --- Abater chapas e retalhos, creditar retalhos e registrar o pedido numa única transação ---
+                try:
+                    with etapa('banco.confirmar_pedido'):
+                        retalhos_criados = banco.confirmar_pedido(tipo_papel_pedido, gramatura_pedido, consumos_pedido, registro_pedido)
+                except EstoqueInsuficiente as e:
+                    # Outro operador pode ter consumido a chapa entre o cálculo e a confirmação
+                    st.error(f"Erro: {e} Nada foi alterado no estoque; calcule o pedido novamente.")
+                    st.session_state.calculo_pedido_temp = None
+                    st.stop()
+
+                for modelo_retalho in retalhos_criados:
+                    # Retalho que não existia no estoque com essas características: adicionado como novo item
+                    st.warning(f"Retalho {modelo_retalho} ({tipo_papel_pedido}, {gramatura_pedido}g/m²) gerado e adicionado como novo item de estoque. Considere atualizar seu preço na aba 'Lançar Estoque'.")
+
+                # --- Registrar Pedido no Log da Sessão ---
+                st.session_state.pedidos_sessao.append(registro_pedido)
+
+                st.success(f"Pedido OS: {registro_pedido['OS']} LANÇADO E ESTOQUE ATUALIZADO com sucesso!")
+                st.info("Verifique a tabela de estoque; o estoque e o pedido já estão salvos no banco de dados.")
                 
                 # Limpar dados temporários e forçar rerun para limpar o formulário
                 st.session_state.calculo_pedido_temp = None
                 st.rerun() # Dispara um rerun para limpar o formulário e atualizar as tabelas
 
 
+        # --- Planejamento em Lote: várias OS planejadas e lançadas de uma vez ---
+        st.subheader("Planejar Pedidos em Lote")
+        st.caption(f"Arquivo CSV (separador ';' e decimal ',') ou XLSX com as colunas: {', '.join(COLUNAS_LOTE)}. "
+                   f"A coluna opcional '{COLUNA_MODELO_OPCIONAL}' fixa a chapa do pedido; se vazia, a melhor chapa do estoque é escolhida. "
+                   "Os pedidos são planejados na ordem do arquivo e podem reaproveitar os retalhos gerados pelos anteriores.")
+        arquivo_lote = st.file_uploader("Carregar arquivo de Pedidos (.csv ou .xlsx)", type=["csv", "xlsx"], key="lote_uploader")
+        if arquivo_lote is not None and st.button("Planejar Lote"):
+            try:
+                with etapa('ler_pedidos_lote'):
+                    df_lote = ler_pedidos_lote(arquivo_lote, arquivo_lote.name)
+            except Exception as e:
+                st.error(f"Erro ao ler o arquivo de pedidos: {e}. Verifique o formato e as colunas.")
+            else:
+                with etapa('planejar_lote', pedidos=len(df_lote)):
+                    df_plano_lote, movimentos_lote = planejar_lote(estoque, df_lote)
+                st.session_state.plano_lote = {'df_lote': df_lote, 'df_plano': df_plano_lote,
+                                               'movimentos': movimentos_lote, 'otimizacao_global': None}
+
+        if st.session_state.get('plano_lote'):
+            plano_lote = st.session_state.plano_lote
+            df_plano_lote = plano_lote['df_plano']
+            pedidos_atendidos = int((df_plano_lote['Status'] == STATUS_OK).sum())
+            st.info(f"**Pedidos atendidos:** {pedidos_atendidos} de {len(df_plano_lote)} | **Folhas consumidas:** {int(df_plano_lote['Chapas_Consumidas'].sum())} | **Peso Total (Caixas):** {df_plano_lote['Peso_Total_Pedido_kg'].sum():.2f} kg")
+            exibir_dataframe('plano_lote', df_plano_lote,
+                             column_config={
+                                 "Valor_Pedido_Total_R$": st.column_config.NumberColumn(format="%.2f"),
+                                 "Peso_Total_Pedido_kg": st.column_config.NumberColumn(format="%.2f")
+                             })
+
+            with st.expander("Otimização Global: combinar peças de pedidos diferentes na mesma chapa"):
+                st.caption("Agrupa os pedidos do lote por Tipo e Gramatura e combina peças de tamanhos diferentes em cada chapa, "
+                           "comparando com o plano atual (um pedido por vez, só peças iguais por chapa). Apenas relatório: o lançamento continua pelo plano acima.")
+                tempo_limite_otimizacao = st.number_input("Tempo máximo de otimização (s)", min_value=1, max_value=120, value=10, key="lote_tempo_otimizacao")
+                if st.button("Calcular Otimização Global"):
+                    with etapa('otimizar_pedidos_estoque', pedidos=len(plano_lote['df_lote'])):
+                        plano_lote['otimizacao_global'] = otimizar_pedidos_estoque(estoque, plano_lote['df_lote'], tempo_limite_otimizacao)
+                if plano_lote['otimizacao_global'] is not None:
+                    df_otimizacao = plano_lote['otimizacao_global']
+                    if df_otimizacao.empty:
+                        st.info("Nenhuma chapa inteira com folhas no estoque para os Tipos e Gramaturas do lote.")
+                    else:
+                        st.info(f"**Folhas (plano atual):** {int(df_otimizacao['Folhas_Plano_Atual'].sum())} | **Folhas (otimizado):** {int(df_otimizacao['Folhas_Otimizado'].sum())} | **Desperdício:** {df_otimizacao['Desperdicio_Atual_m2'].sum():.2f} m² → {df_otimizacao['Desperdicio_Otimizado_m2'].sum():.2f} m²")
+                        exibir_dataframe('otimizacao_global', df_otimizacao,
+                                         column_config={
+                                             "Desperdicio_Atual_m2": st.column_config.NumberColumn(format="%.2f"),
+                                             "Desperdicio_Otimizado_m2": st.column_config.NumberColumn(format="%.2f")
+                                         })
+
+            col_confirmar_lote, col_descartar_lote = st.columns(2)
+            with col_confirmar_lote:
+                if st.button("Confirmar e Lançar Lote", disabled=not plano_lote['movimentos']):
+                    # Todos os pedidos atendidos entram numa única transação (tudo ou nada)
+                    try:
+                        with etapa('banco.confirmar_lote', pedidos=len(plano_lote['movimentos'])):
+                            banco.confirmar_lote(plano_lote['movimentos'])
+                    except EstoqueInsuficiente as e:
+                        st.error(f"Erro: {e} Nenhum pedido do lote foi lançado; o estoque mudou desde o planejamento, planeje novamente.")
+                    else:
+                        st.session_state.pedidos_sessao.extend(movimento[-1] for movimento in plano_lote['movimentos'])
+                        st.session_state.plano_lote = None
+                        st.rerun() # Atualiza estoque e tabelas
+            with col_descartar_lote:
+                if st.button("Descartar Plano do Lote"):
+                    st.session_state.plano_lote = None
+                    st.rerun()
+
         st.subheader("Últimos Pedidos Processados NESTA Sessão:")
-        if not st.session_state.df_pedidos.empty:
-            # Reordenar colunas para exibição na tela
-            colunas_pedidos_display = [
-                'OS', 'Cliente', 'Descricao_Pedido', 'Valor_Pedido_Total_R$', 
-                'Peso_Total_Pedido_kg', 'Quantidade_Caixas',
-                'Dimensao_Corte_LxC_m', 'Modelo_Chapa_Pedido', 'Tipo_Papel_Pedido', 
-                'Gramatura_Pedido', 'Chapas_Consumidas', 'Retalhos_Gerados_Dimensoes', 
-                'Data_Processamento'
-            ]
-            
-            st.dataframe(st.session_state.df_pedidos[colunas_pedidos_display].tail(5), use_container_width=True,
-                          column_config={
-                              "Valor_Pedido_Total_R$": st.column_config.NumberColumn(format="%.2f"),
-                              "Peso_Total_kg": st.column_config.NumberColumn(format="%.2f")
-                          })
+        if st.session_state.pedidos_sessao:
+            exibir_dataframe('pedidos_sessao', pd.DataFrame(st.session_state.pedidos_sessao[-5:], columns=COLUNAS_PEDIDOS_EXIBICAO),
+                             column_config={
+                                 "Valor_Pedido_Total_R$": st.column_config.NumberColumn(format="%.2f"),
+                                 "Peso_Total_Pedido_kg": st.column_config.NumberColumn(format="%.2f")
+                             })
         else:
             st.info("Nenhum pedido processado nesta sessão ainda.")
 
     with tab_relatorios:
         st.header("📊 Relatórios e Downloads")
-        st.write("Baixe suas planilhas para salvar os dados permanentemente no seu computador. Lembre-se de fazer o upload do estoque na próxima sessão.")
-
-        st.subheader("Estoque Atual na Memória:")
-        if not st.session_state.df_estoque.empty:
-            # Calcular totais para exibição na tabela
-            total_area_m2_estoque = (st.session_state.df_estoque['Largura_m'] * st.session_state.df_estoque['Comprimento_m'] * st.session_state.df_estoque['Quantidade_Folhas']).sum()
-            total_peso_estoque_kg = st.session_state.df_estoque['Peso_Total_kg'].sum()
-            total_valor_estoque_rs = st.session_state.df_estoque['Valor_Total_R$'].sum()
-
-            # Criar cópia para exibição na tela e adicionar linha de totais
-            df_estoque_display = st.session_state.df_estoque.copy()
-            df_estoque_display.loc[''] = '' # Linha em branco para separar
-            df_estoque_display.loc['Total Geral'] = {
-                'Modelo_Chapa': 'TOTAL GERAL',
-                'Largura_m': f"{total_area_m2_estoque:.2f}", # Formata para string na exibição
-                'Comprimento_m': 'm² (Área Total)', 
-                'Tipo_Papel': '', 'Gramatura': '', 'Quantidade_Folhas': '', 'Preco_Kg': '',
-                'Peso_Total_kg': total_peso_estoque_kg,
-                'Valor_Total_R$': total_valor_estoque_rs
-            }
-            
-            st.dataframe(df_estoque_display, use_container_width=True, 
-                          column_config={
-                              "Preco_Kg": st.column_config.NumberColumn(format="%.2f"),
-                              "Peso_Total_kg": st.column_config.NumberColumn(format="%.2f"),
-                              "Valor_Total_R$": st.column_config.NumberColumn(format="%.2f")
-                          })
+        st.write("O estoque e os pedidos ficam salvos no banco de dados. Baixe as planilhas para análise ou backup.")
+
+        st.subheader("Estoque Atual:")
+        if not estoque.vazio:
+            exibir_estoque(estoque, "estoque_relatorio")
+        else:
+            st.info("Nenhum item no estoque. Adicione acima ou importe um arquivo CSV.")
+
+        # --- Estoque numa data passada: último snapshot anterior + movimentos do livro até a data ---
+        with st.expander("Estoque em uma data anterior"):
+            col_data, col_hora = st.columns(2)
+            with col_data:
+                data_consulta = st.date_input("Data", value=datetime.now().date(), key="estoque_data_consulta")
+            with col_hora:
+                hora_consulta = st.time_input("Hora", value=datetime.now().time().replace(second=0, microsecond=0),
+                                              key="estoque_hora_consulta")
+            if st.button("Consultar Estoque na Data", key="consultar_estoque_data"):
+                with etapa('banco.reconstruir_estoque'):
+                    estoque_data, ultimo_movimento = banco.reconstruir_estoque(
+                        ate_data=datetime.combine(data_consulta, hora_consulta).replace(second=59))
+                st.session_state.estoque_na_data = (estoque_data, ultimo_movimento)
+            if 'estoque_na_data' in st.session_state:
+                estoque_data, ultimo_movimento = st.session_state.estoque_na_data
+                st.caption(f"Estado após o movimento nº {ultimo_movimento} do livro de movimentos.")
+                if not estoque_data.vazio:
+                    exibir_estoque(estoque_data, "estoque_na_data")
+                else:
+                    st.info("O estoque estava vazio nessa data.")
+
+        st.subheader("Histórico de Pedidos:")
+        formato_download = st.radio("Formato dos arquivos para baixar", list(FORMATOS), horizontal=True,
+                                    key="formato_download")
+        filtro, ordenar_por, crescente, pagina, tamanho_pagina = controles_tabela("relatorio_pedidos", COLUNAS_PEDIDOS_EXIBICAO)
+        with etapa('banco.consultar_pedidos'):
+            pagina_pedidos = banco.consultar_pedidos(filtro, ordenar_por, crescente, pagina, tamanho_pagina)
+        if pagina_pedidos.total:
+            exibir_pagina('relatorio_pedidos', pagina_pedidos, {
+                "Valor_Pedido_Total_R$": st.column_config.NumberColumn(format="%.2f"),
+                "Peso_Total_Pedido_kg": st.column_config.NumberColumn(format="%.2f")
+            })
+
+            # O arquivo só é gerado (em blocos, direto do banco) quando o botão é clicado
+            st.download_button(
+                label=f"Baixar Histórico de Pedidos ({formato_download})",
+                data=lambda: para_bytes(pedidos_blocos(banco), formato_download),
+                file_name=nome_arquivo_pedidos(formato_download),
+                mime=FORMATOS[formato_download][1]
+            )
         else:
-            st.info("Nenhum item no estoque na memória. Adicione acima ou carregue um arquivo CSV.")
-
-        st.subheader("Histórico de Pedidos Processados NESTA Sessão:")
-        if not st.session_state.df_pedidos.empty:
-            # Reordenar colunas para o download
-            colunas_pedidos_download = [
-                'OS', 'Cliente', 'Descricao_Pedido', 'Valor_Pedido_Total_R$', 
-                'Peso_Total_Pedido_kg', 'Quantidade_Caixas',
-                'Dimensao_Corte_LxC_m', 'Modelo_Chapa_Pedido', 'Tipo_Papel_Pedido', 
-                'Gramatura_Pedido', 'Chapas_Consumidas
+            st.info("Nenhum pedido encontrado.")
+
+        st.subheader("Baixar Estoque Atualizado:")
+        if not estoque.vazio:
+            st.download_button(
+                label=f"Baixar Estoque Atualizado ({formato_download})",
+                data=lambda: para_bytes(estoque.blocos(), formato_download),
+                file_name=f"estoque_gbs_atualizado{FORMATOS[formato_download][0]}",
+                mime=FORMATOS[formato_download][1]
+            )
+        else:
+            st.info("Nenhum item no estoque para baixar.")
+
+        # --- Cache do motor de aproveitamento (compartilhado por todas as sessões deste servidor) ---
+        cache_stats = obter_cache().estatisticas()
+        st.caption(f"Cache de aproveitamento: {cache_stats['itens']}/{cache_stats['capacidade']} pares | "
+                   f"{cache_stats['acertos']} acertos, {cache_stats['falhas']} falhas ({cache_stats['taxa_acerto']:.0%}) | "
+                   f"{cache_stats['descartes']} descartes | versão do algoritmo {cache_stats['versao_algoritmo']}")
+
+
+if __name__ == "__main__":
+    main()